@@ -3,7 +3,22 @@ Django Admin configuration
 Allows easy management of contacts and campaigns through the admin interface
 """
 from django.contrib import admin
-from .models import Contact, Campaign, Product, CampaignTemplate, ContactList, SentCampaign
+from .models import Contact, Campaign, Product, CampaignTemplate, ContactList, SentCampaign, SendJob, OutboxBatch, SentMessage, SmsRateLimit, SmsCircuitBreaker, DailySendStat
+from .search import matching_ids
+
+
+class SendableNumberFilter(admin.SimpleListFilter):
+    """Contacts without a normalized number (invalid, or held by another contact) are never sent to"""
+    title = 'sendable number'
+    parameter_name = 'sendable'
+
+    def lookups(self, request, model_admin):
+        return (('yes', 'Yes'), ('no', 'No (invalid or duplicate)'))
+
+    def queryset(self, request, queryset):
+        if self.value() in ('yes', 'no'):
+            return queryset.filter(phone_e164__isnull=self.value() == 'no')
+        return queryset
 
 
 @admin.register(Contact)
@@ -16,13 +31,13 @@ class ContactAdmin(admin.ModelAdmin):
     list_display = ('name', 'phone_number', 'is_active', 'created_at')
     
     # Fields you can filter by
-    list_filter = ('is_active', 'created_at')
+    list_filter = ('is_active', SendableNumberFilter, 'created_at')
     
     # Fields you can search
-    search_fields = ('name', 'phone_number')
+    search_fields = ('name', 'phone_number', 'phone_e164')
     
     # Fields that are read-only
-    readonly_fields = ('created_at',)
+    readonly_fields = ('phone_e164', 'created_at')
     
     # Default ordering
     ordering = ('-created_at',)
@@ -80,12 +95,18 @@ class ProductAdmin(admin.ModelAdmin):
     """
     Admin interface for Product model
     """
-    list_display = ('name', 'price', 'is_active', 'created_at')
+    list_display = ('name', 'price', 'is_active', 'created_at', 'updated_at')
     list_filter = ('is_active', 'created_at')
     search_fields = ('name', 'description')
-    readonly_fields = ('created_at',)
+    readonly_fields = ('created_at', 'updated_at')
     ordering = ('-created_at',)
     list_per_page = 50
+    
+    def get_search_results(self, request, queryset, search_term):
+        """Search the full-text index instead of LIKE scans of every description"""
+        if not search_term.strip():
+            return queryset, False
+        return queryset.filter(id__in=matching_ids(search_term)), False
 
 
 @admin.register(CampaignTemplate)
@@ -119,16 +140,17 @@ class ContactListAdmin(admin.ModelAdmin):
     list_display = ('name', 'contact_count_display', 'is_active', 'created_at')
     list_filter = ('is_active', 'created_at')
     search_fields = ('name', 'description')
-    readonly_fields = ('created_at',)
+    readonly_fields = ('created_at', 'active_contact_count')
     filter_horizontal = ('contacts',)  # Nice interface for many-to-many
     ordering = ('name',)
     list_per_page = 25
     
     def contact_count_display(self, obj):
-        """Display the number of contacts in the list"""
-        return obj.contact_count()
+        """Display the number of contacts in the list (stored counter, no query)"""
+        return obj.active_contact_count
     
     contact_count_display.short_description = 'Contacts Count'
+    contact_count_display.admin_order_field = 'active_contact_count'
 
 
 @admin.register(SentCampaign)
@@ -163,3 +185,110 @@ class SentCampaignAdmin(admin.ModelAdmin):
     def has_delete_permission(self, request, obj=None):
         """Keep records for history"""
         return False
+
+
+@admin.register(SendJob)
+class SendJobAdmin(admin.ModelAdmin):
+    """
+    Admin interface for Send Job model
+    Shows the queue processed by run_sms_worker
+    """
+    list_display = ('reference', 'campaign_template', 'contact_list', 'status', 'requested_by', 'created_at', 'finished_at')
+    list_filter = ('status', 'created_at')
+    search_fields = ('requested_by', 'error')
+    readonly_fields = ('campaign_template', 'contact_list', 'requested_by', 'status', 'created_at', 'started_at', 'finished_at', 'sent_campaign', 'error', 'attempts', 'leased_until', 'leased_by')
+    ordering = ('-created_at',)
+    list_per_page = 25
+    
+    def has_add_permission(self, request):
+        """Jobs are queued from the USSD menu"""
+        return False
+
+
+@admin.register(OutboxBatch)
+class OutboxBatchAdmin(admin.ModelAdmin):
+    """
+    Admin interface for Outbox Batch model
+    Shows batches waiting for, held by or finished by the SMS workers
+    """
+    list_display = ('id', 'job', 'recipients_count', 'status', 'attempts', 'sent_count', 'failed_count', 'leased_by', 'sent_at')
+    list_filter = ('status',)
+    readonly_fields = ('job', 'sent_campaign', 'message', 'recipients', 'recipients_count', 'status', 'attempts', 'available_at', 'leased_until', 'leased_by', 'sent_count', 'failed_count', 'api_response', 'created_at', 'sent_at')
+    ordering = ('-id',)
+    list_per_page = 50
+    
+    def has_add_permission(self, request):
+        """Batches are created by run_sms_worker"""
+        return False
+
+
+@admin.register(SentMessage)
+class SentMessageAdmin(admin.ModelAdmin):
+    """
+    Admin interface for Sent Message model
+    Per-recipient delivery results of sent campaigns
+    """
+    list_display = ('phone_number', 'sent_campaign', 'status', 'status_code', 'provider_status', 'cost', 'created_at')
+    list_filter = ('status',)
+    search_fields = ('phone_number', 'message_id')
+    readonly_fields = ('sent_campaign', 'phone_number', 'status', 'status_code', 'provider_status', 'message_id', 'cost', 'created_at')
+    list_select_related = ('sent_campaign__campaign_template',)
+    ordering = ('-id',)
+    list_per_page = 50
+    
+    def has_add_permission(self, request):
+        """Messages are recorded when campaigns are sent"""
+        return False
+
+
+@admin.register(SmsRateLimit)
+class SmsRateLimitAdmin(admin.ModelAdmin):
+    """
+    Admin interface for SMS Rate Limit model
+    Shows the shared token bucket and how often senders were throttled
+    """
+    list_display = ('name', 'message_tokens', 'request_tokens', 'acquired_count', 'throttled_count', 'wait_seconds', 'max_wait_seconds')
+    readonly_fields = ('name', 'message_tokens', 'request_tokens', 'refilled_at', 'acquired_count', 'throttled_count', 'wait_seconds', 'max_wait_seconds')
+    
+    def has_add_permission(self, request):
+        """Buckets are created on first send"""
+        return False
+
+
+@admin.register(SmsCircuitBreaker)
+class SmsCircuitBreakerAdmin(admin.ModelAdmin):
+    """
+    Admin interface for SMS Circuit Breaker model
+    Shows whether sends are currently paused because the provider is failing
+    """
+    list_display = ('name', 'state', 'consecutive_failures', 'open_until', 'opened_count', 'last_failure_at')
+    readonly_fields = ('name', 'consecutive_failures', 'open_until', 'opened_count', 'last_error', 'last_failure_at', 'updated_at')
+    actions = ['close_breaker']
+    
+    def has_add_permission(self, request):
+        """Breakers are created on first send"""
+        return False
+    
+    def close_breaker(self, request, queryset):
+        """Admin action to resume sending right away"""
+        updated = queryset.update(state='closed', consecutive_failures=0, open_until=None)
+        self.message_user(request, f'{updated} circuit breaker(s) closed.')
+    
+    close_breaker.short_description = 'Close breaker (resume sending now)'
+
+
+@admin.register(DailySendStat)
+class DailySendStatAdmin(admin.ModelAdmin):
+    """
+    Admin interface for Daily Send Statistic model
+    Send totals per day, contact list and campaign template
+    """
+    list_display = ('day', 'contact_list_id', 'campaign_template_id', 'campaigns', 'failed_campaigns', 'recipients', 'sent', 'failed')
+    list_filter = ('day',)
+    readonly_fields = ('day', 'contact_list_id', 'campaign_template_id', 'campaigns', 'failed_campaigns', 'recipients', 'sent', 'failed', 'updated_at')
+    date_hierarchy = 'day'
+    list_per_page = 50
+    
+    def has_add_permission(self, request):
+        """Rows are written as sends finish or by backfill_send_stats"""
+        return False
@@ -0,0 +1,215 @@
+"""
+Send statistics rollup
+DailySendStat keeps one row of totals per (day, contact list, campaign
+template). The send paths call record_sent_campaign() / record_campaign()
+once when a send finishes, which adds to that row with a single UPDATE, so
+reports never need to scan SentCampaign or Campaign. Sends without a list or
+template (legacy campaigns, deleted lists) are counted under id 0.
+
+backfill() rebuilds the rows for a date range from the send history; it is
+used by `python manage.py backfill_send_stats`.
+"""
+import json
+from datetime import date, datetime, time, timedelta
+
+from django.db import IntegrityError, transaction
+from django.db.models import F, Sum
+from django.utils import timezone
+
+from .models import Campaign, DailySendStat, SentCampaign
+
+
+# Bucket name -> function mapping a day to the first day of its period
+BUCKETS = {
+    'day': lambda day: day,
+    'week': lambda day: day - timedelta(days=day.weekday()),
+    'month': lambda day: day.replace(day=1),
+}
+
+TOTAL_FIELDS = ('campaigns', 'failed_campaigns', 'recipients', 'sent', 'failed')
+
+
+def local_day(moment):
+    """Local calendar date of a datetime (the day a send is counted under)"""
+    return timezone.localdate(moment) if timezone.is_aware(moment) else moment.date()
+
+
+def record_send(day, contact_list_id, campaign_template_id, status, recipients, sent, failed):
+    """Add one finished campaign send to its daily row"""
+    key = {
+        'day': day,
+        'contact_list_id': contact_list_id or 0,
+        'campaign_template_id': campaign_template_id or 0,
+    }
+    totals = {
+        'campaigns': 1,
+        'failed_campaigns': 1 if status == 'failed' else 0,
+        'recipients': recipients,
+        'sent': sent,
+        'failed': failed,
+    }
+    changes = {field: F(field) + value for field, value in totals.items()}
+    changes['updated_at'] = timezone.now()
+
+    rows = DailySendStat.objects.filter(**key)
+    if rows.update(**changes):
+        return
+    try:
+        with transaction.atomic():
+            DailySendStat.objects.create(**key, **totals)
+    except IntegrityError:
+        # Another sender created the row first
+        rows.update(**changes)
+
+
+def record_sent_campaign(sent_campaign, sent, failed):
+    """Count a finished SentCampaign (sent/failed are message counts)"""
+    record_send(
+        local_day(sent_campaign.sent_at),
+        sent_campaign.contact_list_id,
+        sent_campaign.campaign_template_id,
+        sent_campaign.status,
+        sent_campaign.recipients_count,
+        sent,
+        failed
+    )
+
+
+def record_campaign(campaign, sent, failed):
+    """Count a legacy Campaign (no list or template)"""
+    record_send(local_day(campaign.sent_at), 0, 0, campaign.status, campaign.recipients_count, sent, failed)
+
+
+def message_counts(status, recipients_count, api_response):
+    """
+    Best estimate of (sent, failed) messages for a send in the history
+    The send summaries stored in api_response carry both numbers; older rows
+    only have a status.
+    """
+    if status == 'failed':
+        return 0, recipients_count
+    try:
+        summary = json.loads(api_response or '')
+    except ValueError:
+        summary = None
+    if isinstance(summary, dict) and isinstance(summary.get('sent'), int) and isinstance(summary.get('failed'), int):
+        return summary['sent'], summary['failed']
+    return recipients_count, 0
+
+
+def _history(queryset, fields, page_size):
+    """Yield value tuples of finished sends, one keyset page (on id) at a time"""
+    queryset = queryset.exclude(status='sending').order_by('id').values_list('id', *fields)
+    last_id = 0
+    while True:
+        page = list(queryset.filter(id__gt=last_id)[:page_size])
+        yield from page
+        if len(page) < page_size:
+            return
+        last_id = page[-1][0]
+
+
+def backfill(start=None, end=None, page_size=5000):
+    """
+    Rebuild the daily rows for sends between `start` and `end` (dates, inclusive)
+    Totals are summed in memory (one entry per day, list and template) and
+    written in one transaction that first deletes the old rows of the range.
+    Returns the number of rows written.
+    """
+    filters = {}
+    if start is not None:
+        filters['sent_at__gte'] = timezone.make_aware(datetime.combine(start, time.min))
+    if end is not None:
+        filters['sent_at__lt'] = timezone.make_aware(datetime.combine(end + timedelta(days=1), time.min))
+
+    totals = {}
+
+    def add(day, contact_list_id, campaign_template_id, status, recipients, api_response):
+        sent, failed = message_counts(status, recipients, api_response)
+        row = totals.setdefault((day, contact_list_id or 0, campaign_template_id or 0), [0, 0, 0, 0, 0])
+        row[0] += 1
+        row[1] += 1 if status == 'failed' else 0
+        row[2] += recipients
+        row[3] += sent
+        row[4] += failed
+
+    for _, sent_at, contact_list_id, template_id, status, recipients, api_response in _history(
+        SentCampaign.objects.filter(**filters),
+        ('sent_at', 'contact_list_id', 'campaign_template_id', 'status', 'recipients_count', 'api_response'),
+        page_size
+    ):
+        add(local_day(sent_at), contact_list_id, template_id, status, recipients, api_response)
+
+    for _, sent_at, status, recipients, api_response in _history(
+        Campaign.objects.filter(**filters),
+        ('sent_at', 'status', 'recipients_count', 'api_response'),
+        page_size
+    ):
+        add(local_day(sent_at), 0, 0, status, recipients, api_response)
+
+    rows = [
+        DailySendStat(
+            day=day,
+            contact_list_id=contact_list_id,
+            campaign_template_id=campaign_template_id,
+            **dict(zip(TOTAL_FIELDS, values))
+        )
+        for (day, contact_list_id, campaign_template_id), values in totals.items()
+    ]
+    with transaction.atomic():
+        existing = DailySendStat.objects.all()
+        if start is not None:
+            existing = existing.filter(day__gte=start)
+        if end is not None:
+            existing = existing.filter(day__lte=end)
+        existing.delete()
+        DailySendStat.objects.bulk_create(rows, batch_size=1000)
+    return len(rows)
+
+
+def send_report(start, end, bucket='day', contact_list_id=None, campaign_template_id=None):
+    """
+    Totals per day, week or month between `start` and `end` (dates, inclusive)
+    Returns {'totals': {...}, 'series': [{'period': 'YYYY-MM-DD', ...}, ...]}
+    with a failure_rate (failed / (sent + failed)) on every entry.
+    """
+    rows = DailySendStat.objects.filter(day__gte=start, day__lte=end)
+    if contact_list_id is not None:
+        rows = rows.filter(contact_list_id=contact_list_id)
+    if campaign_template_id is not None:
+        rows = rows.filter(campaign_template_id=campaign_template_id)
+
+    # Sum per day in the database (at most one row per day of the range),
+    # then fold the days into weeks or months here
+    period_of = BUCKETS[bucket]
+    # Annotation names may not clash with the model's field names
+    sums = {f'total_{field}': Sum(field) for field in TOTAL_FIELDS}
+    periods = {}
+    for row in rows.order_by().values('day').annotate(**sums).order_by('day'):
+        entry = periods.setdefault(period_of(row['day']), dict.fromkeys(TOTAL_FIELDS, 0))
+        for field in TOTAL_FIELDS:
+            entry[field] += row[f'total_{field}']
+    series = [
+        with_failure_rate({'period': period.isoformat(), **entry})
+        for period, entry in periods.items()
+    ]
+
+    totals = {field: sum(entry[field] for entry in series) for field in TOTAL_FIELDS}
+    return {'totals': with_failure_rate(totals), 'series': series}
+
+
+def with_failure_rate(entry):
+    attempted = entry['sent'] + entry['failed']
+    entry['failure_rate'] = round(entry['failed'] / attempted, 4) if attempted else None
+    return entry
+
+
+def default_range(days=30):
+    """The last `days` days, ending today"""
+    today = timezone.localdate()
+    return today - timedelta(days=days - 1), today
+
+
+def parse_day(value):
+    """date from an ISO 'YYYY-MM-DD' string (ValueError if malformed)"""
+    return date.fromisoformat(value)
@@ -0,0 +1,15 @@
+"""
+App configuration for the FlowMarket app
+Connects the model signal handlers when Django starts
+"""
+from django.apps import AppConfig
+
+
+class FlowMarketConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'app'
+    verbose_name = 'FlowMarket'
+
+    def ready(self):
+        # Importing the module registers the @receiver handlers
+        from . import signals  # noqa: F401
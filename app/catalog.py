@@ -0,0 +1,106 @@
+"""
+Product catalog change tracking and response caching
+Every change to a Product bumps the version number kept in one CatalogVersion
+row: the signal handlers in app/signals.py do it for saves and deletes, and
+code that writes products in bulk calls bump_catalog_version() itself.
+
+The /products/ API derives its ETag and Last-Modified headers from that row,
+so a poll whose If-None-Match still matches is answered 304 after a single
+primary-key lookup, without reading any product. Encoded response bodies are
+kept in an in-process LRU cache keyed by (version, query), so repeated polls
+after a change are built once per process.
+
+The USSD menu page cache keeps its versions in the same table, under
+'ussd-menu:<kind>' names (see app/ussd_cache.py).
+"""
+import hashlib
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+from django.db.models import F
+from django.utils import timezone
+
+from .models import CatalogVersion
+
+
+PRODUCTS = 'products'
+
+
+def catalog_state(name=PRODUCTS):
+    """(version, changed_at) of a catalog; the row is created on first use"""
+    state = CatalogVersion.objects.filter(name=name).values_list('version', 'changed_at').first()
+    if state is None:
+        row, _ = CatalogVersion.objects.get_or_create(name=name, defaults={'changed_at': timezone.now()})
+        state = (row.version, row.changed_at)
+    return state
+
+
+def bump_catalog_version(name=PRODUCTS):
+    """Record a change: every ETag and cached response of the catalog goes stale"""
+    changes = {'version': F('version') + 1, 'changed_at': timezone.now()}
+    if not CatalogVersion.objects.filter(name=name).update(**changes):
+        _, created = CatalogVersion.objects.get_or_create(name=name, defaults={'changed_at': changes['changed_at']})
+        if not created:
+            CatalogVersion.objects.filter(name=name).update(**changes)
+
+
+def query_digest(query):
+    """Short stable digest of a request's query parameters"""
+    return hashlib.md5(repr(sorted(query.items())).encode()).hexdigest()[:16]
+
+
+class ResponseCache:
+    """
+    LRU cache of encoded responses kept in process memory
+    Values are (body bytes, extra headers); keys include the catalog
+    version, so entries of older versions are never hit again and simply
+    age out.
+    """
+
+    def __init__(self, max_entries=None):
+        self._max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def max_entries(self):
+        if self._max_entries is not None:
+            return self._max_entries
+        return getattr(settings, 'PRODUCTS_RESPONSE_CACHE_ENTRIES', 256)
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def set(self, key, entry):
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """Hit/miss counters of this process"""
+        total = self.hits + self.misses
+        return {
+            'entries': len(self._entries),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / total, 4) if total else None,
+        }
+
+
+products_response_cache = ResponseCache()
@@ -0,0 +1,125 @@
+"""
+Retries and circuit breaking for Africa's Talking API calls
+
+A failed API call (network, SSL or server error) is retried with jittered
+exponential backoff: attempt n waits a random time between 0 and
+min(SMS_RETRY_MAX_DELAY, SMS_RETRY_BASE_DELAY * 2 ** (n - 1)) seconds, so
+many senders recovering at once do not retry in lock-step.
+
+When SMS_BREAKER_FAILURES calls fail in a row the breaker opens for
+SMS_BREAKER_COOLDOWN seconds. While open, inline sends fail fast and outbox
+batches are put back with a later available_at. After the cool-down one
+sender is allowed a probe request: success closes the breaker, failure opens
+it again. State lives in one SmsCircuitBreaker row shared by every process.
+"""
+import random
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import F, Q
+from django.utils import timezone
+
+
+def retry_attempts():
+    """Provider calls made per batch before giving up (SMS_RETRY_ATTEMPTS)"""
+    return getattr(settings, 'SMS_RETRY_ATTEMPTS', 4)
+
+
+def backoff_delay(attempt):
+    """Seconds to wait after failed attempt number `attempt` (full jitter)"""
+    base = getattr(settings, 'SMS_RETRY_BASE_DELAY', 1.0)
+    cap = getattr(settings, 'SMS_RETRY_MAX_DELAY', 60.0)
+    return random.uniform(0, min(cap, base * 2 ** (attempt - 1)))
+
+
+class CircuitBreaker:
+    """Database-backed circuit breaker for one SMS provider"""
+
+    def __init__(self, name='africastalking', failure_threshold=None, cooldown=None):
+        self.name = name
+        self._failure_threshold = failure_threshold
+        self._cooldown = cooldown
+
+    @property
+    def failure_threshold(self):
+        if self._failure_threshold is not None:
+            return self._failure_threshold
+        return getattr(settings, 'SMS_BREAKER_FAILURES', 5)
+
+    @property
+    def cooldown(self):
+        if self._cooldown is not None:
+            return self._cooldown
+        return getattr(settings, 'SMS_BREAKER_COOLDOWN', 30)
+
+    def _row(self):
+        from .models import SmsCircuitBreaker
+
+        SmsCircuitBreaker.objects.get_or_create(name=self.name)
+        return SmsCircuitBreaker.objects.filter(name=self.name)
+
+    def allow(self):
+        """
+        True if a request may be made now
+        Once an open breaker's cool-down is over, exactly one caller wins the
+        probe (a conditional UPDATE); everyone else keeps waiting.
+        """
+        row = self._row()
+        now = timezone.now()
+        if row.filter(state='closed').exists():
+            return True
+        # The probe holds the breaker half-open for one cool-down at most
+        return bool(row.filter(~Q(state='closed'), open_until__lte=now).update(
+            state='half_open',
+            open_until=now + timedelta(seconds=self.cooldown)
+        ))
+
+    def retry_after(self):
+        """Seconds until the breaker lets a request through (0 if closed)"""
+        open_until = self._row().exclude(state='closed').values_list('open_until', flat=True).first()
+        if open_until is None:
+            return 0
+        return max((open_until - timezone.now()).total_seconds(), 0)
+
+    def record_success(self):
+        self._row().exclude(state='closed', consecutive_failures=0).update(
+            state='closed',
+            consecutive_failures=0,
+            open_until=None
+        )
+
+    def record_failure(self, error):
+        """Count a failed call; opens the breaker at the threshold or after a failed probe"""
+        row = self._row()
+        now = timezone.now()
+        row.update(
+            consecutive_failures=F('consecutive_failures') + 1,
+            last_error=str(error)[:500],
+            last_failure_at=now
+        )
+        opened = row.filter(
+            Q(state='half_open') | Q(state='closed', consecutive_failures__gte=self.failure_threshold)
+        ).update(
+            state='open',
+            open_until=now + timedelta(seconds=self.cooldown),
+            opened_count=F('opened_count') + 1
+        )
+        if opened:
+            print(f"[SMS] Circuit breaker opened for {self.cooldown}s after: {error}")
+
+    def stats(self):
+        """Breaker state for the metrics endpoint"""
+        row = self._row().values(
+            'state', 'consecutive_failures', 'open_until', 'opened_count', 'last_error', 'last_failure_at'
+        ).first()
+        return {
+            'state': row['state'],
+            'consecutive_failures': row['consecutive_failures'],
+            'open_until': row['open_until'].isoformat() if row['open_until'] else None,
+            'opened_count': row['opened_count'],
+            'last_error': row['last_error'],
+            'last_failure_at': row['last_failure_at'].isoformat() if row['last_failure_at'] else None,
+        }
+
+
+sms_circuit_breaker = CircuitBreaker()
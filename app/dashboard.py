@@ -0,0 +1,95 @@
+"""
+Home page statistics
+The home page (which load balancer health checks also hit) shows a handful of
+row counts. They are read in one query made of COUNT subqueries and kept in
+the default cache for DASHBOARD_STATS_TIMEOUT seconds; the signal handlers in
+app/signals.py drop the cached copy whenever a counted model is saved or
+deleted. Bulk writes skip the signals, so after those the numbers catch up
+when the entry expires.
+
+The page itself is compiled once by compile_page() into encoded literal parts
+and field names, so rendering it is a single b''.join() of the numbers.
+"""
+import string
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connection
+
+from .models import CampaignTemplate, Contact, ContactList, Product, SentCampaign
+
+
+CACHE_KEY = 'dashboard:stats'
+
+
+def stats_timeout():
+    return getattr(settings, 'DASHBOARD_STATS_TIMEOUT', 30)
+
+
+def stat_querysets():
+    """Stat name -> queryset whose rows are counted"""
+    return {
+        'contacts': Contact.objects.filter(is_active=True),
+        'campaign_templates': CampaignTemplate.objects.filter(is_active=True),
+        'contact_lists': ContactList.objects.filter(is_active=True),
+        'sent_campaigns': SentCampaign.objects.all(),
+        'products': Product.objects.filter(is_active=True),
+    }
+
+
+def count_stats():
+    """
+    Count every stat in a single round trip:
+    SELECT (SELECT COUNT(*) FROM (...)), (SELECT COUNT(*) FROM (...)), ...
+    """
+    querysets = stat_querysets()
+    columns, params = [], []
+    for name, queryset in querysets.items():
+        sql, query_params = queryset.order_by().values('pk').query.sql_with_params()
+        columns.append(f"(SELECT COUNT(*) FROM ({sql}) AS {name}_rows)")
+        params.extend(query_params)
+    with connection.cursor() as cursor:
+        cursor.execute(f"SELECT {', '.join(columns)}", params)
+        return dict(zip(querysets, cursor.fetchone()))
+
+
+def dashboard_stats():
+    """The home page counts, from the cache when possible"""
+    cache = caches['default']
+    stats = cache.get(CACHE_KEY)
+    if stats is None:
+        stats = count_stats()
+        cache.set(CACHE_KEY, stats, timeout=stats_timeout())
+    return stats
+
+
+def invalidate_stats():
+    """Forget the cached counts; the next request recounts"""
+    caches['default'].delete(CACHE_KEY)
+
+
+class CompiledPage:
+    """
+    An HTML page with {field} placeholders, ready to be rendered many times
+    Uses str.format syntax ({{ and }} for literal braces).
+    """
+
+    def __init__(self, template):
+        self._parts = []
+        for literal, field, _, _ in string.Formatter().parse(template):
+            if literal:
+                self._parts.append(literal.encode('utf-8'))
+            if field is not None:
+                self._parts.append(field)
+        self.fields = {part for part in self._parts if isinstance(part, str)}
+
+    def render(self, values):
+        """Return the page as UTF-8 bytes"""
+        return b''.join(
+            part if isinstance(part, bytes) else str(values[part]).encode('utf-8')
+            for part in self._parts
+        )
+
+
+def compile_page(template):
+    return CompiledPage(template)
@@ -0,0 +1,144 @@
+"""
+Streaming data exports
+Contacts, contact list memberships and send history can be exported as CSV
+or NDJSON (one JSON object per line), optionally gzip-compressed. Used by the
+/exports/<kind> view and the export_data management command.
+
+Rows are read as plain tuples in keyset-paginated pages (like the SMS send
+pipeline) and encoded into ~64 KB blocks as they are read, so an export of
+any size runs in constant memory, starts producing bytes at once, and never
+keeps a database cursor open between pages.
+"""
+import csv
+import json
+import zlib
+
+from .models import Contact, ContactList, SentCampaign, SentMessage
+
+
+PAGE_SIZE = 2000
+BLOCK_SIZE = 64 * 1024
+
+FORMATS = {
+    'csv': ('text/csv', 'csv'),
+    'ndjson': ('application/x-ndjson', 'ndjson'),
+}
+
+
+def contacts_export(list_id=None):
+    queryset = Contact.objects.all()
+    if list_id is not None:
+        queryset = queryset.filter(contact_lists__id=list_id)
+    return queryset, ('id', 'name', 'phone_number', 'phone_e164', 'is_active', 'created_at')
+
+
+def list_members_export(list_id=None):
+    queryset = ContactList.contacts.through.objects.all()
+    if list_id is not None:
+        queryset = queryset.filter(contactlist_id=list_id)
+    return queryset, (
+        'id', 'contactlist_id', 'contactlist__name', 'contact_id', 'contact__name', 'contact__phone_e164'
+    )
+
+
+def sent_campaigns_export(list_id=None):
+    queryset = SentCampaign.objects.all()
+    if list_id is not None:
+        queryset = queryset.filter(contact_list_id=list_id)
+    return queryset, (
+        'id', 'campaign_template__name', 'contact_list__name', 'message',
+        'recipients_count', 'status', 'sent_by', 'sent_at'
+    )
+
+
+def sent_messages_export(list_id=None):
+    queryset = SentMessage.objects.all()
+    if list_id is not None:
+        queryset = queryset.filter(sent_campaign__contact_list_id=list_id)
+    return queryset, (
+        'id', 'sent_campaign_id', 'phone_number', 'status', 'status_code',
+        'provider_status', 'message_id', 'cost', 'created_at'
+    )
+
+
+# Export name -> callable(list_id) returning (queryset, columns); 'id' comes first
+EXPORTS = {
+    'contacts': contacts_export,
+    'list_members': list_members_export,
+    'sent_campaigns': sent_campaigns_export,
+    'sent_messages': sent_messages_export,
+}
+
+
+def export_rows(kind, list_id=None):
+    """Return (columns, iterator of row tuples) for an export"""
+    queryset, columns = EXPORTS[kind](list_id)
+    return columns, _rows(queryset.values_list(*columns), PAGE_SIZE)
+
+
+def _rows(queryset, page_size):
+    """Yield every row, one keyset page (on id) at a time"""
+    last_id = None
+    while True:
+        page = queryset if last_id is None else queryset.filter(id__gt=last_id)
+        page = list(page.order_by('id')[:page_size])
+        yield from page
+        if len(page) < page_size:
+            return
+        last_id = page[-1][0]
+
+
+class _Echo:
+    """File-like object for csv.writer that hands each line straight back"""
+
+    def write(self, value):
+        return value
+
+
+def encode_lines(columns, rows, file_format):
+    """Yield one text line per row (plus a header line for CSV)"""
+    if file_format == 'csv':
+        writer = csv.writer(_Echo())
+        yield writer.writerow([column.replace('__', '_') for column in columns])
+        for row in rows:
+            yield writer.writerow(row)
+        return
+    keys = [column.replace('__', '_') for column in columns]
+    for row in rows:
+        yield json.dumps(dict(zip(keys, row)), default=str, ensure_ascii=False) + '\n'
+
+
+def export_stream(kind, file_format='csv', compress=False, list_id=None):
+    """
+    Yield the encoded export as byte blocks of roughly BLOCK_SIZE
+    With compress=True the blocks form one gzip stream.
+    """
+    columns, rows = export_rows(kind, list_id)
+    compressor = zlib.compressobj(wbits=31) if compress else None  # 31 = gzip header
+
+    block, size = [], 0
+    for line in encode_lines(columns, rows, file_format):
+        data = line.encode('utf-8')
+        block.append(data)
+        size += len(data)
+        if size >= BLOCK_SIZE:
+            chunk = b''.join(block)
+            block, size = [], 0
+            if compressor is None:
+                yield chunk
+            else:
+                chunk = compressor.compress(chunk)
+                if chunk:
+                    yield chunk
+
+    chunk = b''.join(block)
+    if compressor is None:
+        if chunk:
+            yield chunk
+    else:
+        yield compressor.compress(chunk) + compressor.flush()
+
+
+def export_filename(kind, file_format, compress=False):
+    extension = FORMATS[file_format][1]
+    return f"{kind}.{extension}{'.gz' if compress else ''}"
@@ -0,0 +1,76 @@
+"""
+Django management command that measures SMS backend throughput
+Sends the same batches through each HTTP backend against an Africa's Talking
+style endpoint (normally `python manage.py run_fake_sms_server`) and reports
+requests and messages per second. Nothing is written to the database.
+Usage: python manage.py benchmark_sms_backends
+       python manage.py benchmark_sms_backends --batches 500 --batch-size 100 --concurrency 32
+"""
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from app.sms_backends import AsyncHttpSmsBackend, HttpSmsBackend
+
+
+# name -> (description, factory(url, concurrency))
+BACKENDS = {
+    'per-request': (
+        'HttpSmsBackend, new connection per request (like the SDK)',
+        lambda url, concurrency: HttpSmsBackend(url=url, keep_alive=False)
+    ),
+    'session': (
+        'HttpSmsBackend, keep-alive session per thread',
+        lambda url, concurrency: HttpSmsBackend(url=url)
+    ),
+    'async': (
+        'AsyncHttpSmsBackend, pooled keep-alive connections',
+        lambda url, concurrency: AsyncHttpSmsBackend(url=url, max_connections=concurrency)
+    ),
+}
+
+
+class Command(BaseCommand):
+    help = 'Compares the throughput of the HTTP SMS backends against a local stub endpoint'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--url',
+            default='http://127.0.0.1:8025/version1/messaging',
+            help='Endpoint to send to (default: the run_fake_sms_server address)'
+        )
+        parser.add_argument('--batches', type=int, default=200, help='Requests per backend (default: 200)')
+        parser.add_argument('--batch-size', type=int, default=100, help='Recipients per request (default: 100)')
+        parser.add_argument('--concurrency', type=int, default=16, help='Requests in flight at once (default: 16)')
+        parser.add_argument(
+            '--backend',
+            action='append',
+            choices=sorted(BACKENDS),
+            dest='backends',
+            help='Backend to measure (can be repeated; default: all)'
+        )
+
+    def handle(self, *args, **options):
+        batch = [f"+2547{i:08d}" for i in range(options['batch_size'])]
+        self.stdout.write(self.style.SUCCESS(
+            f"📊 {options['batches']} requests x {options['batch_size']} recipients, "
+            f"{options['concurrency']} in flight, against {options['url']}"
+        ))
+
+        for name in options['backends'] or list(BACKENDS):
+            description, factory = BACKENDS[name]
+            backend = factory(options['url'], options['concurrency'])
+            send = lambda _: backend.send('Benchmark message', batch)
+
+            send(None)  # warm up (imports, first connection)
+            started = time.monotonic()
+            with ThreadPoolExecutor(max_workers=options['concurrency']) as pool:
+                list(pool.map(send, range(options['batches'])))
+            elapsed = time.monotonic() - started
+
+            self.stdout.write(
+                f"  {name:<12} {options['batches'] / elapsed:8.1f} req/s "
+                f"{options['batches'] * len(batch) / elapsed:10.0f} msg/s  ({elapsed:.2f}s)  {description}"
+            )
+
+        self.stdout.write(self.style.SUCCESS('✅ Benchmark complete'))
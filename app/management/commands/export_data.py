@@ -0,0 +1,45 @@
+"""
+Django management command to export data as CSV or NDJSON
+Same exports as the /exports/<kind> view; rows are streamed to the output
+in constant memory, optionally gzip-compressed.
+Usage: python manage.py export_data contacts --output contacts.csv
+       python manage.py export_data sent_messages --format ndjson --gzip --output messages.ndjson.gz
+       python manage.py export_data list_members --list 3   (writes to standard output)
+"""
+import sys
+import time
+
+from django.core.management.base import BaseCommand
+from app.exports import EXPORTS, FORMATS, export_stream
+
+
+class Command(BaseCommand):
+    help = 'Exports contacts, list memberships or send history as CSV/NDJSON'
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=sorted(EXPORTS), help='What to export')
+        parser.add_argument('--format', choices=sorted(FORMATS), default='csv', help='Output format (default: csv)')
+        parser.add_argument('--gzip', action='store_true', help='Compress the output with gzip')
+        parser.add_argument('--list', type=int, dest='list_id', help='Only rows belonging to this contact list id')
+        parser.add_argument('--output', default='-', help="File to write ('-' for standard output, the default)")
+
+    def handle(self, *args, **options):
+        to_stdout = options['output'] == '-'
+        output = sys.stdout.buffer if to_stdout else open(options['output'], 'wb')
+        started = time.monotonic()
+        written = 0
+        try:
+            for block in export_stream(options['kind'], options['format'], options['gzip'], options['list_id']):
+                output.write(block)
+                written += len(block)
+        finally:
+            if to_stdout:
+                output.flush()
+            else:
+                output.close()
+
+        if not to_stdout:
+            self.stdout.write(self.style.SUCCESS(
+                f"✅ Exported {options['kind']} to {options['output']} "
+                f"({written / 1024 / 1024:.1f} MB in {time.monotonic() - started:.1f}s)"
+            ))
@@ -1,53 +1,168 @@
 """
 Django management command to fix phone numbers in the database
-Adds +254 prefix to phone numbers that are missing it
+Rewrites every contact's number in international format (+254...) and fills
+in the normalized phone_e164 column.
+
+Contacts are read in id order, one batch at a time, fixed in memory and
+written back with bulk_update in one short transaction per batch, so the
+table is never locked for long. When two contacts end up with the same
+number, the one already holding it (or else the oldest) keeps it; the other
+is left unchanged without a normalized number, so it is never sent to, and
+reported as a duplicate (with the contact that holds the number), so it can
+be merged or corrected by hand. Numbers are never moved between two contacts of the
+same batch; such contacts are skipped and reported as duplicates too.
 Usage: python manage.py fix_phone_numbers
+       python manage.py fix_phone_numbers --dry-run --batch-size 5000
 """
+import time
+
 from django.core.management.base import BaseCommand
+from django.db import transaction
 from app.models import Contact
+from app.phones import normalize_phone, to_e164
 
 
 class Command(BaseCommand):
-    help = 'Fixes phone numbers by adding +254 prefix if missing'
+    help = 'Fixes phone numbers by adding +254 prefix if missing and normalizing them to E.164'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Report what would change without writing anything'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=2000,
+            help='Contacts read and written per transaction (default: 2000)'
+        )
+        parser.add_argument(
+            '--progress-every',
+            type=float,
+            default=5.0,
+            help='Seconds between progress reports (default: 5)'
+        )
 
     def handle(self, *args, **options):
-        self.stdout.write(self.style.SUCCESS('🔧 Starting phone number fix...'))
-
-        contacts = Contact.objects.all()
-        fixed_count = 0
-        already_correct = 0
-        error_count = 0
-
-        for contact in contacts:
-            phone = contact.phone_number.strip()
-            
-            # Check if phone number needs fixing
-            if phone.startswith('+254'):
-                already_correct += 1
+        dry_run = options['dry_run']
+        batch_size = options['batch_size']
+        self.stdout.write(self.style.SUCCESS(
+            f"🔧 Starting phone number fix{' (dry run, nothing is saved)' if dry_run else ''}..."
+        ))
+
+        total = Contact.objects.count()
+        stats = {'checked': 0, 'fixed': 0, 'already_correct': 0, 'invalid': 0, 'duplicates': 0}
+        duplicates = []
+        planned = set()  # numbers handed out so far in a dry run (nothing is saved to check against)
+        started = last_report = time.monotonic()
+        last_id = 0
+
+        while True:
+            rows = list(
+                Contact.objects.filter(id__gt=last_id)
+                .order_by('id')
+                .values_list('id', 'phone_number', 'phone_e164')[:batch_size]
+            )
+            if not rows:
+                break
+            last_id = rows[-1][0]
+
+            with transaction.atomic():
+                changes = self.fix_batch(rows, stats, duplicates, planned if dry_run else None)
+                if changes and not dry_run:
+                    Contact.objects.bulk_update(changes, ['phone_number', 'phone_e164'], batch_size=500)
+
+            stats['checked'] += len(rows)
+            if time.monotonic() - last_report >= options['progress_every']:
+                last_report = time.monotonic()
+                self.report_progress(stats, total, started)
+
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"\n✅ Phone number fix completed{' (dry run)' if dry_run else ''} in {elapsed:.1f}s!"
+        ))
+        self.stdout.write(f"  • {'Would fix' if dry_run else 'Fixed'}: {stats['fixed']} contacts")
+        self.stdout.write(f"  • Already correct: {stats['already_correct']} contacts")
+        if stats['invalid']:
+            self.stdout.write(self.style.WARNING(f"  • Invalid numbers (left as is): {stats['invalid']} contacts"))
+        if stats['duplicates']:
+            self.stdout.write(self.style.WARNING(f"  • Duplicates (number belongs to another contact): {stats['duplicates']} contacts"))
+            for contact_id, phone_number, phone_e164 in duplicates:
+                holder = (
+                    Contact.objects.filter(phone_e164=phone_e164).exclude(id=contact_id)
+                    .values_list('id', flat=True).first()
+                )
+                held_by = f" (held by contact {holder})" if holder else ""
+                self.stdout.write(f"      Contact {contact_id}: {phone_number} → {phone_e164}{held_by}")
+            if stats['duplicates'] > len(duplicates):
+                self.stdout.write(f"      ... and {stats['duplicates'] - len(duplicates)} more")
+
+    def fix_batch(self, rows, stats, duplicates, planned):
+        """
+        Work out the new numbers for one batch of (id, phone_number, phone_e164) rows
+        Returns the Contact instances to bulk_update.
+        """
+        wanted = {}
+        for contact_id, phone_number, phone_e164 in rows:
+            new_e164 = to_e164(phone_number)
+            if new_e164 is None:
+                stats['invalid'] += 1
+                continue
+            new_phone = normalize_phone(phone_number)
+            if new_phone == phone_number and new_e164 == phone_e164:
+                stats['already_correct'] += 1
                 continue
-            
-            # Remove leading zeros if present
-            if phone.startswith('0'):
-                phone = phone[1:]
-            
-            # Remove +254 without leading plus if present
-            if phone.startswith('254'):
-                phone = phone[3:]
-            
-            # Add +254 prefix
-            new_phone = f"+254{phone}"
-            
-            try:
-                contact.phone_number = new_phone
-                contact.save()
-                fixed_count += 1
-                self.stdout.write(f"  Fixed: {contact.name} - {phone} → {new_phone}")
-            except Exception as e:
-                error_count += 1
-                self.stdout.write(self.style.ERROR(f"  Error fixing {contact.name}: {str(e)}"))
-
-        self.stdout.write(self.style.SUCCESS(f'\n✅ Phone number fix completed!'))
-        self.stdout.write(f'  • Fixed: {fixed_count} contacts')
-        self.stdout.write(f'  • Already correct: {already_correct} contacts')
-        if error_count > 0:
-            self.stdout.write(self.style.ERROR(f'  • Errors: {error_count} contacts'))
+            wanted[contact_id] = (phone_number, new_phone, new_e164, phone_e164)
+
+        # Numbers already held by contacts outside this set of changes (one query each)
+        targets = {new_e164 for _, _, new_e164, _ in wanted.values()}
+        taken = set(
+            Contact.objects.filter(phone_e164__in=targets)
+            .exclude(id__in=wanted)
+            .values_list('phone_e164', flat=True)
+        )
+        taken.update(
+            Contact.objects.filter(phone_number__in=targets)
+            .exclude(id__in=wanted)
+            .values_list('phone_number', flat=True)
+        )
+        if planned is not None:
+            taken.update(planned & targets)
+
+        # Numbers the changing contacts hold right now (both columns). They
+        # stay reserved for the whole batch: bulk_update writes the rows one
+        # by one, so moving a number between two contacts of the same batch
+        # could trip the unique constraints half-way through.
+        held_by = {}
+        for contact_id, (phone_number, _, _, phone_e164) in wanted.items():
+            for number in (phone_number, phone_e164):
+                if number:
+                    held_by.setdefault(number, set()).add(contact_id)
+
+        # Contacts that already hold their normalized number go first
+        changes = []
+        ordered = sorted(wanted.items(), key=lambda item: item[1][2] != item[1][3])
+        for contact_id, (phone_number, new_phone, new_e164, phone_e164) in ordered:
+            held_by_others = any(held_by.get(number, set()) - {contact_id} for number in (new_phone, new_e164))
+            if new_e164 in taken or held_by_others:
+                stats['duplicates'] += 1
+                if len(duplicates) < 20:
+                    duplicates.append((contact_id, phone_number, new_e164))
+                if phone_e164:
+                    taken.add(phone_e164)
+                continue
+            taken.add(new_e164)
+            if planned is not None:
+                planned.add(new_e164)
+            stats['fixed'] += 1
+            changes.append(Contact(id=contact_id, phone_number=new_phone, phone_e164=new_e164))
+        return changes
+
+    def report_progress(self, stats, total, started):
+        elapsed = time.monotonic() - started
+        rate = stats['checked'] / elapsed if elapsed else 0
+        self.stdout.write(
+            f"  {stats['checked']}/{total} checked ({rate:.0f} contacts/s), "
+            f"{stats['fixed']} fixed, {stats['duplicates']} duplicates"
+        )
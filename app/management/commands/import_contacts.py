@@ -0,0 +1,193 @@
+"""
+Django management command to import contacts from a CSV or JSONL file
+The file is streamed and written in batches: new contacts are inserted with
+bulk_create and, with --list, the list memberships are inserted straight into
+the ContactList.contacts through table. Memory use does not depend on the
+size of the file.
+
+CSV files need a header row; JSONL files hold one JSON object per line. Both
+use the fields phone_number (or phone), name and optionally is_active.
+Numbers are normalized to E.164; invalid numbers are skipped. Contacts that
+already exist (same normalized number) are not changed, but are still added
+to the list.
+Usage: python manage.py import_contacts contacts.csv
+       python manage.py import_contacts contacts.jsonl --list "VIP Customers"
+"""
+import csv
+import json
+import sys
+import time
+from itertools import islice
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import IntegrityError, transaction
+from app.models import Contact, ContactList
+from app.personalize import first_name
+from app.phones import to_e164
+
+
+FALSE_VALUES = {'0', 'false', 'no', 'n', 'inactive', ''}
+
+
+class Command(BaseCommand):
+    help = 'Imports contacts from a CSV or JSONL file in bulk, optionally into a contact list'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="CSV or JSONL file to import ('-' reads standard input)")
+        parser.add_argument(
+            '--format',
+            choices=['csv', 'jsonl'],
+            help='File format (default: guessed from the file extension)'
+        )
+        parser.add_argument(
+            '--list',
+            dest='list_name',
+            help='Add every imported contact to this contact list (created if missing)'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=5000,
+            help='Rows inserted per transaction (default: 5000)'
+        )
+        parser.add_argument(
+            '--progress-every',
+            type=float,
+            default=5.0,
+            help='Seconds between progress reports (default: 5)'
+        )
+
+    def handle(self, *args, **options):
+        path = options['path']
+        file_format = options['format'] or ('jsonl' if path.endswith(('.jsonl', '.ndjson')) else 'csv')
+
+        contact_list = None
+        if options['list_name']:
+            contact_list, _ = ContactList.objects.get_or_create(name=options['list_name'])
+
+        self.stdout.write(self.style.SUCCESS(f'📥 Importing contacts from {path} ({file_format})...'))
+
+        stats = {'read': 0, 'created': 0, 'existing': 0, 'invalid': 0, 'added_to_list': 0}
+        started = last_report = time.monotonic()
+
+        stream = sys.stdin if path == '-' else open(path, newline='', encoding='utf-8-sig')
+        try:
+            rows = self.read_rows(stream, file_format)
+            while True:
+                batch = list(islice(rows, options['batch_size']))
+                if not batch:
+                    break
+                with transaction.atomic():
+                    self.import_batch(batch, contact_list, stats)
+
+                if time.monotonic() - last_report >= options['progress_every']:
+                    last_report = time.monotonic()
+                    self.report_progress(stats, started)
+        finally:
+            if stream is not sys.stdin:
+                stream.close()
+
+        # bulk_create skips the signals that maintain list counters and menu caches
+        if contact_list is not None:
+            ContactList.recount_contacts([contact_list.pk])
+
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(f'\n✅ Import completed in {elapsed:.1f}s!'))
+        self.stdout.write(f"  • Rows read: {stats['read']} ({stats['read'] / elapsed if elapsed else 0:.0f} rows/s)")
+        self.stdout.write(f"  • New contacts: {stats['created']}")
+        self.stdout.write(f"  • Already existing: {stats['existing']}")
+        if contact_list is not None:
+            self.stdout.write(f"  • Added to '{contact_list.name}': {stats['added_to_list']}")
+        if stats['invalid']:
+            self.stdout.write(self.style.WARNING(f"  • Skipped (missing or invalid phone number): {stats['invalid']}"))
+
+    def read_rows(self, stream, file_format):
+        """Yield one dict per contact row"""
+        if file_format == 'csv':
+            yield from csv.DictReader(stream)
+            return
+        for line_number, line in enumerate(stream, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError as e:
+                raise CommandError(f'Line {line_number} is not valid JSON: {e}')
+
+    def import_batch(self, batch, contact_list, stats):
+        """Insert one batch of rows and their list memberships"""
+        stats['read'] += len(batch)
+
+        # Normalize, dropping invalid numbers and repeats within the batch
+        contacts = {}
+        for row in batch:
+            phone_e164 = to_e164(str(row.get('phone_number') or row.get('phone') or ''))
+            if phone_e164 is None:
+                stats['invalid'] += 1
+                continue
+            if phone_e164 in contacts:
+                continue
+            is_active = row.get('is_active', True)
+            if isinstance(is_active, str):
+                is_active = is_active.strip().lower() not in FALSE_VALUES
+            name = str(row.get('name') or '').strip()[:100]
+            contacts[phone_e164] = Contact(
+                phone_number=phone_e164,
+                phone_e164=phone_e164,
+                name=name,
+                first_name=first_name(name),
+                is_active=bool(is_active)
+            )
+
+        existing = set(
+            Contact.objects.filter(phone_e164__in=list(contacts)).values_list('phone_e164', flat=True)
+        )
+        new_contacts = [contact for phone, contact in contacts.items() if phone not in existing]
+        created = self.insert_new(Contact, new_contacts)
+        stats['created'] += created
+        stats['existing'] += len(contacts) - created
+
+        if contact_list is not None:
+            Membership = ContactList.contacts.through
+            contact_ids = set(
+                Contact.objects.filter(phone_e164__in=list(contacts)).values_list('id', flat=True)
+            )
+            contact_ids -= set(
+                Membership.objects.filter(
+                    contactlist_id=contact_list.pk, contact_id__in=contact_ids
+                ).values_list('contact_id', flat=True)
+            )
+            memberships = [Membership(contactlist_id=contact_list.pk, contact_id=pk) for pk in contact_ids]
+            stats['added_to_list'] += self.insert_new(Membership, memberships)
+
+    def insert_new(self, model, objs):
+        """
+        Insert rows the caller found missing and return how many were written
+        Another writer may have added some of them since they were looked up.
+        That fails the whole insert, which is then retried one row at a time
+        so only the conflicting rows are skipped and the count stays exact.
+        """
+        try:
+            with transaction.atomic():
+                model.objects.bulk_create(objs)
+            return len(objs)
+        except IntegrityError:
+            pass
+
+        inserted = 0
+        for obj in objs:
+            try:
+                with transaction.atomic():
+                    model.objects.bulk_create([obj])
+                inserted += 1
+            except IntegrityError:
+                pass
+        return inserted
+
+    def report_progress(self, stats, started):
+        elapsed = time.monotonic() - started
+        self.stdout.write(
+            f"  {stats['read']} rows read ({stats['read'] / elapsed if elapsed else 0:.0f} rows/s), "
+            f"{stats['created']} new contacts"
+        )
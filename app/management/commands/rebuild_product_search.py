@@ -0,0 +1,26 @@
+"""
+Django management command to rebuild the full-text product search index
+The index is kept in sync by database triggers, so this is only needed
+after restoring a database without them or to compact the index.
+Usage: python manage.py rebuild_product_search
+"""
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError
+from app.search import rebuild_index
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the full-text search index of all products'
+
+    def handle(self, *args, **options):
+        self.stdout.write(self.style.SUCCESS('🔎 Rebuilding product search index...'))
+        started = time.monotonic()
+        try:
+            indexed = rebuild_index()
+        except OperationalError as e:
+            raise CommandError(str(e))
+        self.stdout.write(self.style.SUCCESS(
+            f'✅ Indexed {indexed} products in {time.monotonic() - started:.1f}s'
+        ))
@@ -0,0 +1,30 @@
+"""
+Django management command to recompute contact list member counters
+ContactList.active_contact_count is kept up to date by signals, but bulk
+operations (queryset.update, bulk_create, raw SQL) bypass them.
+Usage: python manage.py recount_contact_lists
+"""
+from django.core.management.base import BaseCommand
+from app.models import ContactList
+
+
+class Command(BaseCommand):
+    help = 'Recomputes the active contact counter of every contact list'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--list',
+            type=int,
+            action='append',
+            dest='list_ids',
+            help='Only recount this contact list id (can be repeated)'
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write(self.style.SUCCESS('🔢 Recounting contact lists...'))
+
+        fixed = ContactList.recount_contacts(list_ids=options['list_ids'])
+
+        if fixed:
+            self.stdout.write(self.style.WARNING(f'  • Corrected {fixed} contact lists'))
+        self.stdout.write(self.style.SUCCESS('✅ Contact list counters are up to date'))
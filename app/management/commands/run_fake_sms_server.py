@@ -0,0 +1,129 @@
+"""
+Django management command that runs a local stand-in for the Africa's Talking
+bulk SMS endpoint, for load-testing the send pipeline without the network.
+Point the app at it with:
+    SMS_BACKEND = 'app.sms_backends.HttpSmsBackend'
+    SMS_BACKEND_OPTIONS = {'url': 'http://127.0.0.1:8025/version1/messaging'}
+Usage: python manage.py run_fake_sms_server
+       python manage.py run_fake_sms_server --latency 0.3 --failure-rate 0.02 --reject-rate 0.05
+"""
+import json
+import random
+import signal
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+
+from django.core.management.base import BaseCommand
+from app.sms_backends import fake_response
+
+
+class FakeSmsHandler(BaseHTTPRequestHandler):
+    """Handles POST /version1/messaging like Africa's Talking"""
+    protocol_version = 'HTTP/1.1'  # keep-alive, like the real API
+
+    def do_POST(self):
+        server = self.server
+        length = int(self.headers.get('Content-Length', 0))
+        form = parse_qs(self.rfile.read(length).decode())
+
+        if self.path.rstrip('/') != '/version1/messaging':
+            return self.reply(404, {'error': 'Not found'})
+
+        recipients = [n for n in form.get('to', [''])[0].split(',') if n]
+        if not recipients or not form.get('message'):
+            return self.reply(400, {'error': 'to and message are required'})
+
+        delay = server.latency + random.uniform(0, server.jitter)
+        if delay:
+            time.sleep(delay)
+
+        with server.lock:
+            server.requests += 1
+            failed = random.random() < server.failure_rate
+            if not failed:
+                server.messages += len(recipients)
+        if failed:
+            return self.reply(500, {'error': 'Simulated server error'})
+        return self.reply(201, fake_response(recipients, server.reject_rate))
+
+    def reply(self, status, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        """Keep the console quiet; totals are printed by the command"""
+
+
+class Command(BaseCommand):
+    help = "Runs a local fake of the Africa's Talking bulk SMS API for offline load tests"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1', help='Address to listen on (default: 127.0.0.1)')
+        parser.add_argument('--port', type=int, default=8025, help='Port to listen on (default: 8025)')
+        parser.add_argument(
+            '--latency',
+            type=float,
+            default=0.0,
+            help='Seconds every request takes (default: 0)'
+        )
+        parser.add_argument(
+            '--jitter',
+            type=float,
+            default=0.0,
+            help='Extra random delay of up to this many seconds (default: 0)'
+        )
+        parser.add_argument(
+            '--failure-rate',
+            type=float,
+            default=0.0,
+            help='Fraction of requests answered with HTTP 500 (default: 0)'
+        )
+        parser.add_argument(
+            '--reject-rate',
+            type=float,
+            default=0.0,
+            help='Fraction of recipients reported as InvalidPhoneNumber (default: 0)'
+        )
+
+    def handle(self, *args, **options):
+        # Stop cleanly (and print totals) on kill as well as on Ctrl+C
+        signal.signal(signal.SIGTERM, self.stop)
+        server = ThreadingHTTPServer((options['host'], options['port']), FakeSmsHandler)
+        server.daemon_threads = True
+        server.latency = options['latency']
+        server.jitter = options['jitter']
+        server.failure_rate = options['failure_rate']
+        server.reject_rate = options['reject_rate']
+        server.lock = threading.Lock()
+        server.requests = server.messages = 0
+
+        self.stdout.write(self.style.SUCCESS(
+            f"📡 Fake SMS server on http://{options['host']}:{options['port']}/version1/messaging"
+        ))
+        self.stdout.write(
+            f"  latency {server.latency}s (+{server.jitter}s), "
+            f"failure rate {server.failure_rate:.0%}, reject rate {server.reject_rate:.0%}"
+        )
+
+        started = time.monotonic()
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ Served {server.requests} requests / {server.messages} messages "
+            f"in {elapsed:.1f}s ({server.messages / elapsed if elapsed else 0:.0f} messages/s)"
+        ))
+
+    def stop(self, signum, frame):
+        raise KeyboardInterrupt
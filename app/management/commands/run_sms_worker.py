@@ -0,0 +1,118 @@
+"""
+Django management command that sends queued campaigns through the outbox
+The USSD menu only queues a SendJob. Workers split each job into outbox
+batches, then lease batches one at a time, send them and record the result.
+Several workers can run at once (on one or more machines sharing the database).
+While the SMS provider's circuit breaker is open no batches are picked up.
+Database errors are logged and retried after --poll-interval seconds. Other
+errors fail the job or batch once its attempts are used up
+(SMS_OUTBOX_JOB_ATTEMPTS, SMS_RETRY_ATTEMPTS).
+Usage: python manage.py run_sms_worker
+       python manage.py run_sms_worker --once   (process the queue, then exit)
+       python manage.py run_sms_worker --concurrency 8   (8 batches in flight)
+"""
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import DatabaseError, close_old_connections
+from app.circuit_breaker import sms_circuit_breaker
+from app.outbox import (
+    LeaseLost, claim_batch, claim_job, expand_job, job_attempts, record_job_error, release_batch, send_batch,
+    worker_name
+)
+
+
+class Command(BaseCommand):
+    help = 'Sends queued SMS campaigns (run one or more of these next to the web server)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Exit when the queue is empty instead of waiting for new jobs'
+        )
+        parser.add_argument(
+            '--poll-interval',
+            type=float,
+            default=2.0,
+            help='Seconds to wait between polls when the queue is empty (default: 2)'
+        )
+        parser.add_argument(
+            '--concurrency',
+            type=int,
+            default=1,
+            help='Batches sent at the same time by this worker (default: 1); '
+                 'pairs well with SMS_BACKEND = AsyncHttpSmsBackend'
+        )
+
+    def handle(self, *args, **options):
+        worker = worker_name()
+        concurrency = max(options['concurrency'], 1)
+        self.stdout.write(self.style.SUCCESS(f'📨 SMS worker {worker} started ({concurrency} batches at a time)'))
+        jobs = batches = 0
+
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            while True:
+                try:
+                    did_work = False
+
+                    job = claim_job(worker)
+                    if job is not None:
+                        did_work = True
+                        jobs += 1
+                        try:
+                            count = expand_job(job, worker)
+                            self.stdout.write(f"  Job {job.reference}: split into {count} batches")
+                        except LeaseLost as e:
+                            self.stdout.write(self.style.WARNING(f"  {e}"))
+                        except DatabaseError:
+                            raise
+                        except Exception as e:
+                            error = f"{type(e).__name__}: {e}"
+                            record_job_error(job, worker, error)
+                            self.stdout.write(self.style.ERROR(
+                                f"  Job {job.reference}: {error} (attempt {job.attempts} of {job_attempts()})"
+                            ))
+
+                    # Leave batches alone while the provider is known to be down
+                    claimed = []
+                    while len(claimed) < concurrency and not sms_circuit_breaker.retry_after():
+                        batch = claim_batch(worker)
+                        if batch is None:
+                            break
+                        claimed.append(batch)
+
+                    statuses = pool.map(lambda batch: self.send(batch, worker), claimed)
+                    for batch, status in zip(claimed, statuses):
+                        did_work = True
+                        batches += 1
+                        if status == 'sent':
+                            self.stdout.write(f"  Batch {batch.pk} (job #{batch.job_id}): sent to {batch.recipients_count} contacts")
+                        elif status == 'pending':
+                            self.stdout.write(self.style.WARNING(f"  Batch {batch.pk} (job #{batch.job_id}): not sent, will retry"))
+                        else:
+                            self.stdout.write(self.style.ERROR(f"  Batch {batch.pk} (job #{batch.job_id}): failed"))
+                except DatabaseError as e:
+                    # e.g. the database is locked, restarting or unreachable: keep the
+                    # worker alive and try again; leases of anything half done expire
+                    self.stdout.write(self.style.ERROR(f"  Database error: {type(e).__name__}: {e}"))
+                    close_old_connections()
+                    time.sleep(options['poll_interval'])
+                    continue
+
+                if not did_work:
+                    if options['once']:
+                        break
+                    time.sleep(options['poll_interval'])
+
+        self.stdout.write(self.style.SUCCESS(f'✅ Processed {jobs} jobs and {batches} batches'))
+
+    def send(self, batch, worker):
+        """send_batch; an unexpected error (other than a database one) gives the batch back"""
+        try:
+            return send_batch(batch, worker)
+        except DatabaseError:
+            raise
+        except Exception as e:
+            return release_batch(batch, worker, f"{type(e).__name__}: {e}")
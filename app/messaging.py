@@ -0,0 +1,556 @@
+"""
+SMS sending functions
+Sends through the configured SMS backend (see app/sms_backends.py) and logs
+every send in the database.
+Used by the views and by the run_sms_worker management command.
+"""
+from django.conf import settings
+from django.db import DatabaseError
+from .models import Contact, Campaign, SentCampaign, SentMessage
+from .analytics import record_campaign, record_sent_campaign
+from .personalize import compile_message
+from .ratelimit import sms_rate_limiter
+from .circuit_breaker import backoff_delay, retry_attempts, sms_circuit_breaker
+from .sms_backends import get_sms_backend
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+import json
+import time
+
+
+# Africa's Talking status codes meaning the recipient was accepted
+ACCEPTED_STATUS_CODES = (100, 101, 102)
+
+NO_RECIPIENTS_IN_LIST = 'No active contacts with a valid phone number in this list'
+
+
+# ==========================
+# Helpers
+# ==========================
+def chunked(iterable, size):
+    """Yield lists of up to `size` items from any iterable"""
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def count_delivered(response):
+    """
+    Count accepted and rejected recipients in an Africa's Talking send response
+    Returns (sent, failed)
+    """
+    recipients = response.get('SMSMessageData', {}).get('Recipients', []) if isinstance(response, dict) else []
+    sent = sum(1 for r in recipients if r.get('statusCode') in ACCEPTED_STATUS_CODES)
+    return sent, len(recipients) - sent
+
+
+def friendly_error(error_message):
+    """Turn a provider/network exception message into a user-friendly message"""
+    if 'Circuit breaker' in error_message:
+        return 'SMS service is temporarily unavailable. Try again in a few minutes.'
+    elif 'SSL' in error_message:
+        return 'Network security error. Check your internet connection.'
+    elif 'Connection' in error_message:
+        return 'Cannot connect to SMS service. Try again later.'
+    elif 'Invalid phone' in error_message:
+        return 'Invalid phone number format detected.'
+    return 'SMS service unavailable. Please try again.'
+
+
+# ==========================
+# SMS Sending Functions
+# ==========================
+def update_breaker(method, *args):
+    """
+    Call a circuit breaker method for send_chunk, logging database errors
+    The breaker only decides when requests are made. A lost update delays
+    opening or closing it, which is better than reporting a request that
+    was (or could have been) sent as a provider failure. Returns None when
+    the database could not be used, so a breaker that cannot be read lets
+    the request through.
+    """
+    try:
+        return method(*args)
+    except DatabaseError as e:
+        print(f"[SMS ERROR] Circuit breaker not updated: {type(e).__name__}: {e}")
+        return None
+
+
+def send_chunk(message, recipients):
+    """
+    Send one provider request and summarise the outcome
+    A failed provider request is reported in the 'error' key and counted by
+    the circuit breaker. Nothing is sent while the breaker is open
+    ('circuit_open' key). Database errors of the shared rate limiter are
+    local problems, not provider failures: they are raised to the caller.
+    Breaker bookkeeping errors are logged and never raised (see
+    update_breaker).
+    """
+    if update_breaker(sms_circuit_breaker.allow) is False:
+        return {
+            'recipients': len(recipients),
+            'sent': 0,
+            'failed': len(recipients),
+            'error': 'Circuit breaker open: SMS provider is failing',
+            'circuit_open': True,
+        }
+
+    # Wait for the shared provider rate limit (SMS_RATE_* settings)
+    sms_rate_limiter.acquire(len(recipients))
+
+    try:
+        response = get_sms_backend().send(message, recipients)
+    except Exception as e:
+        print(f"[SMS ERROR] {type(e).__name__}: {e}")
+        update_breaker(sms_circuit_breaker.record_failure, f"{type(e).__name__}: {e}")
+        return {
+            'recipients': len(recipients),
+            'sent': 0,
+            'failed': len(recipients),
+            'error': f"{type(e).__name__}: {e}",
+        }
+
+    update_breaker(sms_circuit_breaker.record_success)
+    sent, failed = count_delivered(response)
+    if sent + failed == 0:
+        # The provider did not accept anyone (e.g. bad sender id)
+        failed = len(recipients)
+    return {
+        'recipients': len(recipients),
+        'sent': sent,
+        'failed': failed,
+        'response': response,
+    }
+
+
+def send_chunk_with_retries(message, recipients):
+    """
+    send_chunk, retried with jittered exponential backoff on provider errors
+    Gives up at once when the circuit breaker is open.
+    """
+    attempt = 1
+    while True:
+        result = send_chunk(message, recipients)
+        if 'error' not in result or result.get('circuit_open') or attempt >= retry_attempts():
+            return result
+        delay = backoff_delay(attempt)
+        print(f"[SMS] Attempt {attempt} failed, retrying in {delay:.1f}s")
+        time.sleep(delay)
+        attempt += 1
+
+
+class SendSummary:
+    """
+    Running totals over the chunks of one send
+    Keeps counts and the first few errors only, so memory use does not
+    grow with the number of recipients.
+    """
+    MAX_ERRORS = 10
+
+    def __init__(self):
+        self.chunks = 0
+        self.recipients = 0
+        self.sent = 0
+        self.failed = 0
+        self.errors = []
+
+    def add(self, result):
+        self.chunks += 1
+        self.recipients += result['recipients']
+        self.sent += result['sent']
+        self.failed += result['failed']
+        if 'error' in result and len(self.errors) < self.MAX_ERRORS:
+            self.errors.append(result['error'])
+
+    @property
+    def status(self):
+        return campaign_status(self.sent, self.failed)
+
+    def as_dict(self):
+        return {
+            'chunks': self.chunks,
+            'recipients': self.recipients,
+            'sent': self.sent,
+            'failed': self.failed,
+            'errors': self.errors,
+        }
+
+
+def send_chunks(batches, max_workers, on_result=None):
+    """
+    Send every (message, recipients) batch through a bounded thread pool
+    At most 2 * max_workers batches are queued at a time, so `batches` can be
+    a lazy generator. on_result(recipients, result) is called in this thread
+    as each batch finishes. Returns a SendSummary of all batch results.
+    """
+    summary = SendSummary()
+
+    def collect(chunk, future):
+        result = future.result()
+        summary.add(result)
+        if on_result is not None:
+            on_result(chunk, result)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        in_flight = deque()
+        for message, chunk in batches:
+            in_flight.append((chunk, pool.submit(send_chunk_with_retries, message, chunk)))
+            if len(in_flight) >= max_workers * 2:
+                collect(*in_flight.popleft())
+        for chunk, future in in_flight:
+            collect(chunk, future)
+    return summary
+
+
+def record_deliveries(sent_campaign, recipients, result):
+    """
+    Store one SentMessage per recipient of a sent chunk
+    Uses a single bulk_create per chunk. Numbers the provider did not report
+    on (or every number, when the request itself failed) are stored as failed.
+    """
+    reported = {}
+    if isinstance(result.get('response'), dict):
+        for entry in result['response'].get('SMSMessageData', {}).get('Recipients', []):
+            reported[entry.get('number')] = entry
+
+    missing = result.get('error', 'Not reported by the provider')[:100]
+    rows = []
+    for phone in recipients:
+        entry = reported.pop(phone, None)
+        if entry is None:
+            rows.append(SentMessage(
+                sent_campaign=sent_campaign,
+                phone_number=phone,
+                status='failed',
+                provider_status=missing
+            ))
+            continue
+        rows.append(SentMessage(
+            sent_campaign=sent_campaign,
+            phone_number=phone,
+            status='sent' if entry.get('statusCode') in ACCEPTED_STATUS_CODES else 'failed',
+            status_code=entry.get('statusCode'),
+            provider_status=str(entry.get('status', ''))[:100],
+            message_id=str(entry.get('messageId', '') or '')[:100],
+            cost=str(entry.get('cost', '') or '')[:30]
+        ))
+    SentMessage.objects.bulk_create(rows, batch_size=1000)
+    return len(rows)
+
+
+def campaign_status(sent, failed):
+    """SentCampaign/Campaign status for the given accepted/rejected counts"""
+    if sent == 0:
+        return 'failed'
+    if failed == 0:
+        return 'success'
+    return 'partial'
+
+
+def sms_batch_size():
+    """Recipients per provider request (SMS_BATCH_SIZE in settings)"""
+    return getattr(settings, 'SMS_BATCH_SIZE', 1000)
+
+
+def stream_chunk_size():
+    """Rows fetched per database round-trip when streaming recipients"""
+    return getattr(settings, 'SMS_STREAM_CHUNK_SIZE', 2000)
+
+
+def sms_send_threads():
+    """Provider requests in flight at once (SMS_SEND_THREADS in settings)"""
+    return getattr(settings, 'SMS_SEND_THREADS', 4)
+
+
+# ==========================
+# Recipient pipeline
+# ==========================
+def sendable(contacts):
+    """The contacts of a queryset that can be sent to: active, with a valid number"""
+    return contacts.filter(is_active=True, phone_e164__isnull=False)
+
+
+def stream_recipients(contacts, chunk_size=None):
+    """
+    Yield (phone, name) for the active contacts of a queryset
+    
+    Phones come straight from the normalized Contact.phone_e164 column;
+    contacts without a valid number are skipped. Rows are read in
+    keyset-paginated pages of `chunk_size` (in id order, which walks the
+    primary key index with no sort) as plain tuples, so no Contact instances are built and only one page is
+    held in memory at a time. Unlike .iterator(), no read cursor stays open
+    between pages; on SQLite that would block the rate limiter and circuit
+    breaker writes made by the sending threads.
+    """
+    size = chunk_size or stream_chunk_size()
+    rows = sendable(contacts).values_list('phone_e164', 'name', 'id').order_by('id')
+
+    last_id = 0
+    while True:
+        page = list(rows.filter(id__gt=last_id)[:size])
+        for phone, name, _ in page:
+            yield phone, name
+        if len(page) < size:
+            return
+        last_id = page[-1][2]
+
+
+def recipient_batches(contacts, batch_size=None):
+    """Lazily yield lists of up to `batch_size` phone numbers, ready to send"""
+    phones = (phone for phone, name in stream_recipients(contacts))
+    return chunked(phones, batch_size or sms_batch_size())
+
+
+def first_name_keys(contacts, page_size=1000):
+    """
+    Yield the distinct Contact.first_name values of the sendable contacts of a
+    queryset, in order, reading keyset pages of `page_size` names
+    """
+    names = sendable(contacts).order_by('first_name').values_list('first_name', flat=True).distinct()
+    last = None
+    while True:
+        page = list((names if last is None else names.filter(first_name__gt=last))[:page_size])
+        yield from page
+        if len(page) < page_size:
+            return
+        last = page[-1]
+
+
+def message_batches(message, contacts, batch_size=None, max_open_groups=100):
+    """
+    Lazily yield (text, phones) batches for a campaign message
+    
+    A message without placeholders is sent as-is in plain chunks. Otherwise
+    each recipient's text is rendered and recipients with identical text
+    (e.g. the same first name) share a batch, so the number of provider
+    requests follows the number of distinct messages, not of recipients.
+    Contacts are read one first name at a time (an id-ordered pass over the
+    (first_name, id) index per name), so every recipient of a [Name] text
+    arrives before the next name starts and no batch is sent before it is
+    full or its name is done. Texts that vary within a name ([FullName])
+    keep at most `max_open_groups` partly filled batches in memory, the
+    least recently used one being sent when a new text needs room.
+    """
+    size = batch_size or sms_batch_size()
+    compiled = compile_message(message)
+    if compiled.is_static:
+        for chunk in recipient_batches(contacts, size):
+            yield message, chunk
+        return
+
+    for key in first_name_keys(contacts):
+        groups = OrderedDict()  # rendered text -> phones, least recently used first
+        for phone, name in stream_recipients(contacts.filter(first_name=key)):
+            text = compiled.render(name)
+            group = groups.get(text)
+            if group is None:
+                group = groups[text] = []
+            else:
+                groups.move_to_end(text)
+            group.append(phone)
+
+            if len(group) >= size:
+                del groups[text]
+                yield text, group
+            elif len(groups) > max_open_groups:
+                yield groups.popitem(last=False)
+
+        # Every recipient with this first name has been read
+        yield from groups.items()
+
+
+# ==========================
+# SMS Sending Functions
+# ==========================
+def send_campaign_to_list(campaign_template, contact_list, sent_by_phone, batch_size=None, max_workers=None):
+    """
+    Send a campaign to a specific contact list
+    
+    Recipients are streamed from the database in provider-sized chunks
+    (SMS_BATCH_SIZE) which are sent concurrently by up to SMS_SEND_THREADS
+    threads, so memory use stays flat whatever the size of the list.
+    Placeholders such as [Name] are filled in per recipient, and recipients
+    who get the same text share a chunk. The
+    outcome of every chunk is recorded on one SentCampaign; if only some
+    chunks fail its status is 'partial'.
+    
+    Args:
+        campaign_template: CampaignTemplate object
+        contact_list: ContactList object
+        sent_by_phone: Phone number of user sending the campaign
+        batch_size: Recipients per chunk (defaults to SMS_BATCH_SIZE)
+        max_workers: Concurrent chunk sends (defaults to SMS_SEND_THREADS)
+    
+    Returns:
+        Dictionary with success status and details
+    """
+    message = None
+    sent_campaign = None
+    recorded = False
+    
+    try:
+        # Get all active contacts in the list
+        contacts = contact_list.contacts.all()
+        
+        if not sendable(contacts).exists():
+            return {
+                'success': False,
+                'message': NO_RECIPIENTS_IN_LIST,
+                'count': 0
+            }
+        
+        # Use campaign message
+        message = campaign_template.message
+        
+        # Log the campaign first so per-recipient results can point at it
+        sent_campaign = SentCampaign.objects.create(
+            campaign_template=campaign_template,
+            contact_list=contact_list,
+            message=message,
+            sent_by=sent_by_phone,
+            status='sending'
+        )
+        
+        print(f"[SMS] Sending to list '{contact_list.name}' ({contact_list.active_contact_count} contacts)...")
+        
+        # Send SMS using Africa's Talking, one request per chunk of identical messages
+        summary = send_chunks(
+            message_batches(message, contacts, batch_size),
+            max_workers or sms_send_threads(),
+            on_result=lambda chunk, result: record_deliveries(sent_campaign, chunk, result)
+        )
+        
+        print(f"[SMS] {summary.chunks} chunks: {summary.sent} sent, {summary.failed} failed")
+        
+        # Record the outcome
+        sent_campaign.recipients_count = summary.recipients
+        sent_campaign.api_response = json.dumps(summary.as_dict())
+        sent_campaign.status = summary.status
+        sent_campaign.save(update_fields=['recipients_count', 'api_response', 'status'])
+        record_sent_campaign(sent_campaign, summary.sent, summary.failed)
+        recorded = True
+        
+        if summary.status == 'failed':
+            error_message = summary.errors[0] if summary.errors else 'No recipients were accepted'
+            message = friendly_error(error_message)
+            if not summary.recipients and not summary.errors:
+                # Every contact changed or lost its number after the check above
+                error_message = message = NO_RECIPIENTS_IN_LIST
+            return {
+                'success': False,
+                'message': message,
+                'count': 0,
+                'technical_error': error_message,
+                'sent_campaign': sent_campaign
+            }
+        
+        return {
+            'success': True,
+            'message': 'Campaign sent successfully' if summary.status == 'success' else 'Campaign partially sent',
+            'count': summary.sent,
+            'failed': summary.failed,
+            'response': summary.as_dict(),
+            'sent_campaign': sent_campaign
+        }
+        
+    except Exception as e:
+        # Detailed error logging
+        error_message = str(e)
+        error_type = type(e).__name__
+        
+        print(f"[SMS ERROR] Type: {error_type}")
+        print(f"[SMS ERROR] Message: {error_message}")
+        
+        # Log failed attempt
+        if sent_campaign is None:
+            sent_campaign = SentCampaign.objects.create(
+                campaign_template=campaign_template,
+                contact_list=contact_list,
+                message=message if message else 'Error occurred before sending',
+                recipients_count=0,
+                sent_by=sent_by_phone,
+                api_response=f"{error_type}: {error_message}",
+                status='failed'
+            )
+        else:
+            sent_campaign.api_response = f"{error_type}: {error_message}"
+            sent_campaign.status = 'failed'
+            sent_campaign.save(update_fields=['api_response', 'status'])
+        if not recorded:
+            record_sent_campaign(sent_campaign, 0, sent_campaign.recipients_count)
+        
+        # Return user-friendly error message
+        return {
+            'success': False,
+            'message': friendly_error(error_message),
+            'count': 0,
+            'technical_error': error_message,
+            'sent_campaign': sent_campaign
+        }
+
+
+def send_sms_campaign():
+    """
+    Helper function to send SMS to all active contacts (legacy function)
+    Recipients are streamed and sent in chunks like send_campaign_to_list
+    Returns a dictionary with success status and message
+    """
+    # The SMS message to send
+    message = "Hello! This is a promotional message from FlowMarket. Thank you for being our valued customer!"
+    
+    try:
+        # Get all active contacts
+        contacts = Contact.objects.all()
+        
+        if not sendable(contacts).exists():
+            return {
+                'success': False,
+                'message': 'No active contacts with a valid phone number found',
+                'count': 0
+            }
+        
+        # Send SMS using Africa's Talking
+        summary = send_chunks(message_batches(message, contacts), sms_send_threads())
+        
+        # Log the campaign in database
+        campaign = Campaign.objects.create(
+            message=message,
+            recipients_count=summary.recipients,
+            api_response=json.dumps(summary.as_dict()),
+            status=summary.status
+        )
+        record_campaign(campaign, summary.sent, summary.failed)
+        
+        if summary.status == 'failed':
+            return {
+                'success': False,
+                'message': summary.errors[0] if summary.errors else 'No recipients were accepted',
+                'count': 0
+            }
+        
+        return {
+            'success': True,
+            'message': 'SMS sent successfully',
+            'count': summary.sent,
+            'response': summary.as_dict()
+        }
+        
+    except Exception as e:
+        # If something goes wrong, log it
+        campaign = Campaign.objects.create(
+            message=message,
+            recipients_count=0,
+            api_response=str(e),
+            status='failed'
+        )
+        record_campaign(campaign, 0, 0)
+        
+        return {
+            'success': False,
+            'message': str(e),
+            'count': 0
+        }
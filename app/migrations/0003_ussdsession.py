@@ -0,0 +1,25 @@
+# Generated by Django 4.2.26 on 2026-10-17 02:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0002_campaigntemplate_contactlist_product_sentcampaign'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UssdSession',
+            fields=[
+                ('session_id', models.CharField(help_text="Session ID sent by Africa's Talking", max_length=100, primary_key=True, serialize=False)),
+                ('data', models.TextField(default='{}', help_text='Session data as JSON')),
+                ('expires_at', models.DateTimeField(db_index=True, help_text='When this session times out')),
+            ],
+            options={
+                'verbose_name': 'USSD Session',
+                'verbose_name_plural': 'USSD Sessions',
+            },
+        ),
+    ]
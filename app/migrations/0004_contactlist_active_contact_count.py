@@ -0,0 +1,34 @@
+# Generated by Django 4.2.26 on 2026-10-17 02:12
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count_active_contacts(apps, schema_editor):
+    """Fill in the counter for existing lists"""
+    ContactList = apps.get_model('app', 'ContactList')
+    membership = ContactList.contacts.through.objects.filter(
+        contactlist_id=OuterRef('pk'),
+        contact__is_active=True
+    )
+    ContactList.objects.update(active_contact_count=Coalesce(
+        Subquery(membership.order_by().values('contactlist_id').annotate(n=Count('*')).values('n')),
+        0
+    ))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0003_ussdsession'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='contactlist',
+            name='active_contact_count',
+            field=models.PositiveIntegerField(default=0, editable=False, help_text='Number of active contacts in this list'),
+        ),
+        migrations.RunPython(count_active_contacts, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 4.2.26 on 2026-10-17 02:14
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0004_contactlist_active_contact_count'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SendJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('requested_by', models.CharField(blank=True, help_text='Phone number of user who requested the send', max_length=20)),
+                ('status', models.CharField(choices=[('queued', 'Queued'), ('running', 'Running'), ('done', 'Done'), ('failed', 'Failed')], default='queued', max_length=20)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('error', models.TextField(blank=True, help_text='Error message if the job failed')),
+                ('campaign_template', models.ForeignKey(blank=True, help_text='The campaign template to send', null=True, on_delete=django.db.models.deletion.SET_NULL, to='app.campaigntemplate')),
+                ('contact_list', models.ForeignKey(blank=True, help_text='The contact list to send to', null=True, on_delete=django.db.models.deletion.SET_NULL, to='app.contactlist')),
+                ('sent_campaign', models.ForeignKey(blank=True, help_text='Log entry written when the send finished', null=True, on_delete=django.db.models.deletion.SET_NULL, to='app.sentcampaign')),
+            ],
+            options={
+                'verbose_name': 'Send Job',
+                'verbose_name_plural': 'Send Jobs',
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['status', 'created_at'], name='app_sendjob_status_951278_idx')],
+            },
+        ),
+    ]
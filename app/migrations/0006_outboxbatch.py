@@ -0,0 +1,57 @@
+# Generated by Django 4.2.26 on 2026-10-17 02:16
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0005_sendjob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='sendjob',
+            name='leased_by',
+            field=models.CharField(blank=True, max_length=100),
+        ),
+        migrations.AddField(
+            model_name='sendjob',
+            name='leased_until',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='sentcampaign',
+            name='status',
+            field=models.CharField(choices=[('sending', 'Sending'), ('success', 'Success'), ('failed', 'Failed'), ('partial', 'Partial Success')], default='success', max_length=20),
+        ),
+        migrations.CreateModel(
+            name='OutboxBatch',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('message', models.TextField(help_text='The SMS message to send')),
+                ('recipients', models.TextField(help_text='JSON list of phone numbers')),
+                ('recipients_count', models.IntegerField(default=0)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('leased', 'Leased'), ('sent', 'Sent'), ('failed', 'Failed')], default='pending', max_length=20)),
+                ('attempts', models.IntegerField(default=0, help_text='Number of times a worker has picked up this batch')),
+                ('available_at', models.DateTimeField(default=django.utils.timezone.now, help_text='Do not send before this time')),
+                ('leased_until', models.DateTimeField(blank=True, null=True)),
+                ('leased_by', models.CharField(blank=True, max_length=100)),
+                ('sent_count', models.IntegerField(default=0, help_text='Recipients accepted by the provider')),
+                ('failed_count', models.IntegerField(default=0, help_text='Recipients rejected by the provider')),
+                ('api_response', models.TextField(blank=True, help_text="Response from Africa's Talking API", null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('sent_at', models.DateTimeField(blank=True, null=True)),
+                ('job', models.ForeignKey(help_text='The job this batch belongs to', on_delete=django.db.models.deletion.CASCADE, related_name='batches', to='app.sendjob')),
+                ('sent_campaign', models.ForeignKey(blank=True, help_text='Log entry the outcome is recorded on', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='batches', to='app.sentcampaign')),
+            ],
+            options={
+                'verbose_name': 'Outbox Batch',
+                'verbose_name_plural': 'Outbox Batches',
+                'ordering': ['id'],
+                'indexes': [models.Index(fields=['status', 'available_at'], name='app_outboxb_status_4c96da_idx'), models.Index(fields=['status', 'leased_until'], name='app_outboxb_status_4133da_idx')],
+            },
+        ),
+    ]
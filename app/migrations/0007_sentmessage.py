@@ -0,0 +1,34 @@
+# Generated by Django 4.2.26 on 2026-10-17 02:23
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0006_outboxbatch'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SentMessage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('phone_number', models.CharField(max_length=20)),
+                ('status', models.CharField(choices=[('sent', 'Sent'), ('failed', 'Failed')], max_length=20)),
+                ('status_code', models.IntegerField(blank=True, help_text="Africa's Talking status code (100-102 mean accepted)", null=True)),
+                ('provider_status', models.CharField(blank=True, help_text='Status text or error returned for this recipient', max_length=100)),
+                ('message_id', models.CharField(blank=True, help_text="Africa's Talking message id", max_length=100)),
+                ('cost', models.CharField(blank=True, max_length=30)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('sent_campaign', models.ForeignKey(help_text='The campaign send this message belongs to', on_delete=django.db.models.deletion.CASCADE, related_name='messages', to='app.sentcampaign')),
+            ],
+            options={
+                'verbose_name': 'Sent Message',
+                'verbose_name_plural': 'Sent Messages',
+                'ordering': ['id'],
+                'indexes': [models.Index(fields=['sent_campaign', 'status'], name='app_sentmes_sent_ca_322cb6_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 4.2.26 on 2026-10-17 02:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0007_sentmessage'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SmsRateLimit',
+            fields=[
+                ('name', models.CharField(help_text='Bucket name (one per SMS provider)', max_length=50, primary_key=True, serialize=False)),
+                ('message_tokens', models.FloatField(default=0, help_text='Messages that may be sent right now')),
+                ('request_tokens', models.FloatField(default=0, help_text='API requests that may be made right now')),
+                ('refilled_at', models.FloatField(default=0, help_text='Unix time of the last refill')),
+                ('acquired_count', models.PositiveIntegerField(default=0, help_text='API requests let through')),
+                ('throttled_count', models.PositiveIntegerField(default=0, help_text='API requests that had to wait')),
+                ('wait_seconds', models.FloatField(default=0, help_text='Total time spent waiting for tokens')),
+                ('max_wait_seconds', models.FloatField(default=0, help_text='Longest single wait for tokens')),
+            ],
+            options={
+                'verbose_name': 'SMS Rate Limit',
+                'verbose_name_plural': 'SMS Rate Limits',
+            },
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 4.2.26 on 2026-10-17 02:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0008_smsratelimit'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SmsCircuitBreaker',
+            fields=[
+                ('name', models.CharField(help_text='Breaker name (one per SMS provider)', max_length=50, primary_key=True, serialize=False)),
+                ('state', models.CharField(choices=[('closed', 'Closed'), ('open', 'Open'), ('half_open', 'Half Open')], default='closed', max_length=20)),
+                ('consecutive_failures', models.PositiveIntegerField(default=0)),
+                ('open_until', models.DateTimeField(blank=True, help_text='No requests are made before this time while open', null=True)),
+                ('opened_count', models.PositiveIntegerField(default=0, help_text='Number of times the breaker has opened')),
+                ('last_error', models.TextField(blank=True)),
+                ('last_failure_at', models.DateTimeField(blank=True, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'SMS Circuit Breaker',
+                'verbose_name_plural': 'SMS Circuit Breakers',
+            },
+        ),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 4.2.26 on 2026-10-17 02:36
+
+from django.db import migrations, models
+
+from app.phones import to_e164
+
+
+def fill_phone_e164(apps, schema_editor):
+    """
+    Normalize existing numbers
+    When several contacts share a number once normalized, the oldest keeps
+    it and the others stay empty (run fix_phone_numbers to review them).
+    """
+    Contact = apps.get_model('app', 'Contact')
+    taken = set()
+    batch = []
+    duplicates = 0
+    for contact in Contact.objects.order_by('id').only('id', 'phone_number').iterator(chunk_size=2000):
+        phone_e164 = to_e164(contact.phone_number)
+        if phone_e164 is None:
+            continue
+        if phone_e164 in taken:
+            duplicates += 1
+            continue
+        taken.add(phone_e164)
+        contact.phone_e164 = phone_e164
+        batch.append(contact)
+        if len(batch) >= 2000:
+            Contact.objects.bulk_update(batch, ['phone_e164'])
+            batch = []
+    Contact.objects.bulk_update(batch, ['phone_e164'])
+    if duplicates:
+        print(f"\n  {duplicates} contacts share a number with an older contact and will not be sent to; "
+              f"run `python manage.py fix_phone_numbers --dry-run` to list them")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0009_smscircuitbreaker'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='contact',
+            name='phone_e164',
+            field=models.CharField(blank=True, editable=False, help_text='Normalized phone number; empty if phone_number is not valid', max_length=16, null=True, unique=True),
+        ),
+        migrations.RunPython(fill_phone_e164, migrations.RunPython.noop),
+    ]
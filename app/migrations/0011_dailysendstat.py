@@ -0,0 +1,38 @@
+# Generated by Django 4.2.26 on 2026-10-17 02:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0010_contact_phone_e164'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailySendStat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(help_text='Local date the campaign was sent')),
+                ('contact_list_id', models.PositiveIntegerField(default=0, help_text='Contact list id (0 for sends without a list, such as legacy campaigns)')),
+                ('campaign_template_id', models.PositiveIntegerField(default=0, help_text='Campaign template id (0 for sends without a template)')),
+                ('campaigns', models.PositiveIntegerField(default=0, help_text='Campaign sends finished')),
+                ('failed_campaigns', models.PositiveIntegerField(default=0, help_text='Campaign sends where no message was accepted')),
+                ('recipients', models.PositiveBigIntegerField(default=0)),
+                ('sent', models.PositiveBigIntegerField(default=0, help_text='Messages accepted by the SMS provider')),
+                ('failed', models.PositiveBigIntegerField(default=0, help_text='Messages rejected or not sent')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Daily Send Statistic',
+                'verbose_name_plural': 'Daily Send Statistics',
+                'ordering': ['-day'],
+                'indexes': [models.Index(fields=['contact_list_id', 'day'], name='app_dailyse_contact_458338_idx'), models.Index(fields=['campaign_template_id', 'day'], name='app_dailyse_campaig_42ec77_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='dailysendstat',
+            constraint=models.UniqueConstraint(fields=('day', 'contact_list_id', 'campaign_template_id'), name='unique_daily_send_stat'),
+        ),
+    ]
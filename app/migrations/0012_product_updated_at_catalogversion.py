@@ -0,0 +1,38 @@
+# Generated by Django 4.2.26 on 2026-10-17 02:48
+
+from django.db import migrations, models
+from django.db.models import F
+
+
+def copy_created_at(apps, schema_editor):
+    """Existing products count as unchanged since they were added"""
+    Product = apps.get_model('app', 'Product')
+    Product.objects.update(updated_at=F('created_at'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0011_dailysendstat'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CatalogVersion',
+            fields=[
+                ('name', models.CharField(help_text='Catalog name', max_length=50, primary_key=True, serialize=False)),
+                ('version', models.PositiveBigIntegerField(default=1, help_text='Goes up by one on every change')),
+                ('changed_at', models.DateTimeField(help_text='Date and time of the last change')),
+            ],
+            options={
+                'verbose_name': 'Catalog Version',
+                'verbose_name_plural': 'Catalog Versions',
+            },
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, help_text='Date and time the product was last changed'),
+        ),
+        migrations.RunPython(copy_created_at, migrations.RunPython.noop),
+    ]
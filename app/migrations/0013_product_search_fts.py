@@ -0,0 +1,65 @@
+# Generated by Django 4.2.26 on 2026-10-17 03:05
+
+from django.db import migrations
+
+
+# External-content FTS5 index over app_product(name, description). The
+# triggers keep it in sync with every insert, update and delete, including
+# bulk_create(), queryset.update() and raw SQL.
+CREATE_SQL = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS app_product_fts USING fts5(
+        name, description,
+        content='app_product', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS app_product_fts_insert AFTER INSERT ON app_product BEGIN
+        INSERT INTO app_product_fts(rowid, name, description) VALUES (new.id, new.name, new.description);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS app_product_fts_delete AFTER DELETE ON app_product BEGIN
+        INSERT INTO app_product_fts(app_product_fts, rowid, name, description)
+        VALUES ('delete', old.id, old.name, old.description);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS app_product_fts_update AFTER UPDATE OF name, description ON app_product BEGIN
+        INSERT INTO app_product_fts(app_product_fts, rowid, name, description)
+        VALUES ('delete', old.id, old.name, old.description);
+        INSERT INTO app_product_fts(rowid, name, description) VALUES (new.id, new.name, new.description);
+    END
+    """,
+    # Index the products that already exist
+    "INSERT INTO app_product_fts(app_product_fts) VALUES ('rebuild')",
+]
+
+DROP_SQL = [
+    "DROP TRIGGER IF EXISTS app_product_fts_insert",
+    "DROP TRIGGER IF EXISTS app_product_fts_delete",
+    "DROP TRIGGER IF EXISTS app_product_fts_update",
+    "DROP TABLE IF EXISTS app_product_fts",
+]
+
+
+def run_on_sqlite(statements):
+    """FTS5 is SQLite only; other databases keep the LIKE-based search"""
+    def run(apps, schema_editor):
+        if schema_editor.connection.vendor != 'sqlite':
+            return
+        for statement in statements:
+            schema_editor.execute(statement)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0012_product_updated_at_catalogversion'),
+    ]
+
+    operations = [
+        migrations.RunPython(run_on_sqlite(CREATE_SQL), run_on_sqlite(DROP_SQL)),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.26 on 2026-10-17 03:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0013_product_search_fts'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='outboxbatch',
+            name='status',
+            field=models.CharField(choices=[('staged', 'Staged'), ('pending', 'Pending'), ('leased', 'Leased'), ('sent', 'Sent'), ('failed', 'Failed')], default='pending', max_length=20),
+        ),
+    ]
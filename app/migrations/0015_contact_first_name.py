@@ -0,0 +1,41 @@
+# Generated by Django 4.2.26 on 2026-10-17 03:17
+
+from django.db import migrations, models
+
+from app.personalize import first_name
+
+
+def fill_first_name(apps, schema_editor):
+    """Set first_name from name for existing contacts, one UPDATE per name and page"""
+    Contact = apps.get_model('app', 'Contact')
+    last_id = 0
+    while True:
+        page = list(Contact.objects.filter(id__gt=last_id).order_by('id').values_list('id', 'name')[:2000])
+        if not page:
+            return
+        ids_by_name = {}
+        for contact_id, name in page:
+            ids_by_name.setdefault(first_name(name), []).append(contact_id)
+        for name, ids in ids_by_name.items():
+            Contact.objects.filter(id__in=ids).update(first_name=name)
+        last_id = page[-1][0]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0014_outboxbatch_staged'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='contact',
+            name='first_name',
+            field=models.CharField(blank=True, default='', editable=False, help_text='What [Name] is replaced with for this contact', max_length=100),
+        ),
+        migrations.RunPython(fill_first_name, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='contact',
+            index=models.Index(fields=['first_name', 'id'], name='app_contact_first_name_idx'),
+        ),
+    ]
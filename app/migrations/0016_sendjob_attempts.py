@@ -0,0 +1,18 @@
+# Generated by Django 4.2.26 on 2026-10-17 03:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0015_contact_first_name'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='sendjob',
+            name='attempts',
+            field=models.IntegerField(default=0, help_text='Number of times a worker has started splitting this job'),
+        ),
+    ]
@@ -2,7 +2,15 @@
 Database models for the application
 Two simple models: Contact and Campaign
 """
+from django.core.exceptions import ValidationError
 from django.db import models
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from . import personalize
+from .phones import to_e164
+from .ussd_cache import menu_cache
 
 
 class Contact(models.Model):
@@ -17,12 +25,32 @@ class Contact(models.Model):
         help_text="Phone number in international format (e.g., +254712345678)"
     )
     
+    # Canonical E.164 form of phone_number, set on save (what SMS are sent to)
+    phone_e164 = models.CharField(
+        max_length=16,
+        unique=True,
+        null=True,
+        blank=True,
+        editable=False,
+        help_text="Normalized phone number; empty if phone_number is not valid"
+    )
+    
     # Contact name
     name = models.CharField(
         max_length=100,
         help_text="Contact's name"
     )
     
+    # First word of name, set on save: personalized sends read the contacts of
+    # one first name at a time (see messaging.message_batches)
+    first_name = models.CharField(
+        max_length=100,
+        blank=True,
+        default='',
+        editable=False,
+        help_text="What [Name] is replaced with for this contact"
+    )
+    
     # When was this contact added?
     created_at = models.DateTimeField(auto_now_add=True)
     
@@ -36,10 +64,55 @@ class Contact(models.Model):
         ordering = ['-created_at']  # Newest contacts first
         verbose_name = "Contact"
         verbose_name_plural = "Contacts"
+        indexes = [
+            models.Index(fields=['first_name', 'id'], name='app_contact_first_name_idx'),
+        ]
     
     def __str__(self):
         """String representation of the contact"""
         return f"{self.name} ({self.phone_number})"
+    
+    def clean(self):
+        """Reject numbers that cannot be normalized or that another contact already has"""
+        phone_e164 = to_e164(self.phone_number)
+        if phone_e164 is None:
+            raise ValidationError({'phone_number': 'Enter a valid phone number, e.g. +254712345678 or 0712345678.'})
+        if Contact.objects.filter(phone_e164=phone_e164).exclude(pk=self.pk).exists():
+            raise ValidationError({'phone_number': f'Another contact already has the number {phone_e164}.'})
+    
+    def save(self, *args, **kwargs):
+        """
+        Keep phone_e164 and first_name in sync with phone_number and name
+        A number that another contact already has is not stored in phone_e164:
+        the contact is saved as a duplicate (never sent to, listed by
+        fix_phone_numbers) instead of failing on the unique constraint.
+        """
+        phone_e164 = to_e164(self.phone_number)
+        if phone_e164 is not None and Contact.objects.filter(phone_e164=phone_e164).exclude(pk=self.pk).exists():
+            print(f"[CONTACTS] {self.phone_number} belongs to another contact; saved without a number to send to")
+            phone_e164 = None
+        self.phone_e164 = phone_e164
+        self.first_name = personalize.first_name(self.name)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            update_fields = set(update_fields)
+            if 'phone_number' in update_fields:
+                update_fields.add('phone_e164')
+            if 'name' in update_fields:
+                update_fields.add('first_name')
+            kwargs['update_fields'] = update_fields
+        super().save(*args, **kwargs)
+    
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        """
+        Remember the stored is_active value so signals can detect
+        active/inactive transitions without an extra query
+        """
+        instance = super().from_db(db, field_names, values)
+        if 'is_active' in field_names:
+            instance._loaded_is_active = instance.is_active
+        return instance
 
 
 class Campaign(models.Model):
@@ -119,6 +192,11 @@ class Product(models.Model):
         help_text="Date and time the product was added"
     )
 
+    updated_at = models.DateTimeField(
+        auto_now=True,
+        help_text="Date and time the product was last changed"
+    )
+
     is_active = models.BooleanField(
         default=True,
         help_text="Whether the product is active and available"
@@ -133,6 +211,39 @@ class Product(models.Model):
         return f"{self.name} - KES {self.price}"
 
 
+# =============================
+# Catalog Version Model
+# =============================
+class CatalogVersion(models.Model):
+    """
+    Model to store a change counter for a catalog (e.g. all products)
+    The version goes up on every change (see app/catalog.py), so API
+    responses can be validated with an ETag and cached without reading the
+    catalog itself.
+    """
+    name = models.CharField(
+        max_length=50,
+        primary_key=True,
+        help_text="Catalog name"
+    )
+
+    version = models.PositiveBigIntegerField(
+        default=1,
+        help_text="Goes up by one on every change"
+    )
+
+    changed_at = models.DateTimeField(
+        help_text="Date and time of the last change"
+    )
+
+    class Meta:
+        verbose_name = "Catalog Version"
+        verbose_name_plural = "Catalog Versions"
+
+    def __str__(self):
+        return f"{self.name} v{self.version}"
+
+
 # =============================
 # Campaign Template Model
 # =============================
@@ -204,17 +315,73 @@ class ContactList(models.Model):
         help_text="Whether this list is active"
     )
     
+    # Number of active contacts in the list, kept up to date by signals
+    # (see app/signals.py) so menus and the admin never need a COUNT query
+    active_contact_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        help_text="Number of active contacts in this list"
+    )
+    
     class Meta:
         ordering = ['name']
         verbose_name = "Contact List"
         verbose_name_plural = "Contact Lists"
     
     def __str__(self):
-        return f"{self.name} ({self.contacts.count()} contacts)"
+        return f"{self.name} ({self.active_contact_count} contacts)"
+    
+    def save(self, *args, **kwargs):
+        """
+        Save every field but active_contact_count of an existing list
+        The counter is only written by the F() updates of the signal handlers;
+        the copy held by this instance may be older than the stored value.
+        """
+        if not self._state.adding:
+            update_fields = kwargs.get('update_fields')
+            if update_fields is None:
+                deferred = self.get_deferred_fields()
+                update_fields = [
+                    field.name for field in self._meta.concrete_fields
+                    if not field.primary_key and field.attname not in deferred
+                ]
+            kwargs['update_fields'] = [name for name in update_fields if name != 'active_contact_count']
+        super().save(*args, **kwargs)
     
     def contact_count(self):
-        """Return the number of contacts in this list"""
-        return self.contacts.filter(is_active=True).count()
+        """Return the number of active contacts in this list"""
+        return self.active_contact_count
+    
+    @classmethod
+    def active_count_subquery(cls):
+        """Subquery counting the active members of the outer ContactList"""
+        membership = cls.contacts.through.objects.filter(
+            contactlist_id=OuterRef('pk'),
+            contact__is_active=True
+        )
+        return Coalesce(
+            Subquery(membership.order_by().values('contactlist_id').annotate(n=Count('*')).values('n')),
+            0
+        )
+    
+    @classmethod
+    def recount_contacts(cls, list_ids=None):
+        """
+        Recompute active_contact_count from the membership table
+        Runs as a single UPDATE; returns the number of lists that were out of date.
+        """
+        lists = cls.objects.all()
+        if list_ids is not None:
+            lists = lists.filter(pk__in=list_ids)
+        stale = (
+            lists.annotate(actual=cls.active_count_subquery())
+            .exclude(active_contact_count=F('actual'))
+            .count()
+        )
+        if stale:
+            lists.update(active_contact_count=cls.active_count_subquery())
+            menu_cache.invalidate('contact_lists')
+        return stale
 
 
 # =============================
@@ -266,6 +433,7 @@ class SentCampaign(models.Model):
     status = models.CharField(
         max_length=20,
         choices=[
+            ('sending', 'Sending'),
             ('success', 'Success'),
             ('failed', 'Failed'),
             ('partial', 'Partial Success'),
@@ -280,3 +448,459 @@ class SentCampaign(models.Model):
     
     def __str__(self):
         return f"{self.campaign_template.name if self.campaign_template else 'Campaign'} - {self.sent_at.strftime('%Y-%m-%d %H:%M')}"
+
+
+# =============================
+# USSD Session Model
+# =============================
+class UssdSession(models.Model):
+    """
+    Model to store USSD menu state between hops
+    Used by DatabaseSessionStore so every worker process sees the same session
+    """
+    session_id = models.CharField(
+        max_length=100,
+        primary_key=True,
+        help_text="Session ID sent by Africa's Talking"
+    )
+    
+    data = models.TextField(
+        default='{}',
+        help_text="Session data as JSON"
+    )
+    
+    expires_at = models.DateTimeField(
+        db_index=True,
+        help_text="When this session times out"
+    )
+    
+    class Meta:
+        verbose_name = "USSD Session"
+        verbose_name_plural = "USSD Sessions"
+    
+    def __str__(self):
+        return f"{self.session_id} (expires {self.expires_at.strftime('%H:%M:%S')})"
+
+
+# =============================
+# Send Job Model
+# =============================
+class SendJob(models.Model):
+    """
+    Model to queue a campaign send for the SMS worker
+    The USSD menu only records the job; `python manage.py run_sms_worker`
+    picks it up and does the actual sending.
+    """
+    campaign_template = models.ForeignKey(
+        CampaignTemplate,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        help_text="The campaign template to send"
+    )
+    
+    contact_list = models.ForeignKey(
+        ContactList,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        help_text="The contact list to send to"
+    )
+    
+    requested_by = models.CharField(
+        max_length=20,
+        blank=True,
+        help_text="Phone number of user who requested the send"
+    )
+    
+    status = models.CharField(
+        max_length=20,
+        choices=[
+            ('queued', 'Queued'),
+            ('running', 'Running'),
+            ('done', 'Done'),
+            ('failed', 'Failed'),
+        ],
+        default='queued'
+    )
+    
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    started_at = models.DateTimeField(null=True, blank=True)
+    
+    finished_at = models.DateTimeField(null=True, blank=True)
+    
+    sent_campaign = models.ForeignKey(
+        SentCampaign,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        help_text="Log entry written when the send finished"
+    )
+    
+    error = models.TextField(
+        blank=True,
+        help_text="Error message if the job failed"
+    )
+    
+    # While a worker splits the job into outbox batches it holds a lease;
+    # if the worker dies the lease runs out and another worker takes over
+    leased_until = models.DateTimeField(null=True, blank=True)
+    
+    leased_by = models.CharField(max_length=100, blank=True)
+    
+    attempts = models.IntegerField(
+        default=0,
+        help_text="Number of times a worker has started splitting this job"
+    )
+    
+    class Meta:
+        ordering = ['-created_at']
+        verbose_name = "Send Job"
+        verbose_name_plural = "Send Jobs"
+        indexes = [
+            models.Index(fields=['status', 'created_at']),
+        ]
+    
+    def __str__(self):
+        return f"Job {self.reference} - {self.status}"
+    
+    @property
+    def reference(self):
+        """Short reference shown to the user on the USSD screen"""
+        return f"#{self.pk}"
+
+
+# =============================
+# SMS Outbox Model
+# =============================
+class OutboxBatch(models.Model):
+    """
+    Model to store one batch of recipients waiting to be sent
+    run_sms_worker splits each SendJob into batches; workers lease a batch,
+    send it and record the outcome. A batch whose lease runs out (crashed
+    worker) becomes available to the other workers again.
+    """
+    job = models.ForeignKey(
+        SendJob,
+        on_delete=models.CASCADE,
+        related_name='batches',
+        help_text="The job this batch belongs to"
+    )
+    
+    sent_campaign = models.ForeignKey(
+        SentCampaign,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='batches',
+        help_text="Log entry the outcome is recorded on"
+    )
+    
+    message = models.TextField(
+        help_text="The SMS message to send"
+    )
+    
+    recipients = models.TextField(
+        help_text="JSON list of phone numbers"
+    )
+    
+    recipients_count = models.IntegerField(default=0)
+    
+    status = models.CharField(
+        max_length=20,
+        choices=[
+            ('staged', 'Staged'),  # written while the job is being expanded
+            ('pending', 'Pending'),
+            ('leased', 'Leased'),
+            ('sent', 'Sent'),
+            ('failed', 'Failed'),
+        ],
+        default='pending'
+    )
+    
+    attempts = models.IntegerField(
+        default=0,
+        help_text="Number of times a worker has picked up this batch"
+    )
+    
+    available_at = models.DateTimeField(
+        default=timezone.now,
+        help_text="Do not send before this time"
+    )
+    
+    leased_until = models.DateTimeField(null=True, blank=True)
+    
+    leased_by = models.CharField(max_length=100, blank=True)
+    
+    sent_count = models.IntegerField(
+        default=0,
+        help_text="Recipients accepted by the provider"
+    )
+    
+    failed_count = models.IntegerField(
+        default=0,
+        help_text="Recipients rejected by the provider"
+    )
+    
+    api_response = models.TextField(
+        blank=True,
+        null=True,
+        help_text="Response from Africa's Talking API"
+    )
+    
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    sent_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        ordering = ['id']
+        verbose_name = "Outbox Batch"
+        verbose_name_plural = "Outbox Batches"
+        indexes = [
+            models.Index(fields=['status', 'available_at']),
+            models.Index(fields=['status', 'leased_until']),
+        ]
+    
+    def __str__(self):
+        return f"Batch {self.pk} of job #{self.job_id} - {self.status}"
+
+
+# =============================
+# Per-recipient Delivery Model
+# =============================
+class SentMessage(models.Model):
+    """
+    Model to store the provider's answer for one recipient of a campaign
+    Rows are written in bulk as each chunk of a send comes back, so failed
+    recipients can be listed with an indexed query instead of parsing
+    SentCampaign.api_response.
+    """
+    sent_campaign = models.ForeignKey(
+        SentCampaign,
+        on_delete=models.CASCADE,
+        related_name='messages',
+        help_text="The campaign send this message belongs to"
+    )
+    
+    phone_number = models.CharField(max_length=20)
+    
+    status = models.CharField(
+        max_length=20,
+        choices=[
+            ('sent', 'Sent'),
+            ('failed', 'Failed'),
+        ]
+    )
+    
+    status_code = models.IntegerField(
+        null=True,
+        blank=True,
+        help_text="Africa's Talking status code (100-102 mean accepted)"
+    )
+    
+    provider_status = models.CharField(
+        max_length=100,
+        blank=True,
+        help_text="Status text or error returned for this recipient"
+    )
+    
+    message_id = models.CharField(
+        max_length=100,
+        blank=True,
+        help_text="Africa's Talking message id"
+    )
+    
+    cost = models.CharField(max_length=30, blank=True)
+    
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        ordering = ['id']
+        verbose_name = "Sent Message"
+        verbose_name_plural = "Sent Messages"
+        indexes = [
+            models.Index(fields=['sent_campaign', 'status']),
+        ]
+    
+    def __str__(self):
+        return f"{self.phone_number} - {self.status}"
+
+
+# =============================
+# SMS Rate Limit Model
+# =============================
+class SmsRateLimit(models.Model):
+    """
+    Model to store a token bucket shared by every process that sends SMS
+    Tokens are refilled and taken in a single conditional UPDATE (see
+    app/ratelimit.py), so threads and worker processes never overdraw it.
+    Also keeps counters of how often and how long senders had to wait.
+    """
+    name = models.CharField(
+        max_length=50,
+        primary_key=True,
+        help_text="Bucket name (one per SMS provider)"
+    )
+    
+    message_tokens = models.FloatField(
+        default=0,
+        help_text="Messages that may be sent right now"
+    )
+    
+    request_tokens = models.FloatField(
+        default=0,
+        help_text="API requests that may be made right now"
+    )
+    
+    refilled_at = models.FloatField(
+        default=0,
+        help_text="Unix time of the last refill"
+    )
+    
+    acquired_count = models.PositiveIntegerField(
+        default=0,
+        help_text="API requests let through"
+    )
+    
+    throttled_count = models.PositiveIntegerField(
+        default=0,
+        help_text="API requests that had to wait"
+    )
+    
+    wait_seconds = models.FloatField(
+        default=0,
+        help_text="Total time spent waiting for tokens"
+    )
+    
+    max_wait_seconds = models.FloatField(
+        default=0,
+        help_text="Longest single wait for tokens"
+    )
+    
+    class Meta:
+        verbose_name = "SMS Rate Limit"
+        verbose_name_plural = "SMS Rate Limits"
+    
+    def __str__(self):
+        return f"{self.name} ({self.throttled_count}/{self.acquired_count} throttled)"
+
+
+# =============================
+# SMS Circuit Breaker Model
+# =============================
+class SmsCircuitBreaker(models.Model):
+    """
+    Model to store the health of the SMS provider as seen by every sender
+    After repeated failed API calls the breaker opens and sends are skipped
+    (inline) or deferred (outbox) until the cool-down ends; then a single
+    probe request decides whether it closes again. See app/circuit_breaker.py.
+    """
+    name = models.CharField(
+        max_length=50,
+        primary_key=True,
+        help_text="Breaker name (one per SMS provider)"
+    )
+    
+    state = models.CharField(
+        max_length=20,
+        choices=[
+            ('closed', 'Closed'),
+            ('open', 'Open'),
+            ('half_open', 'Half Open'),
+        ],
+        default='closed'
+    )
+    
+    consecutive_failures = models.PositiveIntegerField(default=0)
+    
+    open_until = models.DateTimeField(
+        null=True,
+        blank=True,
+        help_text="No requests are made before this time while open"
+    )
+    
+    opened_count = models.PositiveIntegerField(
+        default=0,
+        help_text="Number of times the breaker has opened"
+    )
+    
+    last_error = models.TextField(blank=True)
+    
+    last_failure_at = models.DateTimeField(null=True, blank=True)
+    
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        verbose_name = "SMS Circuit Breaker"
+        verbose_name_plural = "SMS Circuit Breakers"
+    
+    def __str__(self):
+        return f"{self.name} - {self.state}"
+
+
+# =============================
+# Daily Send Statistics Model
+# =============================
+class DailySendStat(models.Model):
+    """
+    Model to store send totals per day, contact list and campaign template
+    One row is updated as each campaign send finishes (see app/analytics.py),
+    so reports read a few rows per day instead of the whole send history.
+    Rebuild from history with `python manage.py backfill_send_stats`.
+    """
+    day = models.DateField(
+        help_text="Local date the campaign was sent"
+    )
+    
+    contact_list_id = models.PositiveIntegerField(
+        default=0,
+        help_text="Contact list id (0 for sends without a list, such as legacy campaigns)"
+    )
+    
+    campaign_template_id = models.PositiveIntegerField(
+        default=0,
+        help_text="Campaign template id (0 for sends without a template)"
+    )
+    
+    campaigns = models.PositiveIntegerField(
+        default=0,
+        help_text="Campaign sends finished"
+    )
+    
+    failed_campaigns = models.PositiveIntegerField(
+        default=0,
+        help_text="Campaign sends where no message was accepted"
+    )
+    
+    recipients = models.PositiveBigIntegerField(default=0)
+    
+    sent = models.PositiveBigIntegerField(
+        default=0,
+        help_text="Messages accepted by the SMS provider"
+    )
+    
+    failed = models.PositiveBigIntegerField(
+        default=0,
+        help_text="Messages rejected or not sent"
+    )
+    
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        ordering = ['-day']
+        verbose_name = "Daily Send Statistic"
+        verbose_name_plural = "Daily Send Statistics"
+        constraints = [
+            models.UniqueConstraint(
+                fields=['day', 'contact_list_id', 'campaign_template_id'],
+                name='unique_daily_send_stat'
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['contact_list_id', 'day']),
+            models.Index(fields=['campaign_template_id', 'day']),
+        ]
+    
+    def __str__(self):
+        return f"{self.day} - list {self.contact_list_id}, template {self.campaign_template_id}: {self.sent} sent"
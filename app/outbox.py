@@ -0,0 +1,375 @@
+"""
+Durable SMS outbox
+Queued SendJobs are split into OutboxBatch rows which any number of
+run_sms_worker processes can send in parallel.
+
+Jobs are expanded in many short transactions (see expand_job), never one
+long one, so other writers are not locked out on SQLite.
+
+Claiming works the same way for jobs and batches: pick a few candidate rows,
+then move one of them to the leased state with a conditional UPDATE. Only one
+worker's UPDATE can match, so no row is ever handed out twice, and it works on
+SQLite (which has no SELECT ... FOR UPDATE SKIP LOCKED). A lease that runs out
+makes the row claimable again, so work held by a crashed worker is retried.
+A job is picked up at most SMS_OUTBOX_JOB_ATTEMPTS times, and a batch is sent
+at most SMS_RETRY_ATTEMPTS times, so work that keeps failing does not stall
+the queue.
+"""
+import json
+import os
+import socket
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Q, Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .analytics import record_sent_campaign
+from .circuit_breaker import backoff_delay, retry_attempts, sms_circuit_breaker
+from .messaging import (
+    NO_RECIPIENTS_IN_LIST, campaign_status, message_batches, record_deliveries, send_chunk, sendable
+)
+from .models import OutboxBatch, SendJob, SentCampaign
+
+
+# Batches still waiting for a worker ('staged' ones are not yet released)
+OPEN_BATCH_STATUSES = ('staged', 'pending', 'leased')
+
+# Batches written per transaction while a job is expanded
+EXPANSION_CHUNK = 100
+
+
+class LeaseLost(Exception):
+    """Another worker took over the job because our lease ran out"""
+
+
+def worker_name():
+    """Identifies this process in leased_by columns"""
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def job_attempts():
+    """Times a job may be picked up for expansion (SMS_OUTBOX_JOB_ATTEMPTS)"""
+    return getattr(settings, 'SMS_OUTBOX_JOB_ATTEMPTS', 3)
+
+
+def lease_duration():
+    """How long a claimed job or batch stays reserved (SMS_OUTBOX_LEASE_SECONDS)"""
+    return timedelta(seconds=getattr(settings, 'SMS_OUTBOX_LEASE_SECONDS', 120))
+
+
+def _claim(queryset, claimable, worker, **changes):
+    """
+    Lease one claimable row of `queryset` for `worker`
+    Returns the primary key of the claimed row, or None
+    """
+    candidates = queryset.filter(claimable).values_list('pk', flat=True)[:10]
+    for pk in list(candidates):
+        claimed = queryset.filter(claimable, pk=pk).update(
+            leased_until=timezone.now() + lease_duration(),
+            leased_by=worker,
+            **changes
+        )
+        if claimed:
+            return pk
+    return None
+
+
+# ==========================
+# Jobs
+# ==========================
+def claim_job(worker):
+    """
+    Lease the oldest queued job (or one whose expansion lease ran out)
+    Jobs that are already split into batches have leased_until = NULL. Every
+    claim uses up one of the job's attempts; jobs without attempts left are
+    failed instead (see fail_exhausted_jobs).
+    """
+    fail_exhausted_jobs()
+    claimable = Q(status='queued') | Q(status='running', leased_until__lt=timezone.now(), attempts__lt=job_attempts())
+    pk = _claim(
+        SendJob.objects.order_by('created_at', 'id'), claimable, worker,
+        status='running', started_at=timezone.now(), attempts=F('attempts') + 1
+    )
+    if pk is None:
+        return None
+    return SendJob.objects.select_related('campaign_template', 'contact_list').get(pk=pk)
+
+
+def expand_job(job, worker):
+    """
+    Split a leased job into outbox batches
+    Personalized messages are rendered here; each batch holds recipients
+    who get the same text.
+
+    Batches are written EXPANSION_CHUNK at a time in short transactions (so
+    SQLite's write lock is never held for long and the USSD menu keeps
+    working during big expansions) with status 'staged', which workers do
+    not pick up. Every chunk also extends the job lease, or rolls back if
+    the lease was lost. When the last chunk is in, one UPDATE makes all
+    batches 'pending' and releases the job. A worker taking over a job whose
+    expansion was cut short deletes the staged batches and starts again.
+    Returns the number of batches created.
+    """
+    template, contact_list = job.campaign_template, job.contact_list
+    if template is None or contact_list is None:
+        fail_job(job, 'Campaign template or contact list no longer exists')
+        return 0
+
+    contacts = contact_list.contacts.all()
+    if not sendable(contacts).exists():
+        fail_job(job, NO_RECIPIENTS_IN_LIST)
+        return 0
+
+    with transaction.atomic():
+        extend_job_lease(job, worker)
+        # Left over from an expansion that lost its lease
+        OutboxBatch.objects.filter(job=job, status='staged').delete()
+        sent_campaign = job.sent_campaign
+        if sent_campaign is None:
+            sent_campaign = SentCampaign.objects.create(
+                campaign_template=template,
+                contact_list=contact_list,
+                message=template.message,
+                sent_by=job.requested_by,
+                status='sending'
+            )
+            SendJob.objects.filter(pk=job.pk).update(sent_campaign=sent_campaign)
+
+    total = 0
+    batches = []
+    for text, chunk in message_batches(template.message, contacts):
+        batches.append(OutboxBatch(
+            job=job,
+            sent_campaign=sent_campaign,
+            message=text,
+            recipients=json.dumps(chunk),
+            recipients_count=len(chunk),
+            status='staged'
+        ))
+        total += len(chunk)
+        if len(batches) >= EXPANSION_CHUNK:
+            stage_batches(job, worker, batches)
+            batches = []
+
+    with transaction.atomic():
+        stage_batches(job, worker, batches)
+        SentCampaign.objects.filter(pk=sent_campaign.pk).update(recipients_count=total)
+        if not total:
+            # Every contact changed or lost its number after the check above;
+            # no batch will ever call finish_job_if_done, so close up here
+            close_empty_job(job, sent_campaign)
+            return 0
+        OutboxBatch.objects.filter(job=job, status='staged').update(status='pending')
+        SendJob.objects.filter(pk=job.pk).update(leased_until=None)
+
+    print(f"[OUTBOX] Job {job.reference}: {total} recipients queued")
+    return OutboxBatch.objects.filter(job=job).count()
+
+
+def fail_exhausted_jobs():
+    """
+    Fail the jobs whose expansion lease ran out after their last attempt
+    (their expansion keeps raising, or killing the worker), with their
+    staged batches and SentCampaign. Returns the number of jobs failed.
+    """
+    now = timezone.now()
+    exhausted = Q(status='running', leased_until__lt=now, attempts__gte=job_attempts())
+    failed = 0
+    for job in SendJob.objects.filter(exhausted).select_related('sent_campaign')[:10]:
+        error = f"Gave up after {job.attempts} attempts to split the job into batches"
+        if job.error:
+            error = f"{error}; last error: {job.error}"
+        with transaction.atomic():
+            if not SendJob.objects.filter(exhausted, pk=job.pk).update(
+                status='failed', error=error, leased_until=None, finished_at=now
+            ):
+                continue
+            OutboxBatch.objects.filter(job=job, status='staged').delete()
+            if job.sent_campaign is not None:
+                fail_sent_campaign(job.sent_campaign, error)
+        print(f"[OUTBOX ERROR] Job {job.reference}: {error}")
+        failed += 1
+    return failed
+
+
+def record_job_error(job, worker, error):
+    """
+    Note why an expansion attempt failed
+    The job is retried once its lease runs out; after the last attempt the
+    lease is ended at once so the next claim_job fails the job.
+    """
+    changes = {'error': error}
+    if job.attempts >= job_attempts():
+        changes['leased_until'] = timezone.now()
+    SendJob.objects.filter(pk=job.pk, status='running', leased_by=worker).update(**changes)
+
+
+def extend_job_lease(job, worker):
+    """Renew the lease on a job being expanded; raises LeaseLost if it is no longer ours"""
+    renewed = SendJob.objects.filter(pk=job.pk, status='running', leased_by=worker).update(
+        leased_until=timezone.now() + lease_duration()
+    )
+    if not renewed:
+        raise LeaseLost(f"Lost the lease on job {job.reference}")
+
+
+def stage_batches(job, worker, batches):
+    """Write one chunk of staged batches, only while we still hold the job"""
+    with transaction.atomic():
+        extend_job_lease(job, worker)
+        OutboxBatch.objects.bulk_create(batches)
+
+
+def close_empty_job(job, sent_campaign):
+    """Fail a job that produced no recipients, and its SentCampaign"""
+    fail_job(job, NO_RECIPIENTS_IN_LIST)
+    fail_sent_campaign(sent_campaign, NO_RECIPIENTS_IN_LIST)
+
+
+def fail_sent_campaign(sent_campaign, error):
+    """Close the SentCampaign of a job that sent nothing"""
+    SentCampaign.objects.filter(pk=sent_campaign.pk).update(status='failed', api_response=error)
+    sent_campaign.refresh_from_db()
+    record_sent_campaign(sent_campaign, 0, 0)
+
+
+def fail_job(job, error):
+    """Mark a job as failed without sending anything"""
+    SendJob.objects.filter(pk=job.pk).update(
+        status='failed',
+        error=error,
+        leased_until=None,
+        finished_at=timezone.now()
+    )
+
+
+def finish_job_if_done(job_id):
+    """
+    Close a job and its SentCampaign once none of its batches are open
+    Returns True if this call finished the job.
+    """
+    batches = OutboxBatch.objects.filter(job_id=job_id)
+    if batches.filter(status__in=OPEN_BATCH_STATUSES).exists():
+        return False
+
+    totals = batches.aggregate(
+        sent=Coalesce(Sum('sent_count'), 0),
+        failed=Coalesce(Sum('failed_count'), 0)
+    )
+    sent, failed = totals['sent'], totals['failed']
+    status = campaign_status(sent, failed)
+
+    with transaction.atomic():
+        finished = SendJob.objects.filter(pk=job_id, status='running', leased_until__isnull=True).update(
+            status='done' if sent else 'failed',
+            error='' if sent else 'No recipients were accepted by the SMS provider',
+            finished_at=timezone.now()
+        )
+        if not finished:
+            return False
+        sent_campaign_id = SendJob.objects.filter(pk=job_id).values_list('sent_campaign_id', flat=True).first()
+        SentCampaign.objects.filter(pk=sent_campaign_id).update(
+            status=status,
+            api_response=json.dumps({
+                'batches': batches.count(),
+                'sent': sent,
+                'failed': failed,
+            })
+        )
+        sent_campaign = SentCampaign.objects.filter(pk=sent_campaign_id).first()
+        if sent_campaign is not None:
+            record_sent_campaign(sent_campaign, sent, failed)
+    return True
+
+
+# ==========================
+# Batches
+# ==========================
+def claim_batch(worker):
+    """Lease the oldest batch that is due (or whose lease ran out)"""
+    now = timezone.now()
+    claimable = Q(status='pending', available_at__lte=now) | Q(status='leased', leased_until__lt=now)
+    pk = _claim(
+        OutboxBatch.objects.order_by('id'), claimable, worker,
+        status='leased', attempts=F('attempts') + 1
+    )
+    if pk is None:
+        return None
+    return OutboxBatch.objects.get(pk=pk)
+
+
+def send_batch(batch, worker):
+    """
+    Send a leased batch and record the outcome
+    A provider error puts the batch back with a jittered backoff delay until
+    SMS_RETRY_ATTEMPTS is used up; while the circuit breaker is open the
+    batch is deferred to the end of the cool-down without using an attempt.
+    Returns the new batch status ('sent', 'failed' or 'pending').
+    """
+    recipients = json.loads(batch.recipients)
+    result = send_chunk(batch.message, recipients)
+
+    if result.get('circuit_open'):
+        return defer_batch(batch, worker, result['error'], sms_circuit_breaker.retry_after(), attempts=F('attempts') - 1)
+    if 'error' in result and batch.attempts < retry_attempts():
+        return defer_batch(batch, worker, result['error'], backoff_delay(batch.attempts))
+
+    status = 'sent' if result['sent'] else 'failed'
+    if 'error' in result:
+        print(f"[OUTBOX ERROR] Batch {batch.pk}: {result['error']}")
+        api_response = result['error']
+    else:
+        api_response = json.dumps(result['response'], default=str)
+
+    with transaction.atomic():
+        recorded = OutboxBatch.objects.filter(pk=batch.pk, status='leased', leased_by=worker).update(
+            status=status,
+            sent_count=result['sent'],
+            failed_count=result['failed'],
+            api_response=api_response,
+            sent_at=timezone.now(),
+            leased_until=None
+        )
+        # Per-recipient rows only once, by the worker that still holds the lease
+        if recorded and batch.sent_campaign_id:
+            record_deliveries(batch.sent_campaign, recipients, result)
+    finish_job_if_done(batch.job_id)
+    return status
+
+
+def defer_batch(batch, worker, error, delay, **changes):
+    """Give a leased batch back, to be sent again in `delay` seconds; returns 'pending'"""
+    print(f"[OUTBOX] Batch {batch.pk}: {error}, retrying in {delay:.1f}s")
+    OutboxBatch.objects.filter(pk=batch.pk, status='leased', leased_by=worker).update(
+        status='pending',
+        available_at=timezone.now() + timedelta(seconds=delay),
+        api_response=error,
+        leased_until=None,
+        **changes
+    )
+    return 'pending'
+
+
+def release_batch(batch, worker, error):
+    """
+    Give back a batch whose send_batch raised an unexpected error
+    It is retried with backoff until SMS_RETRY_ATTEMPTS is used up, then
+    failed as a whole. Returns the new batch status.
+    """
+    if batch.attempts < retry_attempts():
+        return defer_batch(batch, worker, error, backoff_delay(batch.attempts))
+
+    print(f"[OUTBOX ERROR] Batch {batch.pk}: {error}")
+    OutboxBatch.objects.filter(pk=batch.pk, status='leased', leased_by=worker).update(
+        status='failed',
+        sent_count=0,
+        failed_count=batch.recipients_count,
+        api_response=error,
+        sent_at=timezone.now(),
+        leased_until=None
+    )
+    finish_job_if_done(batch.job_id)
+    return 'failed'
@@ -0,0 +1,71 @@
+"""
+Message personalization
+Campaign messages may contain placeholders that are filled in per recipient:
+- [Name]: the contact's first name
+- [FullName]: the contact's full name
+Any other text in square brackets is sent as written.
+
+A message is parsed once by compile_message() into literal parts and field
+getters, so rendering one recipient is a single ''.join() with no regex work.
+"""
+import re
+from functools import lru_cache
+
+
+PLACEHOLDER_RE = re.compile(r'\[(\w+)\]')
+
+# Used when a contact has no name on record
+FALLBACK_NAME = 'Customer'
+
+
+def first_name(name):
+    """First word of a contact's name"""
+    parts = name.split()
+    return parts[0] if parts else FALLBACK_NAME
+
+
+def full_name(name):
+    return ' '.join(name.split()) or FALLBACK_NAME
+
+
+# Placeholder -> callable(contact name) returning the replacement text
+FIELDS = {
+    'Name': first_name,
+    'FullName': full_name,
+}
+
+
+class CompiledMessage:
+    """
+    A campaign message ready to be rendered for many recipients
+    is_static is True when the message has no placeholders, in which case
+    every recipient gets the same text.
+    """
+
+    def __init__(self, message):
+        self.source = message
+        self._parts = []
+        position = 0
+        for match in PLACEHOLDER_RE.finditer(message):
+            getter = FIELDS.get(match.group(1))
+            if getter is None:
+                continue
+            if match.start() > position:
+                self._parts.append(message[position:match.start()])
+            self._parts.append(getter)
+            position = match.end()
+        if position < len(message):
+            self._parts.append(message[position:])
+        self.is_static = all(isinstance(part, str) for part in self._parts)
+
+    def render(self, name):
+        """Text of the message for a contact called `name`"""
+        if self.is_static:
+            return self.source
+        return ''.join(part if isinstance(part, str) else part(name) for part in self._parts)
+
+
+@lru_cache(maxsize=256)
+def compile_message(message):
+    """Compile (and cache) a campaign message"""
+    return CompiledMessage(message)
@@ -0,0 +1,40 @@
+"""
+Phone number normalization
+Contacts store their number as typed (Contact.phone_number) and in canonical
+E.164 form (Contact.phone_e164, e.g. +254712345678), which is what the SMS
+send paths read. Numbers without a country code are assumed to be Kenyan.
+"""
+import re
+
+
+DEFAULT_COUNTRY_CODE = '254'
+
+# '+', then a country code and subscriber number: 8 to 15 digits in total
+E164_RE = re.compile(r'^\+[1-9]\d{7,14}$')
+
+# Characters people type between digits
+SEPARATORS_RE = re.compile(r'[\s\-().]')
+
+
+def normalize_phone(phone):
+    """
+    Return a phone number in international format
+    Numbers without a country code are assumed to be Kenyan (+254)
+    """
+    phone = SEPARATORS_RE.sub('', phone.strip())
+    if not phone.startswith('+'):
+        if phone.startswith(DEFAULT_COUNTRY_CODE):
+            phone = '+' + phone
+        elif phone.startswith('0'):
+            phone = f"+{DEFAULT_COUNTRY_CODE}{phone[1:]}"
+        else:
+            phone = f"+{DEFAULT_COUNTRY_CODE}{phone}"
+    return phone
+
+
+def to_e164(phone):
+    """Canonical E.164 form of `phone`, or None if it is not a valid number"""
+    if not phone:
+        return None
+    phone = normalize_phone(phone)
+    return phone if E164_RE.match(phone) else None
@@ -0,0 +1,142 @@
+"""
+Rate limiting for Africa's Talking API calls
+Every sms.send goes through sms_rate_limiter.acquire(), which blocks until
+the shared token bucket allows the request.
+
+The bucket lives in one SmsRateLimit row, so all threads and all
+run_sms_worker processes draw from the same budget. Two limits are applied
+at once: messages per second (SMS_RATE_MESSAGES_PER_SECOND) and requests per
+second (SMS_RATE_REQUESTS_PER_SECOND); each bucket holds at most one second
+worth of tokens. Refill and take happen in one conditional UPDATE, so two
+senders can never spend the same tokens. A request larger than the bucket
+is let through when the bucket is full and leaves it in debt, so the
+average rate still holds.
+"""
+import time
+
+from django.conf import settings
+from django.db.models import F, Value
+from django.db.models.functions import Greatest, Least
+from django.db.models.lookups import GreaterThanOrEqual
+
+
+class TokenBucket:
+    """
+    Database-backed token bucket for one SMS provider
+    A rate of None or 0 disables that limit.
+    """
+
+    def __init__(self, name='africastalking', messages_per_second=None, requests_per_second=None):
+        self.name = name
+        self._messages_per_second = messages_per_second
+        self._requests_per_second = requests_per_second
+
+    @property
+    def messages_per_second(self):
+        if self._messages_per_second is not None:
+            return self._messages_per_second
+        return getattr(settings, 'SMS_RATE_MESSAGES_PER_SECOND', None)
+
+    @property
+    def requests_per_second(self):
+        if self._requests_per_second is not None:
+            return self._requests_per_second
+        return getattr(settings, 'SMS_RATE_REQUESTS_PER_SECOND', None)
+
+    def _row(self):
+        from .models import SmsRateLimit
+
+        return SmsRateLimit.objects.filter(name=self.name)
+
+    def _ensure_row(self):
+        from .models import SmsRateLimit
+
+        SmsRateLimit.objects.get_or_create(
+            name=self.name,
+            defaults={
+                'message_tokens': self.messages_per_second or 0,
+                'request_tokens': self.requests_per_second or 0,
+                'refilled_at': time.time(),
+            }
+        )
+
+    def _refilled(self, field, rate, now):
+        """SQL expression for the tokens in `field` after refilling up to `now`"""
+        elapsed = Greatest(Value(now) - F('refilled_at'), Value(0.0))
+        return Least(F(field) + elapsed * Value(float(rate)), Value(float(rate)))
+
+    def _try_take(self, messages, waited):
+        """Take tokens for one request if available; True on success"""
+        now = time.time()
+        conditions, changes = [], {}
+        for field, rate, needed in (
+            ('message_tokens', self.messages_per_second, messages),
+            ('request_tokens', self.requests_per_second, 1),
+        ):
+            if not rate:
+                continue
+            tokens = self._refilled(field, rate, now)
+            conditions.append(GreaterThanOrEqual(tokens, Value(float(min(needed, rate)))))
+            changes[field] = tokens - Value(float(needed))
+
+        return bool(self._row().filter(*conditions).update(
+            refilled_at=now,
+            acquired_count=F('acquired_count') + 1,
+            throttled_count=F('throttled_count') + (1 if waited else 0),
+            wait_seconds=F('wait_seconds') + waited,
+            max_wait_seconds=Greatest(F('max_wait_seconds'), Value(waited)),
+            **changes
+        ))
+
+    def _wait_time(self, messages):
+        """Seconds until enough tokens should be available"""
+        row = self._row().values('message_tokens', 'request_tokens', 'refilled_at').first()
+        if row is None:
+            return 0
+        elapsed = max(time.time() - row['refilled_at'], 0)
+        wait = 0
+        for field, rate, needed in (
+            ('message_tokens', self.messages_per_second, messages),
+            ('request_tokens', self.requests_per_second, 1),
+        ):
+            if not rate:
+                continue
+            tokens = min(row[field] + elapsed * rate, rate)
+            wait = max(wait, (min(needed, rate) - tokens) / rate)
+        return wait
+
+    def acquire(self, messages):
+        """
+        Block until a request sending `messages` SMS may be made
+        Returns the number of seconds spent waiting.
+        """
+        if not self.messages_per_second and not self.requests_per_second:
+            return 0
+        self._ensure_row()
+
+        started = time.monotonic()
+        waited = 0
+        while not self._try_take(messages, waited):
+            # Another sender may take the tokens first, so wait in short steps
+            time.sleep(min(max(self._wait_time(messages), 0.01), 1.0))
+            waited = time.monotonic() - started
+        return waited
+
+    def stats(self):
+        """Limits and wait counters for the metrics endpoint"""
+        row = self._row().values(
+            'acquired_count', 'throttled_count', 'wait_seconds', 'max_wait_seconds'
+        ).first() or {'acquired_count': 0, 'throttled_count': 0, 'wait_seconds': 0, 'max_wait_seconds': 0}
+        acquired = row['acquired_count']
+        return {
+            'messages_per_second': self.messages_per_second,
+            'requests_per_second': self.requests_per_second,
+            'requests': acquired,
+            'throttled': row['throttled_count'],
+            'throttled_rate': round(row['throttled_count'] / acquired, 4) if acquired else None,
+            'wait_seconds': round(row['wait_seconds'], 3),
+            'max_wait_seconds': round(row['max_wait_seconds'], 3),
+        }
+
+
+sms_rate_limiter = TokenBucket()
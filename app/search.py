@@ -0,0 +1,113 @@
+"""
+Full-text product search
+On SQLite, products are indexed in the app_product_fts FTS5 table (created
+with its sync triggers by migration 0013), so a search is an index lookup
+ranked by bm25 instead of a LIKE '%term%' scan of every description. Name
+matches weigh more than description matches. Other databases, or a SQLite
+build without FTS5, fall back to icontains filters.
+
+Every word of the query must match, as a word or word prefix ("smart pho"
+finds "Smart Phone"). `python manage.py rebuild_product_search` re-indexes
+all products.
+"""
+import re
+
+from django.db import OperationalError, connection
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+
+from .models import Product
+
+
+FTS_TABLE = 'app_product_fts'
+
+# bm25 column weights: name, description
+RANK = f"bm25({FTS_TABLE}, 10.0, 1.0)"
+
+WORD_RE = re.compile(r'\w+')
+
+_fts_available = None
+
+
+def fts_available():
+    """True when the FTS5 index exists (checked once per process)"""
+    global _fts_available
+    if _fts_available is None:
+        _fts_available = (
+            connection.vendor == 'sqlite'
+            and FTS_TABLE in connection.introspection.table_names(include_views=True)
+        )
+    return _fts_available
+
+
+def match_expression(query):
+    """
+    FTS5 MATCH string for a user query: every word as a quoted prefix term
+    Quoting keeps FTS5 operators and punctuation typed by users from being
+    parsed as query syntax. Returns None if the query has no words.
+    """
+    words = WORD_RE.findall(query)
+    if not words:
+        return None
+    return ' '.join(f'"{word}"*' for word in words)
+
+
+def matching_ids(query):
+    """
+    Subquery of the ids of all products matching `query` (unranked)
+    For filtering querysets, e.g. in the admin: .filter(id__in=matching_ids(q))
+    """
+    match = match_expression(query)
+    if match is None:
+        return Product.objects.none().values('id')
+    if not fts_available():
+        return like_search(Product.objects.all(), query).values('id')
+    return RawSQL(f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s", [match])
+
+
+def ranked_ids(query, limit):
+    """Ids of the best `limit` active products matching `query`, best first"""
+    match = match_expression(query)
+    if match is None:
+        return []
+    sql = (
+        f"SELECT {FTS_TABLE}.rowid FROM {FTS_TABLE} "
+        f"JOIN {Product._meta.db_table} p ON p.id = {FTS_TABLE}.rowid "
+        f"WHERE {FTS_TABLE} MATCH %s AND p.is_active "
+        f"ORDER BY {RANK} LIMIT %s"
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [match, limit])
+        return [row[0] for row in cursor.fetchall()]
+
+
+def like_search(queryset, query):
+    """Fallback: every word in the name or description (LIKE scans)"""
+    for word in WORD_RE.findall(query):
+        queryset = queryset.filter(Q(name__icontains=word) | Q(description__icontains=word))
+    return queryset
+
+
+def search_products(query, limit, fields):
+    """
+    The best `limit` active products for `query` as .values(*fields) dicts,
+    best match first
+    """
+    if not fts_available():
+        products = like_search(Product.objects.filter(is_active=True), query)
+        return list(products.values(*fields)[:limit]) if WORD_RE.search(query) else []
+
+    ids = ranked_ids(query, limit)
+    rows = {row['id']: row for row in Product.objects.filter(id__in=ids).values(*dict.fromkeys(['id', *fields]))}
+    return [rows[pk] for pk in ids if pk in rows]
+
+
+def rebuild_index():
+    """Re-index every product; returns the number of products indexed"""
+    if not fts_available():
+        raise OperationalError(f"The {FTS_TABLE} full-text index is not available on this database")
+    with connection.cursor() as cursor:
+        cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+        # 'optimize' merges the index segments for faster queries
+        cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('optimize')")
+    return Product.objects.count()
@@ -5,20 +5,45 @@ from .models import Product, Contact, Campaign
 
 # Simple serializer for Product model
 class ProductSerializer:
+    # Field -> converter from the stored value to JSON (None keeps the value)
+    FIELDS = {
+        'id': None,
+        'name': None,
+        'description': None,
+        'price': float,
+        'created_at': lambda value: value.isoformat(),
+        'updated_at': lambda value: value.isoformat(),
+        'is_active': None,
+    }
+
     def __init__(self, product):
         self.product = product
     
     def to_dict(self):
-        return {
-            'id': self.product.id,
-            'name': self.product.name,
-            'description': self.product.description,
-            'price': float(self.product.price),
-            'created_at': self.product.created_at.isoformat(),
-            'is_active': self.product.is_active,
-        }
+        return self.serialize_row({field: getattr(self.product, field) for field in self.FIELDS})
+
+    @classmethod
+    def serialize_row(cls, row, fields=None):
+        """Serialize one dict of stored values (as returned by .values())"""
+        return cls.many([row], fields)[0]
+
+    @classmethod
+    def many(cls, rows, fields=None):
+        """
+        Serialize .values() rows in one pass, without creating model instances
+        Only `fields` (default: all of FIELDS) are included, in that order.
+        """
+        converters = [(field, cls.FIELDS[field]) for field in (fields or cls.FIELDS)]
+        return [
+            {field: row[field] if convert is None else convert(row[field]) for field, convert in converters}
+            for row in rows
+        ]
 
 # Example usage:
 # product = Product.objects.first()
 # serializer = ProductSerializer(product)
 # data = serializer.to_dict()
+#
+# Many products at once, straight from the database:
+# rows = Product.objects.values('id', 'name', 'price')
+# data = ProductSerializer.many(rows, fields=['id', 'name', 'price'])
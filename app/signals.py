@@ -0,0 +1,148 @@
+"""
+Signal handlers that keep denormalized data in sync with the models
+
+ContactList.active_contact_count is maintained here from:
+- m2m_changed on ContactList.contacts (both list.contacts and contact.contact_lists)
+- Contact.is_active transitions on save
+- Contact deletion
+ContactList.save() never writes the counter, so saving a list loaded before
+a membership change does not undo it.
+
+Queryset.update() and bulk_create() bypass these signals; run
+`python manage.py recount_contact_lists` after bulk changes.
+
+The USSD menu page cache (app/ussd_cache.py) is invalidated here whenever
+campaign templates, contact lists or their member counts change, and the
+cached home page counts (app/dashboard.py) whenever a counted model changes.
+Product changes also bump the catalog version behind the /products/ ETags
+(app/catalog.py).
+"""
+from django.db.models import F
+from django.db.models.functions import Greatest
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from .catalog import bump_catalog_version
+from .dashboard import invalidate_stats
+from .models import CampaignTemplate, Contact, ContactList, Product, SentCampaign
+from .ussd_cache import menu_cache
+
+
+def shift_contact_count(lists, delta):
+    """Add `delta` to active_contact_count for every list in the queryset"""
+    if delta:
+        lists.update(active_contact_count=Greatest(F('active_contact_count') + delta, 0))
+
+
+def was_active(contact):
+    """Active state as stored in the database (falls back to the instance value)"""
+    return getattr(contact, '_loaded_is_active', contact.is_active)
+
+
+@receiver(m2m_changed, sender=ContactList.contacts.through)
+def contact_list_membership_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    """
+    Adjust counters when contacts are added to or removed from lists
+    Removals are measured in the pre_* signal, while the rows still exist.
+    """
+    if not reverse:
+        # instance is a ContactList, pk_set holds Contact ids
+        contact_list = instance
+        lists = ContactList.objects.filter(pk=contact_list.pk)
+        if action == 'post_add':
+            delta = Contact.objects.filter(pk__in=pk_set, is_active=True).count()
+        elif action == 'pre_remove':
+            contact_list._removed_active = contact_list.contacts.filter(pk__in=pk_set, is_active=True).count()
+            return
+        elif action == 'post_remove':
+            delta = -contact_list.__dict__.pop('_removed_active', 0)
+        elif action == 'post_clear':
+            lists.update(active_contact_count=0)
+            contact_list.active_contact_count = 0
+            return
+        else:
+            return
+        shift_contact_count(lists, delta)
+        contact_list.active_contact_count = max(contact_list.active_contact_count + delta, 0)
+    else:
+        # instance is a Contact, pk_set holds ContactList ids
+        contact = instance
+        if not was_active(contact):
+            return
+        if action == 'post_add':
+            shift_contact_count(ContactList.objects.filter(pk__in=pk_set), 1)
+        elif action in ('pre_remove', 'pre_clear'):
+            member_of = contact.contact_lists.all()
+            if action == 'pre_remove':
+                member_of = member_of.filter(pk__in=pk_set)
+            contact._removed_from = list(member_of.values_list('pk', flat=True))
+        elif action in ('post_remove', 'post_clear'):
+            list_ids = contact.__dict__.pop('_removed_from', [])
+            shift_contact_count(ContactList.objects.filter(pk__in=list_ids), -1)
+
+
+@receiver(post_save, sender=Contact)
+def contact_saved(sender, instance, created, **kwargs):
+    """Move the contact's lists up or down by one when is_active flips"""
+    previous = getattr(instance, '_loaded_is_active', None)
+    instance._loaded_is_active = instance.is_active
+    if created or previous == instance.is_active:
+        return
+    lists = ContactList.objects.filter(contacts=instance)
+    if previous is None:
+        # Saved from an instance that was not loaded from the database
+        ContactList.recount_contacts(list_ids=lists.values('pk'))
+    else:
+        shift_contact_count(lists, 1 if instance.is_active else -1)
+    menu_cache.invalidate('contact_lists')
+
+
+@receiver(pre_delete, sender=Contact)
+def contact_deleted(sender, instance, **kwargs):
+    """Deleted contacts leave their lists (membership rows cascade silently)"""
+    if was_active(instance):
+        shift_contact_count(ContactList.objects.filter(contacts=instance), -1)
+        menu_cache.invalidate('contact_lists')
+
+
+@receiver(post_save, sender=CampaignTemplate)
+@receiver(post_delete, sender=CampaignTemplate)
+def campaign_templates_changed(sender, **kwargs):
+    """Cached "Select a campaign" pages are stale"""
+    menu_cache.invalidate('campaigns')
+
+
+@receiver(post_save, sender=ContactList)
+@receiver(post_delete, sender=ContactList)
+def contact_lists_changed(sender, **kwargs):
+    """Cached contact list pages are stale"""
+    menu_cache.invalidate('contact_lists')
+
+
+@receiver(m2m_changed, sender=ContactList.contacts.through)
+def contact_list_members_changed(sender, action, **kwargs):
+    """Member counts shown in the contact list pages changed"""
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        menu_cache.invalidate('contact_lists')
+
+
+@receiver(post_save, sender=Contact)
+@receiver(post_delete, sender=Contact)
+@receiver(post_save, sender=CampaignTemplate)
+@receiver(post_delete, sender=CampaignTemplate)
+@receiver(post_save, sender=ContactList)
+@receiver(post_delete, sender=ContactList)
+@receiver(post_save, sender=SentCampaign)
+@receiver(post_delete, sender=SentCampaign)
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def dashboard_counts_changed(sender, **kwargs):
+    """Cached home page counts are stale"""
+    invalidate_stats()
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def product_catalog_changed(sender, **kwargs):
+    """ETags and cached /products/ responses are stale"""
+    bump_catalog_version()
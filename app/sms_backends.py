@@ -0,0 +1,290 @@
+"""
+SMS provider backends
+All sending goes through get_sms_backend().send(message, recipients), which
+returns a response shaped like Africa's Talking's bulk SMS answer:
+    {'SMSMessageData': {'Message': ..., 'Recipients': [
+        {'number', 'status', 'statusCode', 'messageId', 'cost'}, ...]}}
+and raises on network/server errors.
+
+Select a backend with SMS_BACKEND in settings (options in SMS_BACKEND_OPTIONS):
+- AfricasTalkingBackend: the real Africa's Talking SDK
+- FakeSmsBackend: answers in-process without any network, for development
+- HttpSmsBackend: posts to an HTTP endpoint speaking the Africa's Talking
+  bulk SMS protocol, e.g. `python manage.py run_fake_sms_server`, so the
+  whole pipeline can be load-tested offline
+- AsyncHttpSmsBackend: same protocol over a pool of persistent connections
+  driven by asyncio, for many batches in flight at once
+"""
+import asyncio
+import json
+import random
+import ssl
+import threading
+import time
+import uuid
+from urllib.parse import urlencode, urlsplit
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+
+# Africa's Talking status codes used by the fakes
+STATUS_SUCCESS = (101, 'Success')
+STATUS_INVALID_PHONE = (403, 'InvalidPhoneNumber')
+
+
+def fake_response(recipients, reject_rate=0.0, rng=random):
+    """Build an Africa's Talking style response for `recipients`"""
+    entries = []
+    for number in recipients:
+        code, status = STATUS_INVALID_PHONE if rng.random() < reject_rate else STATUS_SUCCESS
+        accepted = code == STATUS_SUCCESS[0]
+        entries.append({
+            'number': number,
+            'status': status,
+            'statusCode': code,
+            'messageId': f"ATXid_{uuid.uuid4().hex}" if accepted else 'None',
+            'cost': 'KES 0.8000' if accepted else '0',
+        })
+    accepted = sum(1 for entry in entries if entry['statusCode'] == STATUS_SUCCESS[0])
+    return {
+        'SMSMessageData': {
+            'Message': f"Sent to {accepted}/{len(entries)} Total Cost: KES {accepted * 0.8:.4f}",
+            'Recipients': entries,
+        }
+    }
+
+
+class BaseSmsBackend:
+    """Interface every SMS backend implements"""
+
+    def send(self, message, recipients):
+        """Send `message` to a list of phone numbers and return the provider response"""
+        raise NotImplementedError
+
+
+class AfricasTalkingBackend(BaseSmsBackend):
+    """
+    Sends through the Africa's Talking SDK
+    Uses the AFRICASTALKING_USERNAME / AFRICASTALKING_API_KEY credentials.
+    """
+
+    def __init__(self, username=None, api_key=None):
+        import africastalking
+
+        africastalking.initialize(
+            username=username or settings.AFRICASTALKING_USERNAME,
+            api_key=api_key or settings.AFRICASTALKING_API_KEY
+        )
+        self.sms = africastalking.SMS
+
+    def send(self, message, recipients):
+        return self.sms.send(message, recipients)
+
+
+class FakeSmsBackend(BaseSmsBackend):
+    """
+    Answers like Africa's Talking without touching the network
+    latency: seconds each request takes
+    failure_rate: fraction of requests that raise ConnectionError
+    reject_rate: fraction of recipients reported as InvalidPhoneNumber
+    """
+
+    def __init__(self, latency=0.0, failure_rate=0.0, reject_rate=0.0, seed=None):
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.reject_rate = reject_rate
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.messages = 0
+
+    def send(self, message, recipients):
+        if self.latency:
+            time.sleep(self.latency)
+        with self._lock:
+            self.requests += 1
+            if self._random.random() < self.failure_rate:
+                raise ConnectionError("Fake SMS backend: simulated connection failure")
+            self.messages += len(recipients)
+            return fake_response(recipients, self.reject_rate, self._random)
+
+
+class HttpSmsBackend(BaseSmsBackend):
+    """
+    Posts to an endpoint speaking the Africa's Talking bulk SMS protocol
+    (form fields username, to, message; JSON answer). One keep-alive HTTP
+    session is kept per thread; keep_alive=False opens a new connection for
+    every request, like the Africa's Talking SDK does.
+    """
+
+    def __init__(self, url='http://127.0.0.1:8025/version1/messaging', username=None, api_key=None,
+                 timeout=30, keep_alive=True):
+        import requests
+
+        self._requests = requests
+        self.url = url
+        self.username = username or settings.AFRICASTALKING_USERNAME
+        self.api_key = api_key or settings.AFRICASTALKING_API_KEY
+        self.timeout = timeout
+        self.keep_alive = keep_alive
+        self._local = threading.local()
+
+    @property
+    def session(self):
+        if not self.keep_alive:
+            return self._requests
+        if not hasattr(self._local, 'session'):
+            self._local.session = self._requests.Session()
+        return self._local.session
+
+    def send(self, message, recipients):
+        response = self.session.post(
+            self.url,
+            data={'username': self.username, 'to': ','.join(recipients), 'message': message},
+            headers={'apiKey': self.api_key, 'Accept': 'application/json'},
+            timeout=self.timeout
+        )
+        response.raise_for_status()
+        return response.json()
+
+
+class AsyncHttpSmsBackend(BaseSmsBackend):
+    """
+    Posts to an Africa's Talking style endpoint over pooled keep-alive connections
+    
+    A background asyncio event loop owns up to `max_connections` persistent
+    HTTP/1.1 connections (TLS for https:// URLs), so the connect and TLS
+    handshake cost is paid once per connection instead of once per request.
+    send() can be called from any thread: it hands the request to the loop
+    and waits for the answer, so every sending thread shares the same pool
+    and at most `max_connections` requests are in flight at once.
+    """
+
+    def __init__(self, url='http://127.0.0.1:8025/version1/messaging', username=None, api_key=None,
+                 timeout=30, max_connections=8):
+        parts = urlsplit(url)
+        self.url = url
+        self.host = parts.hostname
+        self.secure = parts.scheme == 'https'
+        self.port = parts.port or (443 if self.secure else 80)
+        self.path = parts.path or '/'
+        self.username = username or settings.AFRICASTALKING_USERNAME
+        self.api_key = api_key or settings.AFRICASTALKING_API_KEY
+        self.timeout = timeout
+        self.max_connections = max_connections
+        self._loop = None
+        self._loop_lock = threading.Lock()
+        self._idle = []  # (reader, writer) pairs ready for reuse
+        self._slots = None
+
+    @property
+    def loop(self):
+        """Event loop running in a daemon thread, started on first use"""
+        with self._loop_lock:
+            if self._loop is None:
+                loop = asyncio.new_event_loop()
+                threading.Thread(target=loop.run_forever, name='sms-async-backend', daemon=True).start()
+                self._slots = asyncio.Semaphore(self.max_connections)
+                self._loop = loop
+            return self._loop
+
+    def send(self, message, recipients):
+        future = asyncio.run_coroutine_threadsafe(self.send_async(message, recipients), self.loop)
+        return future.result()
+
+    async def send_async(self, message, recipients):
+        """Coroutine form of send(), for callers already running in self.loop"""
+        body = urlencode({'username': self.username, 'to': ','.join(recipients), 'message': message}).encode()
+        async with self._slots:
+            status, payload, reusable, connection = await self._post(body)
+            if reusable:
+                self._idle.append(connection)
+            else:
+                connection[1].close()
+        if status >= 400:
+            raise ConnectionError(f"{status} Server Error for url: {self.url}")
+        return json.loads(payload)
+
+    async def _post(self, body):
+        """Send one request, reusing an idle connection when there is one"""
+        while self._idle:
+            connection = self._idle.pop()
+            try:
+                return (*await asyncio.wait_for(self._exchange(connection, body), self.timeout), connection)
+            except (ConnectionError, asyncio.IncompleteReadError):
+                # The server closed the idle connection; try the next one
+                connection[1].close()
+            except BaseException:
+                connection[1].close()
+                raise
+        connection = await asyncio.wait_for(self._connect(), self.timeout)
+        try:
+            return (*await asyncio.wait_for(self._exchange(connection, body), self.timeout), connection)
+        except BaseException:
+            connection[1].close()
+            raise
+
+    async def _connect(self):
+        if self.secure:
+            return await asyncio.open_connection(
+                self.host, self.port, ssl=ssl.create_default_context(), server_hostname=self.host
+            )
+        return await asyncio.open_connection(self.host, self.port)
+
+    async def _exchange(self, connection, body):
+        """Write one POST and read the response; returns (status, body, reusable)"""
+        reader, writer = connection
+        writer.write((
+            f"POST {self.path} HTTP/1.1\r\n"
+            f"Host: {self.host}\r\n"
+            f"apiKey: {self.api_key}\r\n"
+            "Accept: application/json\r\n"
+            "Content-Type: application/x-www-form-urlencoded\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            "Connection: keep-alive\r\n\r\n"
+        ).encode() + body)
+        await writer.drain()
+
+        status_line = await reader.readline()
+        if not status_line:
+            raise ConnectionError("Connection closed by server")
+        status = int(status_line.split()[1])
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+
+        if headers.get('transfer-encoding', '').lower() == 'chunked':
+            payload = b''
+            while True:
+                size = int((await reader.readline()).split(b';')[0], 16)
+                if size == 0:
+                    await reader.readline()
+                    break
+                payload += await reader.readexactly(size)
+                await reader.readline()
+        else:
+            payload = await reader.readexactly(int(headers.get('content-length', 0)))
+
+        reusable = headers.get('connection', '').lower() != 'close'
+        return status, payload, reusable
+
+
+_sms_backend = None
+
+
+def get_sms_backend():
+    """
+    Return the configured SMS backend (created once per process)
+    """
+    global _sms_backend
+    if _sms_backend is None:
+        backend = import_string(getattr(
+            settings, 'SMS_BACKEND', 'app.sms_backends.AfricasTalkingBackend'
+        ))
+        _sms_backend = backend(**getattr(settings, 'SMS_BACKEND_OPTIONS', {}))
+    return _sms_backend
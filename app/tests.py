@@ -0,0 +1,661 @@
+import contextlib
+import io
+import json
+import math
+import tempfile
+import tracemalloc
+from collections import Counter
+from datetime import timedelta
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import OperationalError
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+
+from .circuit_breaker import CircuitBreaker, sms_circuit_breaker
+from .management.commands.import_contacts import Command as ImportCommand
+from .messaging import message_batches, send_campaign_to_list, send_chunk, stream_recipients
+from .models import (
+    CampaignTemplate, Contact, ContactList, DailySendStat, OutboxBatch, SendJob, SentCampaign, SentMessage,
+    SmsCircuitBreaker
+)
+from .outbox import (
+    LeaseLost, claim_batch, claim_job, expand_job, extend_job_lease, finish_job_if_done, record_job_error, send_batch
+)
+from .personalize import compile_message, first_name
+from .ratelimit import sms_rate_limiter
+from .sms_backends import FakeSmsBackend
+from .ussd_cache import MenuPageCache
+from .views import send_selected_campaign
+
+
+def add_contacts(contact_list, numbers, name_of):
+    """Bulk-create a contact per number (named name_of(number)) in contact_list"""
+    contacts = []
+    for number in numbers:
+        name = name_of(number)
+        contacts.append(Contact(
+            phone_number=f'+2547{number:08d}',
+            phone_e164=f'+2547{number:08d}',
+            name=name,
+            first_name=first_name(name),
+        ))
+    Contact.objects.bulk_create(contacts, batch_size=1000)
+    membership = ContactList.contacts.through
+    membership.objects.bulk_create(
+        [membership(contactlist_id=contact_list.pk, contact_id=contact.pk) for contact in contacts],
+        batch_size=1000
+    )
+    return contacts
+
+
+@override_settings(
+    SMS_BATCH_SIZE=100,
+    SMS_STREAM_CHUNK_SIZE=250,
+    SMS_SEND_THREADS=2,
+    SMS_RATE_MESSAGES_PER_SECOND=None,
+    SMS_RATE_REQUESTS_PER_SECOND=None,
+    SMS_RETRY_ATTEMPTS=1,
+)
+class SendMemoryTests(TransactionTestCase):
+    """
+    Peak memory of a send must not grow with the size of the contact list
+    The same list is measured at two sizes; the larger one is 8x the smaller,
+    so anything held per recipient would show up as a much higher peak. Even
+    the smaller list fills every open personalized batch (NAMES distinct
+    texts of SMS_BATCH_SIZE recipients), so bounded buffers are included in
+    both measurements.
+    """
+    NAMES = 10
+    SMALL = 2000
+    LARGE = 16000
+
+    def setUp(self):
+        self.template = CampaignTemplate.objects.create(
+            name='Memory test', message='Hello [Name], thanks for shopping with us', created_by='+254700000000'
+        )
+        self.contact_list = ContactList.objects.create(name='Memory test')
+        self.added = 0
+
+    def grow_list(self, size):
+        """Add contacts until the list holds `size` of them"""
+        add_contacts(self.contact_list, range(self.added, size), lambda number: f'Customer{number % self.NAMES}')
+        self.added = size
+
+    def peak_memory(self, function):
+        """Peak bytes traced while running function()"""
+        tracemalloc.start()
+        try:
+            function()
+            return tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+    def assertFlat(self, measure):
+        measure()  # warm up query compilation and caches
+        self.grow_list(self.SMALL)
+        small = self.peak_memory(measure)
+        self.grow_list(self.LARGE)
+        large = self.peak_memory(measure)
+        self.assertLess(large, small * 1.5 + 256 * 1024, f'peak {small} bytes for {self.SMALL} contacts, {large} for {self.LARGE}')
+
+    def test_stream_recipients_memory_is_flat(self):
+        def measure():
+            for _ in stream_recipients(self.contact_list.contacts.all()):
+                pass
+
+        self.assertFlat(measure)
+
+    def test_send_campaign_to_list_memory_is_flat(self):
+        backend = FakeSmsBackend(reject_rate=0.1, seed=1)
+
+        def measure():
+            with contextlib.redirect_stdout(io.StringIO()):
+                send_campaign_to_list(self.template, self.contact_list, '+254700000000')
+
+        with mock.patch('app.messaging.get_sms_backend', return_value=backend):
+            self.assertFlat(measure)
+        self.assertEqual(SentMessage.objects.count(), self.SMALL + self.LARGE)
+        self.assertEqual(backend.messages, self.SMALL + self.LARGE)
+
+
+@override_settings(
+    SMS_BATCH_SIZE=50,
+    SMS_STREAM_CHUNK_SIZE=200,
+    SMS_SEND_THREADS=2,
+    SMS_RATE_MESSAGES_PER_SECOND=None,
+    SMS_RATE_REQUESTS_PER_SECOND=None,
+    SMS_RETRY_ATTEMPTS=1,
+)
+class PersonalizedBatchTests(TransactionTestCase):
+    """
+    Recipients who get the same text share provider requests: a send makes
+    ceil(recipients / SMS_BATCH_SIZE) requests per distinct text, however
+    many distinct texts there are and in whatever order contacts were added
+    """
+    MESSAGE = 'Hello [Name], thanks for shopping with us'
+
+    def setUp(self):
+        self.template = CampaignTemplate.objects.create(name='Batching test', message=self.MESSAGE, created_by='+254700000000')
+        self.contact_list = ContactList.objects.create(name='Batching test')
+        # 203 first names (many more than message_batches keeps open at once),
+        # interleaved in id order; a third of the contacts share 7 names
+        add_contacts(
+            self.contact_list, range(6000),
+            lambda number: f'Name{number % 300 if number % 3 else number % 7} Surname{number}'
+        )
+        # Contacts without a name get the fallback name
+        add_contacts(self.contact_list, range(6000, 6100), lambda number: '   ')
+
+    def expected_requests(self):
+        compiled = compile_message(self.MESSAGE)
+        per_text = Counter(compiled.render(name) for _, name in stream_recipients(self.contact_list.contacts.all()))
+        return sum(math.ceil(count / 50) for count in per_text.values()), len(per_text)
+
+    def test_batches_follow_distinct_texts(self):
+        expected, texts = self.expected_requests()
+        self.assertEqual(texts, 204)
+        batches = list(message_batches(self.MESSAGE, self.contact_list.contacts.all()))
+        self.assertEqual(len(batches), expected)
+        self.assertEqual(sum(len(phones) for _, phones in batches), 6100)
+
+    def test_provider_requests_follow_distinct_texts(self):
+        backend = FakeSmsBackend(seed=1)
+        with mock.patch('app.messaging.get_sms_backend', return_value=backend), \
+                contextlib.redirect_stdout(io.StringIO()):
+            result = send_campaign_to_list(self.template, self.contact_list, '+254700000000')
+        self.assertTrue(result['success'])
+        self.assertEqual(backend.requests, self.expected_requests()[0])
+        self.assertEqual(backend.messages, 6100)
+
+
+class ActiveContactCountTests(TestCase):
+    """ContactList.active_contact_count follows membership and is_active changes"""
+
+    def setUp(self):
+        self.contact_list = ContactList.objects.create(name='Counter test')
+        self.alice = Contact.objects.create(phone_number='+254711000001', name='Alice')
+        self.bob = Contact.objects.create(phone_number='+254711000002', name='Bob')
+        self.carol = Contact.objects.create(phone_number='+254711000003', name='Carol', is_active=False)
+
+    def stored_count(self):
+        return ContactList.objects.get(pk=self.contact_list.pk).active_contact_count
+
+    def assertCount(self, expected):
+        self.assertEqual(self.stored_count(), expected)
+        self.assertEqual(ContactList.recount_contacts(), 0, 'counter drifted from the membership table')
+
+    def test_add_remove_clear_from_the_list(self):
+        self.contact_list.contacts.add(self.alice, self.bob, self.carol)
+        self.assertCount(2)
+        self.contact_list.contacts.remove(self.alice, self.carol)
+        self.assertCount(1)
+        self.contact_list.contacts.clear()
+        self.assertCount(0)
+
+    def test_add_remove_clear_from_the_contact(self):
+        for contact in (self.alice, self.bob, self.carol):
+            contact.contact_lists.add(self.contact_list)
+        self.assertCount(2)
+        self.alice.contact_lists.remove(self.contact_list)
+        self.assertCount(1)
+        self.bob.contact_lists.clear()
+        self.carol.contact_lists.clear()
+        self.assertCount(0)
+
+    def test_is_active_toggle(self):
+        self.contact_list.contacts.add(self.alice, self.bob, self.carol)
+        self.carol.is_active = True
+        self.carol.save()
+        self.assertCount(3)
+        self.alice.is_active = False
+        self.alice.save()
+        self.alice.save()
+        self.assertCount(2)
+
+    def test_contact_delete(self):
+        self.contact_list.contacts.add(self.alice, self.bob, self.carol)
+        self.alice.delete()
+        self.assertCount(1)
+        self.carol.delete()
+        self.assertCount(1)
+
+    def test_saving_a_stale_list_keeps_the_count(self):
+        stale = ContactList.objects.get(pk=self.contact_list.pk)
+        self.alice.contact_lists.add(self.contact_list)
+        self.bob.contact_lists.add(self.contact_list)
+        stale.description = 'Edited elsewhere'
+        stale.save()
+        self.assertCount(2)
+        stale.save(update_fields=['description', 'active_contact_count'])
+        self.assertCount(2)
+        self.assertEqual(ContactList.objects.get(pk=stale.pk).description, 'Edited elsewhere')
+        # Later deactivations are not hidden by a clamped, drifted counter
+        self.alice.is_active = False
+        self.alice.save()
+        self.assertCount(1)
+
+
+class QuietTestCase(TestCase):
+    """Hides the progress lines the send code prints"""
+
+    def setUp(self):
+        self.enterContext(contextlib.redirect_stdout(io.StringIO()))
+
+
+@override_settings(SMS_BREAKER_FAILURES=2, SMS_BREAKER_COOLDOWN=30)
+class CircuitBreakerTests(QuietTestCase):
+    """closed -> open -> half-open -> closed/open transitions"""
+
+    def setUp(self):
+        super().setUp()
+        self.breaker = CircuitBreaker(name='test')
+
+    def state(self):
+        return SmsCircuitBreaker.objects.get(name='test')
+
+    def open_breaker(self):
+        self.breaker.record_failure('ConnectionError: boom')
+        self.breaker.record_failure('ConnectionError: boom')
+
+    def end_cooldown(self):
+        SmsCircuitBreaker.objects.filter(name='test').update(open_until=timezone.now() - timedelta(seconds=1))
+
+    def test_opens_after_threshold_failures_in_a_row(self):
+        self.assertTrue(self.breaker.allow())
+        self.breaker.record_failure('ConnectionError: boom')
+        self.breaker.record_success()
+        self.breaker.record_failure('ConnectionError: boom')
+        self.assertEqual(self.state().state, 'closed')
+        self.breaker.record_failure('ConnectionError: boom')
+        self.assertEqual(self.state().state, 'open')
+        self.assertFalse(self.breaker.allow())
+        self.assertGreater(self.breaker.retry_after(), 25)
+
+    def test_one_probe_after_the_cooldown_closes_on_success(self):
+        self.open_breaker()
+        self.end_cooldown()
+        self.assertTrue(self.breaker.allow())
+        self.assertFalse(self.breaker.allow(), 'only one sender may probe')
+        self.assertEqual(self.state().state, 'half_open')
+        self.breaker.record_success()
+        state = self.state()
+        self.assertEqual((state.state, state.consecutive_failures, state.open_until), ('closed', 0, None))
+        self.assertTrue(self.breaker.allow())
+
+    def test_failed_probe_opens_again(self):
+        self.open_breaker()
+        self.end_cooldown()
+        self.assertTrue(self.breaker.allow())
+        self.breaker.record_failure('ConnectionError: still down')
+        state = self.state()
+        self.assertEqual((state.state, state.opened_count), ('open', 2))
+        self.assertFalse(self.breaker.allow())
+
+
+class SendChunkTests(QuietTestCase):
+    """send_chunk tells provider failures from local database errors"""
+
+    def send(self, backend):
+        with mock.patch('app.messaging.get_sms_backend', return_value=backend):
+            return send_chunk('Hello', ['+254711000001'])
+
+    def failures(self):
+        return SmsCircuitBreaker.objects.values_list('consecutive_failures', flat=True).first() or 0
+
+    def test_provider_error_is_counted(self):
+        result = self.send(FakeSmsBackend(failure_rate=1))
+        self.assertIn('ConnectionError', result['error'])
+        self.assertEqual(self.failures(), 1)
+
+    @override_settings(SMS_BREAKER_FAILURES=1)
+    def test_open_breaker_sends_nothing(self):
+        backend = FakeSmsBackend(failure_rate=1)
+        self.send(backend)
+        result = self.send(backend)
+        self.assertTrue(result['circuit_open'])
+        self.assertEqual(backend.requests, 1)
+
+    def test_breaker_database_errors_do_not_fail_the_send(self):
+        backend = FakeSmsBackend()
+        locked = OperationalError('database table is locked')
+        with mock.patch.object(sms_circuit_breaker, 'allow', side_effect=locked), \
+                mock.patch.object(sms_circuit_breaker, 'record_success', side_effect=locked):
+            result = self.send(backend)
+        self.assertEqual((result['sent'], result['failed']), (1, 0))
+        self.assertNotIn('error', result)
+        self.assertEqual(backend.requests, 1)
+
+        with mock.patch.object(sms_circuit_breaker, 'record_failure', side_effect=locked):
+            result = self.send(FakeSmsBackend(failure_rate=1))
+        self.assertIn('ConnectionError', result['error'])
+
+    def test_rate_limiter_database_error_is_not_a_provider_failure(self):
+        backend = FakeSmsBackend()
+        with mock.patch('app.messaging.get_sms_backend', return_value=backend), \
+                mock.patch.object(sms_rate_limiter, 'acquire', side_effect=OperationalError('database is locked')):
+            with self.assertRaises(OperationalError):
+                send_chunk('Hello', ['+254711000001'])
+        self.assertEqual(backend.requests, 0)
+        self.assertFalse(SmsCircuitBreaker.objects.filter(consecutive_failures__gt=0).exists())
+
+
+@override_settings(SMS_BREAKER_FAILURES=1, SMS_BREAKER_COOLDOWN=30, SMS_RETRY_ATTEMPTS=3)
+class SendBatchRetryTests(QuietTestCase):
+    """send_batch puts batches back: provider errors use an attempt, an open breaker does not"""
+
+    def setUp(self):
+        super().setUp()
+        template = CampaignTemplate.objects.create(name='Retry test', message='Hello', created_by='+254700000000')
+        contact_list = ContactList.objects.create(name='Retry test')
+        job = SendJob.objects.create(
+            campaign_template=template, contact_list=contact_list, requested_by='+254700000000', status='running'
+        )
+        OutboxBatch.objects.create(
+            job=job, message='Hello', recipients=json.dumps(['+254711000001']), recipients_count=1, status='pending'
+        )
+
+    def claim_and_send(self, backend):
+        batch = claim_batch('worker-1')
+        with mock.patch('app.messaging.get_sms_backend', return_value=backend):
+            status = send_batch(batch, 'worker-1')
+        batch.refresh_from_db()
+        return status, batch
+
+    def test_provider_error_uses_an_attempt(self):
+        status, batch = self.claim_and_send(FakeSmsBackend(failure_rate=1))
+        self.assertEqual((status, batch.status, batch.attempts, batch.leased_until), ('pending', 'pending', 1, None))
+
+    def test_open_breaker_defers_without_using_an_attempt(self):
+        sms_circuit_breaker.record_failure('ConnectionError: boom')
+        backend = FakeSmsBackend()
+        status, batch = self.claim_and_send(backend)
+        self.assertEqual((status, batch.status, batch.attempts), ('pending', 'pending', 0))
+        self.assertEqual(backend.requests, 0)
+        open_until = SmsCircuitBreaker.objects.get().open_until
+        self.assertAlmostEqual(batch.available_at.timestamp(), open_until.timestamp(), delta=1)
+        # Not due again before the cool-down is over
+        self.assertIsNone(claim_batch('worker-1'))
+
+
+@override_settings(CACHES={
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+    'menus-a': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'menus-a'},
+    'menus-b': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'menus-b'},
+})
+class MenuCacheInvalidationTests(TestCase):
+    """
+    Menu pages go stale in every process at once
+    Two MenuPageCache objects on separate local memory caches stand for two
+    processes (e.g. a web worker and a management command).
+    """
+
+    def setUp(self):
+        self.web = MenuPageCache(alias='menus-a')
+        self.command = MenuPageCache(alias='menus-b')
+        # Pages outlive the rollback of the versions at the end of each test
+        self.web.cache.clear()
+        self.command.cache.clear()
+        self.builds = 0
+
+    def page(self, cache):
+        def build():
+            self.builds += 1
+            return {'text': f'build {self.builds}'}
+        return cache.get_page('contact_lists', ('lists', None), build)['text']
+
+    def test_invalidation_from_another_process(self):
+        self.assertEqual(self.page(self.web), 'build 1')
+        self.assertEqual(self.page(self.web), 'build 1')
+        self.command.invalidate('contact_lists')
+        self.assertEqual(self.page(self.web), 'build 2')
+
+    def test_model_changes_invalidate_menus(self):
+        self.assertEqual(self.page(self.web), 'build 1')
+        contact_list = ContactList.objects.create(name='New list')
+        self.assertEqual(self.page(self.web), 'build 2')
+        ContactList.contacts.through.objects.create(
+            contactlist=contact_list, contact=Contact.objects.create(phone_number='+254711000001', name='Alice')
+        )
+        self.assertEqual(self.page(self.web), 'build 2', 'bulk membership rows skip the signals')
+        contact_list.contacts.add(Contact.objects.create(phone_number='+254711000002', name='Bob'))
+        self.assertEqual(self.page(self.web), 'build 3')
+        # Other kinds are not affected
+        self.assertEqual(self.web.version('campaigns'), self.command.version('campaigns'))
+
+
+@override_settings(
+    SMS_BATCH_SIZE=10,
+    SMS_OUTBOX_JOB_ATTEMPTS=3,
+    SMS_RATE_MESSAGES_PER_SECOND=None,
+    SMS_RATE_REQUESTS_PER_SECOND=None,
+)
+class OutboxTests(TransactionTestCase):
+    """Leases, takeovers and the end of a job in the durable outbox"""
+
+    def setUp(self):
+        self.enterContext(contextlib.redirect_stdout(io.StringIO()))
+        self.template = CampaignTemplate.objects.create(name='Outbox test', message='Hello', created_by='+254700000000')
+        self.contact_list = ContactList.objects.create(name='Outbox test')
+        add_contacts(self.contact_list, range(45), lambda number: f'Customer{number}')
+        self.job = SendJob.objects.create(
+            campaign_template=self.template, contact_list=self.contact_list, requested_by='+254700000000'
+        )
+
+    def expire_lease(self, model=SendJob, **filters):
+        model.objects.filter(**filters).update(leased_until=timezone.now() - timedelta(seconds=1))
+
+    def test_expired_lease_is_taken_over(self):
+        first = claim_job('worker-1')
+        self.assertEqual((first.pk, first.leased_by, first.attempts), (self.job.pk, 'worker-1', 1))
+        self.assertIsNone(claim_job('worker-2'), 'the lease is still held')
+
+        self.expire_lease(pk=self.job.pk)
+        second = claim_job('worker-2')
+        self.assertEqual((second.pk, second.leased_by, second.attempts), (self.job.pk, 'worker-2', 2))
+        with self.assertRaises(LeaseLost):
+            extend_job_lease(first, 'worker-1')
+
+    def test_takeover_discards_the_staged_batches(self):
+        import app.outbox as outbox
+
+        first = claim_job('worker-1')
+        stage_batches = outbox.stage_batches
+        calls = []
+
+        def stage_then_lose_the_lease(job, worker, batches):
+            stage_batches(job, worker, batches)
+            if not calls:
+                # worker-1 stalls after its first chunk and worker-2 takes over
+                self.expire_lease(pk=job.pk)
+                calls.append(claim_job('worker-2'))
+
+        with mock.patch.object(outbox, 'EXPANSION_CHUNK', 2), \
+                mock.patch.object(outbox, 'stage_batches', stage_then_lose_the_lease):
+            with self.assertRaises(LeaseLost):
+                expand_job(first, 'worker-1')
+        self.assertEqual(OutboxBatch.objects.filter(job=self.job, status='staged').count(), 2)
+
+        self.assertEqual(expand_job(calls[0], 'worker-2'), 5)
+        batches = OutboxBatch.objects.filter(job=self.job)
+        self.assertEqual(set(batches.values_list('status', flat=True)), {'pending'})
+        phones = [phone for recipients in batches.values_list('recipients', flat=True) for phone in json.loads(recipients)]
+        self.assertEqual(len(phones), 45)
+        self.assertEqual(len(set(phones)), 45)
+        self.assertEqual(SentCampaign.objects.count(), 1)
+        self.assertIsNone(SendJob.objects.get(pk=self.job.pk).leased_until)
+
+    def test_a_row_is_never_claimed_twice(self):
+        expand_job(claim_job('worker-1'), 'worker-1')
+        first_pk = OutboxBatch.objects.order_by('id').values_list('pk', flat=True).first()
+
+        real_list = list
+
+        def another_worker_claims_first(candidates):
+            pks = real_list(candidates)
+            # worker-2 leases the same row between worker-1's SELECT and UPDATE
+            with mock.patch('app.outbox.list', real_list, create=True):
+                self.assertEqual(claim_batch('worker-2').pk, first_pk)
+            return pks
+
+        with mock.patch('app.outbox.list', side_effect=another_worker_claims_first, create=True):
+            batch = claim_batch('worker-1')
+        self.assertNotEqual(batch.pk, first_pk)
+        self.assertEqual(OutboxBatch.objects.get(pk=first_pk).leased_by, 'worker-2')
+
+        claimed = [batch.pk, first_pk]
+        while (batch := claim_batch('worker-3')) is not None:
+            claimed.append(batch.pk)
+        self.assertEqual(sorted(claimed), sorted(OutboxBatch.objects.values_list('pk', flat=True)))
+
+    def test_job_finishes_exactly_once(self):
+        expand_job(claim_job('worker-1'), 'worker-1')
+        backend = FakeSmsBackend()
+        with mock.patch('app.messaging.get_sms_backend', return_value=backend):
+            for _ in range(4):
+                send_batch(claim_batch('worker-1'), 'worker-1')
+            self.assertFalse(finish_job_if_done(self.job.pk), 'a batch is still pending')
+            self.assertEqual(SendJob.objects.get(pk=self.job.pk).status, 'running')
+            send_batch(claim_batch('worker-1'), 'worker-1')
+
+        job = SendJob.objects.select_related('sent_campaign').get(pk=self.job.pk)
+        self.assertEqual(job.status, 'done')
+        self.assertEqual(job.sent_campaign.status, 'success')
+        self.assertFalse(finish_job_if_done(self.job.pk))
+        self.assertEqual(DailySendStat.objects.get().campaigns, 1)
+        self.assertEqual(DailySendStat.objects.get().sent, 45)
+
+    def test_job_fails_when_its_attempts_are_used_up(self):
+        for attempt in range(1, 4):
+            job = claim_job(f'worker-{attempt}')
+            self.assertEqual(job.attempts, attempt)
+            record_job_error(job, f'worker-{attempt}', 'ValueError: boom')
+            self.expire_lease(pk=job.pk)
+        self.assertIsNone(claim_job('worker-4'))
+        job = SendJob.objects.get(pk=self.job.pk)
+        self.assertEqual(job.status, 'failed')
+        self.assertIn('3 attempts', job.error)
+        self.assertIn('ValueError: boom', job.error)
+
+    def test_worker_survives_expansion_errors(self):
+        with mock.patch('app.management.commands.run_sms_worker.expand_job', side_effect=ValueError('boom')):
+            for _ in range(3):
+                call_command('run_sms_worker', once=True, poll_interval=0, stdout=io.StringIO())
+                self.expire_lease(pk=self.job.pk)
+        call_command('run_sms_worker', once=True, poll_interval=0, stdout=io.StringIO())
+        job = SendJob.objects.get(pk=self.job.pk)
+        self.assertEqual((job.status, job.attempts), ('failed', 3))
+        self.assertIn('ValueError: boom', job.error)
+
+    @override_settings(SMS_RETRY_ATTEMPTS=1)
+    def test_worker_gives_back_batches_that_raise(self):
+        expand_job(claim_job('worker-1'), 'worker-1')
+        with mock.patch('app.outbox.send_chunk', side_effect=RuntimeError('unexpected')):
+            call_command('run_sms_worker', once=True, poll_interval=0, stdout=io.StringIO())
+        self.assertEqual(set(OutboxBatch.objects.values_list('status', flat=True)), {'failed'})
+        self.assertEqual(OutboxBatch.objects.filter(api_response='RuntimeError: unexpected').count(), 5)
+        job = SendJob.objects.select_related('sent_campaign').get(pk=self.job.pk)
+        self.assertEqual((job.status, job.sent_campaign.status), ('failed', 'failed'))
+
+
+class DuplicatePhoneTests(QuietTestCase):
+    """Contacts whose number another contact already has are kept, flagged and reported"""
+
+    def setUp(self):
+        super().setUp()
+        self.holder = Contact.objects.create(phone_number='+254712345678', name='Alice')
+
+    def test_saving_a_duplicate_does_not_crash(self):
+        duplicate = Contact.objects.create(phone_number='0712345678', name='Alice again')
+        self.assertIsNone(duplicate.phone_e164)
+        duplicate.name = 'Alice B'
+        duplicate.save()
+        duplicate.save(update_fields=['phone_number'])
+        self.assertIsNone(Contact.objects.get(pk=duplicate.pk).phone_e164)
+        self.assertEqual(Contact.objects.get(pk=self.holder.pk).phone_e164, '+254712345678')
+
+        # Once the number is free again, the next save picks it up
+        self.holder.delete()
+        duplicate.save()
+        self.assertEqual(Contact.objects.get(pk=duplicate.pk).phone_e164, '+254712345678')
+
+    def test_fix_phone_numbers_reports_duplicates(self):
+        duplicate = Contact.objects.create(phone_number='0712345678', name='Alice again')
+        output = io.StringIO()
+        call_command('fix_phone_numbers', dry_run=True, stdout=output)
+        self.assertIn('Duplicates (number belongs to another contact): 1 contacts', output.getvalue())
+        self.assertIn(
+            f'Contact {duplicate.pk}: 0712345678 → +254712345678 (held by contact {self.holder.pk})',
+            output.getvalue()
+        )
+
+
+class ImportContactsTests(QuietTestCase):
+    """The import summary counts the rows actually written"""
+
+    def setUp(self):
+        super().setUp()
+        self.holder = Contact.objects.create(phone_number='+254712345678', name='Alice')
+        self.contact_list = ContactList.objects.create(name='Imported')
+        self.contact_list.contacts.add(self.holder)
+
+    def import_csv(self, rows):
+        path = self.enterContext(tempfile.TemporaryDirectory()) + '/contacts.csv'
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write('phone_number,name\n' + ''.join(f'{phone},{name}\n' for phone, name in rows))
+        output = io.StringIO()
+        call_command('import_contacts', path, list_name='Imported', stdout=output)
+        return output.getvalue()
+
+    def test_existing_contacts_and_members_are_not_counted_as_new(self):
+        output = self.import_csv([('0712345678', 'Alice'), ('0722000001', 'Bob'), ('bad', 'Nobody')])
+        self.assertIn('New contacts: 1\n', output)
+        self.assertIn('Already existing: 1\n', output)
+        self.assertIn("Added to 'Imported': 1\n", output)
+        self.assertEqual(self.contact_list.contacts.count(), 2)
+
+    def test_rows_added_by_another_writer_are_skipped(self):
+        # Built as the import would have, after its lookup missed the holder
+        rows = [
+            Contact(phone_number=phone, phone_e164=phone, name='Imported', first_name='Imported')
+            for phone in ['+254712345678', '+254722000002']
+        ]
+        self.assertEqual(ImportCommand().insert_new(Contact, rows), 1)
+        self.assertEqual(Contact.objects.filter(phone_e164='+254722000002').count(), 1)
+        self.assertEqual(Contact.objects.get(phone_e164='+254712345678').name, 'Alice')
+
+
+class SendSelectedCampaignTests(QuietTestCase):
+    """The USSD confirmation screen never shows internal errors to the handset"""
+
+    def setUp(self):
+        super().setUp()
+        template = CampaignTemplate.objects.create(name='Promo', message='Hi', created_by='+254700000000')
+        contact_list = ContactList.objects.create(name='Customers')
+        self.session = {'selected_campaign_id': template.pk, 'selected_list_id': contact_list.pk}
+
+    def test_queue_errors_get_a_fixed_message(self):
+        with mock.patch.object(SendJob.objects, 'create', side_effect=OperationalError('disk I/O error at /var/db')):
+            response = send_selected_campaign(self.session, '+254700000000')
+        self.assertEqual(response, 'END ❌ Could not queue the campaign. Please try again later.')
+        self.assertFalse(SendJob.objects.exists())
+
+    def test_missing_selection_is_invalid(self):
+        self.session['selected_list_id'] += 1
+        self.assertEqual(send_selected_campaign(self.session, '+254700000000'), 'END Invalid selection.')
+
+
+class MetricsTests(TestCase):
+    """Internal counters are only served to staff"""
+
+    def test_metrics_requires_staff(self):
+        response = self.client.get('/metrics')
+        self.assertEqual(response.status_code, 302)
+        self.assertIn('/admin/login/', response['Location'])
+
+        self.client.force_login(User.objects.create_user('ops', is_staff=True))
+        response = self.client.get('/metrics')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('sms_circuit_breaker', response.json())
@@ -19,4 +19,16 @@ urlpatterns = [
 
     # Products API endpoint - returns active products in JSON
     path('products/', views.products_list, name='products_list'),
+
+    # Full-text product search - best matches first, JSON
+    path('products/search', views.products_search, name='products_search'),
+
+    # Operational metrics - cache hit rates and other counters as JSON
+    path('metrics', views.metrics, name='metrics'),
+
+    # Daily/weekly/monthly send totals as JSON for staff (from the rollup table)
+    path('analytics/sends', views.send_analytics, name='send_analytics'),
+
+    # Streaming CSV/NDJSON exports for staff (contacts, lists, send history)
+    path('exports/<str:kind>', views.export_data, name='export_data'),
 ]
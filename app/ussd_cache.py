@@ -0,0 +1,96 @@
+"""
+Render cache for USSD menu pages
+The "Select a campaign" / "Select a contact list" screens only change when a
+CampaignTemplate or ContactList changes, so rendered pages are cached and
+reused across sessions.
+
+Each data kind ('campaigns', 'contact_lists') has a version number kept in a
+CatalogVersion row ('ussd-menu:<kind>', see app/catalog.py). Cache keys
+include that version, and the signal handlers in app/signals.py (or any
+command that writes in bulk) bump it whenever the underlying rows change,
+which makes every older page unreachable at once (they then simply expire).
+Because the version lives in the database, a change made by any process
+(another web worker, run_sms_worker, import_contacts...) reaches every
+process on its next menu render, even with the per-process LocMemCache.
+
+The hit/miss counters are kept in the cache, so with LocMemCache they count
+the current process only.
+"""
+import hashlib
+
+from django.conf import settings
+from django.core.cache import caches
+
+
+class MenuPageCache:
+    """
+    Versioned cache of rendered menu pages with hit/miss counters
+    Uses the USSD_MENU_CACHE alias from settings.CACHES.
+    """
+
+    def __init__(self, alias=None, timeout=None):
+        self._alias = alias
+        self._timeout = timeout
+
+    @property
+    def cache(self):
+        return caches[self._alias or getattr(settings, 'USSD_MENU_CACHE', 'default')]
+
+    @property
+    def timeout(self):
+        if self._timeout is not None:
+            return self._timeout
+        return getattr(settings, 'USSD_MENU_CACHE_TIMEOUT', 300)
+
+    def version(self, kind):
+        """Current data version of `kind` (a primary-key lookup)"""
+        from .catalog import catalog_state
+
+        return catalog_state(f"ussd-menu:{kind}")[0]
+
+    def invalidate(self, kind):
+        """Bump the data version so every cached page of `kind` is skipped"""
+        from .catalog import bump_catalog_version
+
+        bump_catalog_version(f"ussd-menu:{kind}")
+
+    def get_page(self, kind, page_key, build):
+        """
+        Return the cached page for (kind, page_key), calling build() on a miss
+        build() must return a picklable value (never None).
+        """
+        digest = hashlib.md5(repr(page_key).encode()).hexdigest()
+        key = f"ussd-menu:{kind}:v{self.version(kind)}:{digest}"
+        page = self.cache.get(key)
+        if page is not None:
+            self._count('hits')
+            return page
+        self._count('misses')
+        page = build()
+        self.cache.set(key, page, timeout=self.timeout)
+        return page
+
+    def _count(self, counter):
+        key = f"ussd-menu:stats:{counter}"
+        try:
+            self.cache.incr(key)
+        except ValueError:
+            self.cache.add(key, 0, timeout=None)
+            self.cache.incr(key)
+
+    def stats(self):
+        """Hit/miss counters (of this process only, unless the cache backend is shared)"""
+        hits = self.cache.get("ussd-menu:stats:hits", 0)
+        misses = self.cache.get("ussd-menu:stats:misses", 0)
+        total = hits + misses
+        return {
+            'hits': hits,
+            'misses': misses,
+            'hit_rate': round(hits / total, 4) if total else None,
+        }
+
+    def reset_stats(self):
+        self.cache.delete_many(["ussd-menu:stats:hits", "ussd-menu:stats:misses"])
+
+
+menu_cache = MenuPageCache()
@@ -0,0 +1,137 @@
+"""
+Small state machine engine for USSD menus
+Menus are declared once as a graph of MenuState objects and compiled into
+a dispatch table when the module defining them is imported.
+
+Africa's Talking sends the whole journey on every hop (e.g. "2*1*3"), so
+instead of re-splitting that text each time the session keeps a cursor:
+the current state name and how much of the text has already been consumed.
+Each hop only looks at the newest input segment, which also means free-text
+answers may safely contain '*'.
+"""
+
+# Session keys used by the engine (flow handlers keep their own keys)
+STATE_KEY = '_state'
+CURSOR_KEY = '_cursor'
+
+
+class MenuState:
+    """
+    One screen of a USSD menu
+
+    Args:
+        name: Unique state name
+        enter: Callable(session_data, phone_number) returning the response text
+               ("CON ..." keeps the session open, "END ..." finishes it)
+        options: Dict mapping an exact input (e.g. '1') to the next state name
+        on_input: Callable(value, session_data, phone_number) returning the next
+                  state name, for free text or dynamic choices
+        default: State used when the input matches none of the options
+    """
+
+    def __init__(self, name, enter, options=None, on_input=None, default=None):
+        if options and on_input:
+            raise ValueError(f"State '{name}' cannot have both options and on_input")
+        self.name = name
+        self.enter = enter
+        self.options = dict(options or {})
+        self.on_input = on_input
+        self.default = default
+
+    def next_state(self, value, session_data, phone_number):
+        """Resolve the state reached by answering this screen with `value`"""
+        if self.on_input is not None:
+            return self.on_input(value, session_data, phone_number)
+        return self.options.get(value, self.default)
+
+
+class Menu:
+    """
+    Compiled USSD menu
+    Holds a name -> MenuState dispatch table; use compile_menu() to build one.
+    """
+
+    def __init__(self, states, start, invalid, expired_message):
+        self.states = states
+        self.start = start
+        self.invalid = invalid
+        self.expired_message = expired_message
+
+    def handle(self, text, session_data, phone_number):
+        """
+        Process one USSD hop and return the response text
+        session_data is updated in place with the new cursor.
+        """
+        if text == '':
+            session_data.clear()
+            return self._move(self.start, 0, session_data, phone_number)
+
+        state_name = session_data.get(STATE_KEY)
+        if state_name not in self.states:
+            return self.expired_message
+
+        # Only the newest segment is parsed: "<already consumed>*<value>"
+        cursor = session_data.get(CURSOR_KEY, 0)
+        value = text[cursor + 1:] if cursor else text
+
+        next_name = self.states[state_name].next_state(value, session_data, phone_number)
+        if next_name not in self.states:
+            next_name = self.invalid
+        return self._move(next_name, len(text), session_data, phone_number)
+
+    def _move(self, state_name, cursor, session_data, phone_number):
+        session_data[STATE_KEY] = state_name
+        session_data[CURSOR_KEY] = cursor
+        return self.states[state_name].enter(session_data, phone_number)
+
+
+def compile_menu(states, start, invalid, expired_message="END Session expired. Please dial again."):
+    """
+    Build a Menu from a list of MenuState objects
+
+    Checks that state names are unique and that every static transition
+    points at a declared state, so broken menus fail at startup rather
+    than in the middle of a customer's session.
+    """
+    table = {}
+    for state in states:
+        if state.name in table:
+            raise ValueError(f"Duplicate USSD state '{state.name}'")
+        table[state.name] = state
+
+    for name in (start, invalid):
+        if name not in table:
+            raise ValueError(f"Unknown USSD state '{name}'")
+
+    for state in table.values():
+        targets = list(state.options.values())
+        if state.default is not None:
+            targets.append(state.default)
+        for target in targets:
+            if target not in table:
+                raise ValueError(f"State '{state.name}' points at unknown state '{target}'")
+
+    return Menu(table, start, invalid, expired_message)
+
+
+def keyset_page(queryset, key, cursor, size, descending=False):
+    """
+    Fetch one page of rows ordered by `key`, starting after `cursor`
+
+    Uses a WHERE key > cursor (or < for descending) filter instead of OFFSET,
+    so every page costs the same no matter how deep the user has paged.
+    `queryset` should be a .values(...) queryset that includes `key`.
+
+    Returns (rows, next_cursor); next_cursor is None on the last page.
+    """
+    if cursor is not None:
+        lookup = f"{key}__lt" if descending else f"{key}__gt"
+        queryset = queryset.filter(**{lookup: cursor})
+    queryset = queryset.order_by(f"-{key}" if descending else key)
+
+    # One extra row tells us whether a "More" option is needed
+    rows = list(queryset[:size + 1])
+    if len(rows) > size:
+        rows = rows[:size]
+        return rows, rows[-1][key]
+    return rows, None
@@ -0,0 +1,167 @@
+"""
+Session storage backends for the USSD menu
+Africa's Talking sends every hop of a USSD session as a separate POST,
+so the menu state has to live somewhere between requests.
+
+Two backends are available (select one with USSD_SESSION_BACKEND in settings):
+- InMemorySessionStore: fast LRU + TTL store, only safe with a single process
+- DatabaseSessionStore: stores sessions in the UssdSession table so that
+  several gunicorn workers can serve hops of the same session
+"""
+import json
+import threading
+import time
+from collections import OrderedDict
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+
+# Africa's Talking ends a USSD session after roughly 3 minutes
+DEFAULT_SESSION_TIMEOUT = 180
+
+# Upper bound on the number of sessions kept in memory
+DEFAULT_MAX_SESSIONS = 10000
+
+
+class BaseSessionStore:
+    """
+    Interface every USSD session backend implements
+    Session data is a plain dict that must be JSON serializable
+    """
+
+    def __init__(self, timeout=DEFAULT_SESSION_TIMEOUT, max_entries=DEFAULT_MAX_SESSIONS):
+        self.timeout = timeout
+        self.max_entries = max_entries
+
+    def get(self, session_id):
+        """Return the session dict, or an empty dict for new/expired sessions"""
+        raise NotImplementedError
+
+    def save(self, session_id, data):
+        """Store the session dict and push its expiry forward"""
+        raise NotImplementedError
+
+    def delete(self, session_id):
+        """Forget a session (called when the menu sends END)"""
+        raise NotImplementedError
+
+
+class InMemorySessionStore(BaseSessionStore):
+    """
+    LRU + TTL session store kept in process memory
+    Every lookup is O(1); the least recently used session is evicted
+    once max_entries is reached, so memory use stays bounded.
+    """
+
+    def __init__(self, timeout=DEFAULT_SESSION_TIMEOUT, max_entries=DEFAULT_MAX_SESSIONS):
+        super().__init__(timeout, max_entries)
+        self._sessions = OrderedDict()  # session_id -> (expires_at, data)
+        self._lock = threading.Lock()
+
+    def get(self, session_id):
+        with self._lock:
+            entry = self._sessions.get(session_id)
+            if entry is None:
+                return {}
+            expires_at, data = entry
+            if expires_at <= time.monotonic():
+                del self._sessions[session_id]
+                return {}
+            self._sessions.move_to_end(session_id)
+            return data
+
+    def save(self, session_id, data):
+        with self._lock:
+            self._sessions[session_id] = (time.monotonic() + self.timeout, data)
+            self._sessions.move_to_end(session_id)
+            self._evict()
+
+    def delete(self, session_id):
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+    def _evict(self):
+        """Drop expired sessions from the old end, then enforce max_entries"""
+        now = time.monotonic()
+        while self._sessions:
+            oldest_id, (expires_at, _) = next(iter(self._sessions.items()))
+            if expires_at > now and len(self._sessions) <= self.max_entries:
+                break
+            del self._sessions[oldest_id]
+
+    def __len__(self):
+        return len(self._sessions)
+
+
+class DatabaseSessionStore(BaseSessionStore):
+    """
+    Session store backed by the UssdSession table
+    Shared by every worker process; lookups go through the session_id primary key.
+    Expired rows are purged every `purge_every` writes.
+    """
+
+    def __init__(self, timeout=DEFAULT_SESSION_TIMEOUT, max_entries=DEFAULT_MAX_SESSIONS, purge_every=100):
+        super().__init__(timeout, max_entries)
+        self.purge_every = purge_every
+        self._writes = 0
+
+    def get(self, session_id):
+        from .models import UssdSession
+
+        row = (
+            UssdSession.objects
+            .filter(session_id=session_id, expires_at__gt=timezone.now())
+            .values_list('data', flat=True)
+            .first()
+        )
+        if row is None:
+            return {}
+        return json.loads(row)
+
+    def save(self, session_id, data):
+        from .models import UssdSession
+
+        UssdSession.objects.update_or_create(
+            session_id=session_id,
+            defaults={
+                'data': json.dumps(data),
+                'expires_at': timezone.now() + timedelta(seconds=self.timeout),
+            }
+        )
+        self._writes += 1
+        if self._writes % self.purge_every == 0:
+            self.purge_expired()
+
+    def delete(self, session_id):
+        from .models import UssdSession
+
+        UssdSession.objects.filter(session_id=session_id).delete()
+
+    def purge_expired(self):
+        """Delete sessions that are past their expiry time"""
+        from .models import UssdSession
+
+        deleted, _ = UssdSession.objects.filter(expires_at__lte=timezone.now()).delete()
+        return deleted
+
+
+_session_store = None
+
+
+def get_session_store():
+    """
+    Return the configured session store (created once per process)
+    """
+    global _session_store
+    if _session_store is None:
+        backend = import_string(getattr(
+            settings, 'USSD_SESSION_BACKEND', 'app.ussd_sessions.DatabaseSessionStore'
+        ))
+        _session_store = backend(
+            timeout=getattr(settings, 'USSD_SESSION_TIMEOUT', DEFAULT_SESSION_TIMEOUT),
+            max_entries=getattr(settings, 'USSD_SESSION_MAX_ENTRIES', DEFAULT_MAX_SESSIONS),
+        )
+    return _session_store
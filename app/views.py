@@ -5,26 +5,18 @@ These functions respond to webhooks from Africa's Talking
 from django.http import HttpResponse
 from django.views.decorators.csrf import csrf_exempt
 from django.conf import settings
-from .models import Contact, Campaign, Product, CampaignTemplate, ContactList, SentCampaign
+from .models import Contact, Campaign, Product, CampaignTemplate, ContactList, SentCampaign, SendJob
 from .serializer import ProductSerializer
-import africastalking
+from .ussd_menu import MenuState, compile_menu, keyset_page
+from .ussd_cache import menu_cache
+from .ratelimit import sms_rate_limiter
+from .circuit_breaker import sms_circuit_breaker
+from .dashboard import compile_page, dashboard_stats
+from .ussd_sessions import get_session_store
+from .messaging import send_campaign_to_list, send_sms_campaign
 import json
 
 
-# Initialize Africa's Talking SDK
-# This uses the credentials from settings.py
-africastalking.initialize(
-    username=settings.AFRICASTALKING_USERNAME,
-    api_key=settings.AFRICASTALKING_API_KEY
-)
-
-# Get the SMS service
-sms = africastalking.SMS
-
-# Session storage for USSD (in production, use Redis or database)
-ussd_sessions = {}
-
-
 @csrf_exempt
 def ussd_callback(request):
     """
@@ -54,6 +46,8 @@ def ussd_callback(request):
 
     5️⃣ Customer Support
       - Show contact info
+
+    The screens are declared as a state graph in USSD_MENU below.
     """
     if request.method != 'POST':
         return HttpResponse("This endpoint only accepts POST requests", status=405)
@@ -63,57 +57,18 @@ def ussd_callback(request):
     phone_number = request.POST.get('phoneNumber', '')
     text = request.POST.get('text', '')
 
-    # Initialize USSD session
-    if session_id not in ussd_sessions:
-        ussd_sessions[session_id] = {}
-    session_data = ussd_sessions[session_id]
-
-    # Split user input for navigation
-    text_array = text.split('*') if text else []
-
-    response = ""  # Default response
-
-    # ==========================
-    # MAIN MENU
-    # ==========================
-    if text == '':
-        response = "CON Welcome to FlowMarket!\nSelect an option:\n"
-        response += "1. Create Campaign\n"
-        response += "2. Send Campaign\n"
-        response += "3. View Contact Lists\n"
-        response += "4. Customer Support"
-        session_data.clear()  # Reset session
-
-    # ==========================
-    # CREATE CAMPAIGN FLOW
-    # ==========================
-    elif text.startswith('1'):
-        response = handle_create_campaign_flow(text_array, session_data, phone_number)
-
-    # ==========================
-    # SEND CAMPAIGN FLOW
-    # ==========================
-    elif text.startswith('2'):
-        response = handle_send_campaign_flow(text_array, session_data, phone_number)
-
-    # ==========================
-    # VIEW CONTACT LISTS
-    # ==========================
-    elif text.startswith('3'):
-        response = handle_view_contact_lists(text_array, session_data)
-
-    # ==========================
-    # CUSTOMER SUPPORT
-    # ==========================
-    elif text.startswith('4'):
-        response = "END Contact us:\nEmail: support@flowmarket.com\nPhone: +1234567890"
-
-    # ==========================
-    # INVALID INPUT
-    # ==========================
+    # Load USSD session (see USSD_SESSION_BACKEND in settings)
+    session_store = get_session_store()
+    session_data = session_store.get(session_id)
+
+    # Resolve the next screen from the session cursor and the newest input
+    response = USSD_MENU.handle(text, session_data, phone_number)
+
+    # Finished sessions are dropped, open ones are kept until they time out
+    if response.startswith('END'):
+        session_store.delete(session_id)
     else:
-        response = "END Invalid input. Please dial again."
-        session_data.clear()
+        session_store.save(session_id, session_data)
 
     return HttpResponse(response, content_type='text/plain')
 
@@ -121,325 +76,307 @@ def ussd_callback(request):
 # ==========================
 # Helper functions for USSD flows
 # ==========================
-def handle_create_campaign_flow(text_array, session_data, phone_number):
+MAIN_MENU = (
+    "CON Welcome to FlowMarket!\nSelect an option:\n"
+    "1. Create Campaign\n"
+    "2. Send Campaign\n"
+    "3. View Contact Lists\n"
+    "4. Customer Support"
+)
+
+
+# Returned by pick_from_menu for the trailing "More" and Cancel/Back options
+CANCEL = 'cancel'
+MORE = 'more'
+
+# Long names are shortened so a full page fits on the ~182 character USSD screen
+MENU_LABEL_WIDTH = 18
+
+
+def end_screen(message):
+    """Build an `enter` callable for a screen that just ends the session"""
+    return lambda session_data, phone_number: f"END {message}"
+
+
+def menu_label(name):
+    """Shorten a name for display in a numbered menu"""
+    if len(name) > MENU_LABEL_WIDTH:
+        return name[:MENU_LABEL_WIDTH - 3] + '...'
+    return name
+
+
+def menu_page_size():
+    """Items per menu page (USSD_MENU_PAGE_SIZE in settings)"""
+    return getattr(settings, 'USSD_MENU_PAGE_SIZE', 4)
+
+
+def render_menu_page(title, rows, next_cursor, label, last_option):
     """
-    Handles the "Create Campaign" journey
+    Render one numbered page of a menu
+    Returns a dict with the screen text, the ids shown and the next page cursor
+    (text is None when there is nothing to show).
     """
-    step = len(text_array)
-
-    if step == 1:
-        session_data['action'] = 'create_campaign'
-        return "CON Create campaign \n" \
-               " input text of your campaign"
-
-    elif step == 2:
-        # User entered campaign message
-        session_data['campaign_message'] = text_array[-1]
-        return "CON Enter campaign name"
-
-    elif step == 3:
-        # User entered campaign name
-        campaign_message = session_data.get('campaign_message', '')
-        campaign_name = text_array[-1] or 'Untitled Campaign'
-
-        # Save CampaignTemplate
-        CampaignTemplate.objects.create(
-            name=campaign_name,
-            message=campaign_message,
-            created_by=phone_number
-        )
-        session_data.clear()
-        return "END  Campaign created successfully!"
+    if not rows:
+        return {'text': None, 'ids': [], 'next': None}
+
+    response = f"CON {title}\n"
+    for idx, row in enumerate(rows, 1):
+        response += f"{idx}. {label(row)}\n"
+    option = len(rows) + 1
+    if next_cursor is not None:
+        response += f"{option}. More\n"
+        option += 1
+    response += f"{option}. {last_option}"
+    return {'text': response, 'ids': [row['id'] for row in rows], 'next': next_cursor}
 
 
-def handle_send_campaign_flow(text_array, session_data, phone_number):
+def show_menu_page(session_data, key, kind, fetch_page, title, label, last_option):
     """
-    Handles the "Send Campaign" journey
+    Return the text of the current page of a menu, served from menu_cache
+
+    The ids shown on this page go to session_data[key] and the cursor of the
+    following page to session_data[key + '_next'], so the next hop can resolve
+    the user's answer without querying again. Returns None for an empty menu.
     """
-    step = len(text_array)
-
-    # Step 1: Show campaigns
-    if step == 1:
-        campaigns = CampaignTemplate.objects.filter(is_active=True)[:5]
-        if not campaigns:
-            return "END No campaigns available. Create one first."
-
-        session_data['action'] = 'send_campaign'
-        session_data['campaigns'] = [c.id for c in campaigns]
-        response = "CON Select a campaign:\n"
-        for idx, c in enumerate(campaigns, 1):
-            response += f"{idx}. {c.name}\n"
-        response += f"{len(campaigns) + 1}. Cancel"
-        return response
-
-    # Step 2: Select campaign and show contact lists
-    elif step == 2:
-        try:
-            selection = int(text_array[-1]) - 1
-            campaigns_ids = session_data.get('campaigns', [])
-            if selection == len(campaigns_ids):
-                session_data.clear()
-                return "END Campaign sending cancelled."
-            campaign_id = campaigns_ids[selection]
-            session_data['selected_campaign_id'] = campaign_id
-
-            # Show contact lists
-            contact_lists = ContactList.objects.filter(is_active=True)
-            if not contact_lists:
-                return "END No contact lists available. Create one first."
-
-            session_data['contact_lists'] = [cl.id for cl in contact_lists]
-            response = "CON Select a contact list:\n"
-            for idx, cl in enumerate(contact_lists, 1):
-                response += f"{idx}. {cl.name} ({cl.contact_count()})\n"
-            response += f"{len(contact_lists) + 1}. Cancel"
-            return response
-        except (ValueError, IndexError):
-            session_data.clear()
-            return "END Invalid selection."
-
-    # Step 3: Preview message and confirm
-    elif step == 3:
-        try:
-            selection = int(text_array[-1]) - 1
-            contact_lists_ids = session_data.get('contact_lists', [])
-            if selection == len(contact_lists_ids):
-                session_data.clear()
-                return "END Campaign sending cancelled."
-            contact_list_id = contact_lists_ids[selection]
-            session_data['selected_list_id'] = contact_list_id
-
-            # Show preview
-            campaign = CampaignTemplate.objects.get(id=session_data['selected_campaign_id'])
-            preview = campaign.message[:100] + '...' if len(campaign.message) > 100 else campaign.message
-            return f"CON Preview message:\n\"{preview}\"\n\n1. Send Now\n2. Cancel"
-        except Exception:
-            session_data.clear()
-            return "END Invalid selection."
-
-    # Step 4: Send campaign
-    elif step == 4:
-        choice = text_array[-1]
-        if choice == '1':
-            try:
-                campaign = CampaignTemplate.objects.get(id=session_data['selected_campaign_id'])
-                contact_list = ContactList.objects.get(id=session_data['selected_list_id'])
-                result = send_campaign_to_list(campaign, contact_list, phone_number)
-                session_data.clear()
-                if result['success']:
-                    return f"END ✅ Campaign sent to {result['count']} contacts."
-                else:
-                    return f"END ❌ Failed to send: {result['message']}"
-            except Exception as e:
-                session_data.clear()
-                return f"END ❌ Error: {str(e)}"
-        elif choice == '2':
-            session_data.clear()
-            return "END Campaign sending cancelled."
-        else:
-            session_data.clear()
-            return "END Invalid selection."
-
-
-def handle_view_contact_lists(text_array, session_data):
+    cursor = session_data.get(f'{key}_cursor')
+    page = menu_cache.get_page(
+        kind, (key, cursor),
+        lambda: render_menu_page(title, *fetch_page(cursor), label, last_option)
+    )
+    session_data[key] = page['ids']
+    session_data[f'{key}_next'] = page['next']
+    return page['text']
+
+
+def pick_from_menu(value, session_data, key):
     """
-    Handles the "View Contact Lists" journey
+    Map a numbered answer on the page stored under `key` to the chosen id
+    Returns MORE / CANCEL for the trailing options and None for bad input.
     """
-    step = len(text_array)
-
-    # Step 1: Show all contact lists
-    if step == 1:
-        contact_lists = ContactList.objects.filter(is_active=True)
-        if not contact_lists:
-            return "END No contact lists available."
-
-        session_data['action'] = 'view_lists'
-        session_data['lists'] = [cl.id for cl in contact_lists]
-        response = "CON Select a list to view:\n"
-        for idx, cl in enumerate(contact_lists, 1):
-            response += f"{idx}. {cl.name} ({cl.contact_count()})\n"
-        response += f"{len(contact_lists) + 1}. Back to Main Menu"
-        return response
-
-    # Step 2: Show list details
-    elif step == 2:
-        try:
-            selection = int(text_array[-1]) - 1
-            lists_ids = session_data.get('lists', [])
-            if selection == len(lists_ids):
-                session_data.clear()
-                return "CON Welcome to FlowMarket!\nSelect an option:\n1. Create Campaign\n2. Send Campaign\n3. View Contact Lists\n4. Customer Support"
-            
-            contact_list = ContactList.objects.get(id=lists_ids[selection])
-            session_data.clear()
-            return f"END {contact_list.name}\nTotal: {contact_list.contact_count()} contacts\nDescription: {contact_list.description or 'N/A'}"
-        except (ValueError, IndexError, ContactList.DoesNotExist):
-            session_data.clear()
-            return "END Invalid selection."
+    ids = session_data.get(key, [])
+    has_more = session_data.get(f'{key}_next') is not None
+    try:
+        selection = int(value) - 1
+    except ValueError:
+        return None
+    if 0 <= selection < len(ids):
+        return ids[selection]
+    if has_more and selection == len(ids):
+        # Show the next page: its cursor becomes the current one
+        session_data[f'{key}_cursor'] = session_data[f'{key}_next']
+        return MORE
+    if selection == len(ids) + has_more:
+        return CANCEL
+    return None
+
+
+def campaign_page(cursor):
+    """One page of active campaign templates, newest first (keyset on id)"""
+    templates = CampaignTemplate.objects.filter(is_active=True).values('id', 'name')
+    return keyset_page(templates, 'id', cursor, menu_page_size(), descending=True)
+
+
+def contact_list_page(cursor):
+    """One page of active contact lists in name order (keyset on the unique name)"""
+    contact_lists = ContactList.objects.filter(is_active=True).values('id', 'name', 'active_contact_count')
+    return keyset_page(contact_lists, 'name', cursor, menu_page_size())
+
+
+def campaign_label(row):
+    """Menu label for a campaign template row"""
+    return menu_label(row['name'])
+
+
+def contact_list_label(row):
+    """Menu label for a contact list row: name and active member count"""
+    return f"{menu_label(row['name'])} ({row['active_contact_count']})"
+
+
+# --- Create Campaign ---
+def save_campaign_message(value, session_data, phone_number):
+    """User entered the campaign message (may contain '*')"""
+    session_data['campaign_message'] = value
+    return 'create_name'
+
+
+def save_campaign(value, session_data, phone_number):
+    """User entered the campaign name, save the CampaignTemplate"""
+    CampaignTemplate.objects.create(
+        name=value or 'Untitled Campaign',
+        message=session_data.get('campaign_message', ''),
+        created_by=phone_number
+    )
+    return 'create_done'
+
+
+# --- Send Campaign ---
+def show_campaigns(session_data, phone_number):
+    """Step 1: Show a page of campaigns"""
+    response = show_menu_page(
+        session_data, 'campaigns', 'campaigns', campaign_page,
+        "Select a campaign:", campaign_label, "Cancel"
+    )
+    return response or "END No campaigns available. Create one first."
+
+
+def select_campaign(value, session_data, phone_number):
+    """Step 2: Remember the selected campaign"""
+    campaign_id = pick_from_menu(value, session_data, 'campaigns')
+    if campaign_id is None:
+        return 'invalid_selection'
+    if campaign_id == MORE:
+        return 'select_campaign'
+    if campaign_id == CANCEL:
+        return 'send_cancelled'
+    session_data['selected_campaign_id'] = campaign_id
+    return 'select_list'
+
+
+def show_send_lists(session_data, phone_number):
+    """Step 2: Show a page of contact lists"""
+    response = show_menu_page(
+        session_data, 'contact_lists', 'contact_lists', contact_list_page,
+        "Select a contact list:", contact_list_label, "Cancel"
+    )
+    return response or "END No contact lists available. Create one first."
+
+
+def select_send_list(value, session_data, phone_number):
+    """Step 3: Remember the selected contact list"""
+    contact_list_id = pick_from_menu(value, session_data, 'contact_lists')
+    if contact_list_id is None:
+        return 'invalid_selection'
+    if contact_list_id == MORE:
+        return 'select_list'
+    if contact_list_id == CANCEL:
+        return 'send_cancelled'
+    session_data['selected_list_id'] = contact_list_id
+    return 'preview'
+
+
+def show_preview(session_data, phone_number):
+    """Step 3: Preview message and confirm"""
+    try:
+        campaign = CampaignTemplate.objects.get(id=session_data['selected_campaign_id'])
+    except (KeyError, CampaignTemplate.DoesNotExist):
+        return "END Invalid selection."
+    preview = campaign.message[:100] + '...' if len(campaign.message) > 100 else campaign.message
+    return f"CON Preview message:\n\"{preview}\"\n\n1. Send Now\n2. Cancel"
 
 
-# ==========================
-# SMS Sending Functions
-# ==========================
-def send_campaign_to_list(campaign_template, contact_list, sent_by_phone):
+def send_selected_campaign(session_data, phone_number):
     """
-    Send a campaign to a specific contact list
-    
-    Args:
-        campaign_template: CampaignTemplate object
-        contact_list: ContactList object
-        sent_by_phone: Phone number of user sending the campaign
-    
-    Returns:
-        Dictionary with success status and details
+    Step 4: Queue the campaign for the SMS worker
+    Sending happens in `python manage.py run_sms_worker`, so this screen
+    answers immediately whatever the size of the list.
     """
-    message = None
-    recipients = []
-    
     try:
-        # Get all active contacts in the list
-        contacts = contact_list.contacts.filter(is_active=True)
-        
-        if not contacts.exists():
-            return {
-                'success': False,
-                'message': 'No active contacts in this list',
-                'count': 0
-            }
-        
-        # Get phone numbers and validate format
-        for contact in contacts:
-            phone = contact.phone_number.strip()
-            # Ensure phone number starts with +254
-            if not phone.startswith('+'):
-                if phone.startswith('254'):
-                    phone = '+' + phone
-                elif phone.startswith('0'):
-                    phone = '+254' + phone[1:]
-                else:
-                    phone = '+254' + phone
-            recipients.append(phone)
-        
-        # Use campaign message
-        message = campaign_template.message
-        
-        # Log attempt before sending
-        print(f"[SMS] Sending to {len(recipients)} contacts: {recipients[:3]}...")
-        
-        # Send SMS using Africa's Talking
-        response = sms.send(message, recipients)
-        
-        print(f"[SMS] Response: {response}")
-        
-        # Log the sent campaign
-        sent_campaign = SentCampaign.objects.create(
-            campaign_template=campaign_template,
+        campaign = CampaignTemplate.objects.only('id').get(id=session_data['selected_campaign_id'])
+        contact_list = ContactList.objects.only('id', 'active_contact_count').get(id=session_data['selected_list_id'])
+    except (KeyError, CampaignTemplate.DoesNotExist, ContactList.DoesNotExist):
+        return "END Invalid selection."
+    try:
+        job = SendJob.objects.create(
+            campaign_template=campaign,
             contact_list=contact_list,
-            message=message,
-            recipients_count=len(recipients),
-            sent_by=sent_by_phone,
-            api_response=json.dumps(response, default=str),
-            status='success'
+            requested_by=phone_number
         )
-        
-        return {
-            'success': True,
-            'message': 'Campaign sent successfully',
-            'count': len(recipients),
-            'response': response
-        }
-        
     except Exception as e:
-        # Detailed error logging
-        error_message = str(e)
-        error_type = type(e).__name__
-        
-        print(f"[SMS ERROR] Type: {error_type}")
-        print(f"[SMS ERROR] Message: {error_message}")
-        
-        # Log failed attempt
-        SentCampaign.objects.create(
-            campaign_template=campaign_template,
-            contact_list=contact_list,
-            message=message if message else 'Error occurred before sending',
-            recipients_count=len(recipients),
-            sent_by=sent_by_phone,
-            api_response=f"{error_type}: {error_message}",
-            status='failed'
-        )
-        
-        # Return user-friendly error message
-        if 'SSL' in error_message:
-            friendly_message = 'Network security error. Check your internet connection.'
-        elif 'Connection' in error_message:
-            friendly_message = 'Cannot connect to SMS service. Try again later.'
-        elif 'Invalid phone' in error_message:
-            friendly_message = 'Invalid phone number format detected.'
-        else:
-            friendly_message = 'SMS service unavailable. Please try again.'
-        
-        return {
-            'success': False,
-            'message': friendly_message,
-            'count': 0,
-            'technical_error': error_message
-        }
-
-
-def send_sms_campaign():
-    """
-    Helper function to send SMS to all active contacts (legacy function)
-    Returns a dictionary with success status and message
-    """
+        # The handset only gets a fixed message; the details stay in the log
+        print(f"[USSD ERROR] Campaign not queued for {phone_number}: {type(e).__name__}: {e}")
+        return "END ❌ Could not queue the campaign. Please try again later."
+    return (
+        f"END ✅ Campaign queued for {contact_list.active_contact_count} contacts.\n"
+        f"Ref: {job.reference}"
+    )
+
+
+# --- View Contact Lists ---
+def show_view_lists(session_data, phone_number):
+    """Step 1: Show a page of contact lists"""
+    response = show_menu_page(
+        session_data, 'lists', 'contact_lists', contact_list_page,
+        "Select a list to view:", contact_list_label, "Back to Main Menu"
+    )
+    return response or "END No contact lists available."
+
+
+def select_view_list(value, session_data, phone_number):
+    """Step 2: Pick a list to show, or go back to the main menu"""
+    list_id = pick_from_menu(value, session_data, 'lists')
+    if list_id is None:
+        return 'invalid_selection'
+    if list_id == MORE:
+        return 'view_lists'
+    if list_id == CANCEL:
+        session_data.pop('lists_cursor', None)
+        return 'main'
+    session_data['selected_list_id'] = list_id
+    return 'list_details'
+
+
+def show_list_details(session_data, phone_number):
+    """Step 2: Show list details"""
     try:
-        # Get all active contacts
-        contacts = Contact.objects.filter(is_active=True)
-        
-        if not contacts.exists():
-            return {
-                'success': False,
-                'message': 'No active contacts found',
-                'count': 0
-            }
-        
-        # Get phone numbers as a list
-        recipients = [contact.phone_number for contact in contacts]
-        
-        # The SMS message to send
-        message = "Hello! This is a promotional message from FlowMarket. Thank you for being our valued customer!"
-        
-        # Send SMS using Africa's Talking
-        response = sms.send(message, recipients)
-        
-        # Log the campaign in database
-        campaign = Campaign.objects.create(
-            message=message,
-            recipients_count=len(recipients),
-            api_response=json.dumps(response, default=str),
-            status='success'
-        )
-        
-        return {
-            'success': True,
-            'message': 'SMS sent successfully',
-            'count': len(recipients),
-            'response': response
-        }
-        
-    except Exception as e:
-        # If something goes wrong, log it
-        Campaign.objects.create(
-            message=message if 'message' in locals() else 'Error occurred before message creation',
-            recipients_count=len(recipients) if 'recipients' in locals() else 0,
-            api_response=str(e),
-            status='failed'
-        )
-        
-        return {
-            'success': False,
-            'message': str(e),
-            'count': 0
-        }
+        contact_list = ContactList.objects.get(id=session_data['selected_list_id'])
+    except ContactList.DoesNotExist:
+        return "END Invalid selection."
+    return f"END {contact_list.name}\nTotal: {contact_list.active_contact_count} contacts\nDescription: {contact_list.description or 'N/A'}"
+
+
+# ==========================
+# USSD menu graph
+# ==========================
+# Compiled once at import; each hop is a single dispatch-table lookup
+USSD_MENU = compile_menu(
+    [
+        # Main menu
+        MenuState(
+            'main',
+            enter=lambda session_data, phone_number: MAIN_MENU,
+            options={'1': 'create_message', '2': 'select_campaign', '3': 'view_lists', '4': 'support'},
+            default='invalid_input',
+        ),
+
+        # Create Campaign flow
+        MenuState(
+            'create_message',
+            enter=lambda session_data, phone_number: "CON Create campaign \n input text of your campaign",
+            on_input=save_campaign_message,
+        ),
+        MenuState(
+            'create_name',
+            enter=lambda session_data, phone_number: "CON Enter campaign name",
+            on_input=save_campaign,
+        ),
+        MenuState('create_done', enter=end_screen("Campaign created successfully!")),
+
+        # Send Campaign flow
+        MenuState('select_campaign', enter=show_campaigns, on_input=select_campaign),
+        MenuState('select_list', enter=show_send_lists, on_input=select_send_list),
+        MenuState(
+            'preview',
+            enter=show_preview,
+            options={'1': 'send', '2': 'send_cancelled'},
+            default='invalid_selection',
+        ),
+        MenuState('send', enter=send_selected_campaign),
+        MenuState('send_cancelled', enter=end_screen("Campaign sending cancelled.")),
+
+        # View Contact Lists flow
+        MenuState('view_lists', enter=show_view_lists, on_input=select_view_list),
+        MenuState('list_details', enter=show_list_details),
+
+        # Customer Support
+        MenuState('support', enter=end_screen("Contact us:\nEmail: support@flowmarket.com\nPhone: +1234567890")),
+
+        # Invalid input
+        MenuState('invalid_input', enter=end_screen("Invalid input. Please dial again.")),
+        MenuState('invalid_selection', enter=end_screen("Invalid selection.")),
+    ],
+    start='main',
+    invalid='invalid_selection',
+)
 
 
 @csrf_exempt
@@ -469,18 +406,8 @@ def send_campaign_view(request):
 # ==========================
 # Home Page and API Views
 # ==========================
-def home(request):
-    """
-    Simple home page showing API endpoints and statistics
-    """
-    contacts_count = Contact.objects.filter(is_active=True).count()
-    campaigns_count = Campaign.objects.count()
-    campaign_templates_count = CampaignTemplate.objects.filter(is_active=True).count()
-    contact_lists_count = ContactList.objects.filter(is_active=True).count()
-    sent_campaigns_count = SentCampaign.objects.count()
-    products_count = Product.objects.filter(is_active=True).count()
-    
-    html = f"""
+# Compiled once at import; each request only fills in the counts
+HOME_PAGE = compile_page("""
     <html>
     <head>
         <title>FlowMarket - USSD SMS Marketing Platform</title>
@@ -514,23 +441,23 @@ def home(request):
             
             <div class="stats">
                 <div class="stat-box" style="background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);">
-                    <h3>{contacts_count}</h3>
+                    <h3>{contacts}</h3>
                     <p>Active Contacts</p>
                 </div>
                 <div class="stat-box" style="background: linear-gradient(135deg, #f093fb 0%, #f5576c 100%);">
-                    <h3>{campaign_templates_count}</h3>
+                    <h3>{campaign_templates}</h3>
                     <p>Campaign Templates</p>
                 </div>
                 <div class="stat-box" style="background: linear-gradient(135deg, #4facfe 0%, #00f2fe 100%);">
-                    <h3>{contact_lists_count}</h3>
+                    <h3>{contact_lists}</h3>
                     <p>Contact Lists</p>
                 </div>
                 <div class="stat-box" style="background: linear-gradient(135deg, #43e97b 0%, #38f9d7 100%);">
-                    <h3>{sent_campaigns_count}</h3>
+                    <h3>{sent_campaigns}</h3>
                     <p>Campaigns Sent</p>
                 </div>
                 <div class="stat-box" style="background: linear-gradient(135deg, #fa709a 0%, #fee140 100%);">
-                    <h3>{products_count}</h3>
+                    <h3>{products}</h3>
                     <p>Products</p>
                 </div>
             </div>
@@ -623,20 +550,231 @@ def home(request):
         </div>
     </body>
     </html>
+    """)
+
+
+def home(request):
     """
-    
-    return HttpResponse(html)
+    Simple home page showing API endpoints and statistics
+    The counts come from one cached query (see app/dashboard.py), so this is
+    cheap enough for health checks.
+    """
+    return HttpResponse(HOME_PAGE.render(dashboard_stats()))
 
 
 # =============================
 # Products API View
 # =============================
 from django.http import JsonResponse
+from django.views.decorators.http import condition
+from .catalog import catalog_state, products_response_cache, query_digest
+from .search import search_products
+
+def products_page_size(request):
+    """Page size from ?limit=, capped at PRODUCTS_MAX_PAGE_SIZE (ValueError if not a positive number)"""
+    default = getattr(settings, 'PRODUCTS_PAGE_SIZE', 100)
+    limit = int(request.GET.get('limit') or default)
+    if limit < 1:
+        raise ValueError(limit)
+    return min(limit, getattr(settings, 'PRODUCTS_MAX_PAGE_SIZE', 1000))
+
+
+def products_catalog_state(request):
+    """(version, changed_at) of the product catalog, read once per request"""
+    if not hasattr(request, '_products_catalog_state'):
+        request._products_catalog_state = catalog_state()
+    return request._products_catalog_state
+
+
+def products_etag(request):
+    """Catalog version plus query: changes whenever the response body would"""
+    version, _ = products_catalog_state(request)
+    return f"products-{version}-{query_digest(request.GET)}"
+
 
+def products_last_modified(request):
+    _, changed_at = products_catalog_state(request)
+    return changed_at
+
+
+@condition(etag_func=products_etag, last_modified_func=products_last_modified)
 def products_list(request):
     """
-    Returns all products as JSON for the frontend
+    Returns active products as JSON for the frontend, newest first, one page at a time
+    Usage: GET http://localhost:8000/products/?limit=100&fields=id,name,price
+    The body is a JSON array. When there are more products, the next page's
+    URL is in the Link header (rel="next") and its cursor in X-Next-Cursor;
+    pass it back as ?cursor=. Rows are read with .values() and serialized in
+    one pass, so a page costs the same however large the catalog is.
+
+    Responses carry an ETag and Last-Modified taken from the catalog version
+    (app/catalog.py): a request with a matching If-None-Match gets a 304
+    without any product being read, and bodies are reused from an
+    in-process cache until the catalog changes.
+    """
+    version, _ = products_catalog_state(request)
+    key = (version, request.get_host(), query_digest(request.GET))
+    cached = products_response_cache.get(key)
+    if cached is None:
+        response = build_products_response(request)
+        if response.status_code != 200:
+            return response
+        cached = (response.content, {header: response[header] for header in ('Link', 'X-Next-Cursor') if response.has_header(header)})
+        products_response_cache.set(key, cached)
+
+    body, headers = cached
+    response = HttpResponse(body, content_type='application/json')
+    for header, value in headers.items():
+        response[header] = value
+    # Let clients store the response but check back (with If-None-Match) every time
+    response['Cache-Control'] = 'no-cache'
+    return response
+
+
+def build_products_response(request):
+    """The /products/ response for the current catalog (not cached)"""
+    fields = [field for field in request.GET.get('fields', '').split(',') if field] or list(ProductSerializer.FIELDS)
+    unknown = [field for field in fields if field not in ProductSerializer.FIELDS]
+    if unknown:
+        return JsonResponse(
+            {'error': f"Unknown fields: {', '.join(unknown)}. Available: {', '.join(ProductSerializer.FIELDS)}"},
+            status=400
+        )
+
+    cursor = request.GET.get('cursor')
+    try:
+        size = products_page_size(request)
+        cursor = int(cursor) if cursor else None
+    except ValueError:
+        return JsonResponse({'error': 'limit and cursor must be positive numbers'}, status=400)
+
+    # The keyset needs the id even when the client did not ask for it
+    products = Product.objects.filter(is_active=True).values(*dict.fromkeys(['id', *fields]))
+    rows, next_cursor = keyset_page(products, 'id', cursor, size, descending=True)
+
+    response = JsonResponse(ProductSerializer.many(rows, fields), safe=False)
+    if next_cursor is not None:
+        query = request.GET.copy()
+        query['cursor'] = next_cursor
+        response['Link'] = f'<{request.build_absolute_uri(f"{request.path}?{query.urlencode()}")}>; rel="next"'
+        response['X-Next-Cursor'] = str(next_cursor)
+    return response
+
+
+@condition(etag_func=products_etag, last_modified_func=products_last_modified)
+def products_search(request):
+    """
+    Returns the active products best matching ?q= as a JSON array, best first
+    Usage: GET http://localhost:8000/products/search?q=smart+phone&limit=20&fields=id,name,price
+    Every word must match a word (or word prefix) of the name or description;
+    name matches rank higher. Backed by a full-text index (app/search.py).
+    """
+    query = request.GET.get('q', '').strip()
+    if not query:
+        return JsonResponse({'error': 'q is required'}, status=400)
+
+    fields = [field for field in request.GET.get('fields', '').split(',') if field] or list(ProductSerializer.FIELDS)
+    unknown = [field for field in fields if field not in ProductSerializer.FIELDS]
+    if unknown:
+        return JsonResponse(
+            {'error': f"Unknown fields: {', '.join(unknown)}. Available: {', '.join(ProductSerializer.FIELDS)}"},
+            status=400
+        )
+    try:
+        size = products_page_size(request)
+    except ValueError:
+        return JsonResponse({'error': 'limit must be a positive number'}, status=400)
+
+    response = JsonResponse(ProductSerializer.many(search_products(query, size, fields), fields), safe=False)
+    response['Cache-Control'] = 'no-cache'
+    return response
+
+
+# =============================
+# Operational metrics
+# =============================
+from django.contrib.admin.views.decorators import staff_member_required
+
+
+@staff_member_required
+def metrics(request):
+    """
+    Returns internal counters as JSON (staff only)
+    USSD menu cache hit rate, SMS throttling and provider health.
+    Usage: GET http://localhost:8000/metrics
+    """
+    return JsonResponse({
+        'ussd_menu_cache': menu_cache.stats(),
+        'sms_rate_limit': sms_rate_limiter.stats(),
+        'sms_circuit_breaker': sms_circuit_breaker.stats(),
+        'products_response_cache': products_response_cache.stats(),
+    })
+
+
+# =============================
+# Send analytics
+# =============================
+from .analytics import BUCKETS, default_range, parse_day, send_report
+
+
+@staff_member_required
+def send_analytics(request):
+    """
+    Returns send totals per day, week or month as JSON (staff only)
+    Read from the DailySendStat rollup, so the cost depends on the date range,
+    not on the size of the send history.
+    Usage: GET http://localhost:8000/analytics/sends?bucket=week&start=2026-01-01&end=2026-03-31&list=3
+    Defaults: the last 30 days, per day, every list and template.
+    """
+    bucket = request.GET.get('bucket', 'day')
+    if bucket not in BUCKETS:
+        return JsonResponse({'error': f"bucket must be one of: {', '.join(BUCKETS)}"}, status=400)
+
+    start, end = default_range()
+    filters = {}
+    try:
+        if request.GET.get('start'):
+            start = parse_day(request.GET['start'])
+        if request.GET.get('end'):
+            end = parse_day(request.GET['end'])
+        if request.GET.get('list'):
+            filters['contact_list_id'] = int(request.GET['list'])
+        if request.GET.get('template'):
+            filters['campaign_template_id'] = int(request.GET['template'])
+    except ValueError:
+        return JsonResponse({'error': 'start/end must be YYYY-MM-DD and list/template numeric ids'}, status=400)
+
+    report = send_report(start, end, bucket, **filters)
+    return JsonResponse({'start': start.isoformat(), 'end': end.isoformat(), 'bucket': bucket, **report})
+
+
+# =============================
+# Data exports
+# =============================
+from django.http import Http404, StreamingHttpResponse
+from .exports import EXPORTS, FORMATS, export_filename, export_stream
+
+
+@staff_member_required
+def export_data(request, kind):
+    """
+    Streams an export as a file download (staff only)
+    Usage: GET http://localhost:8000/exports/contacts?format=csv
+           GET http://localhost:8000/exports/sent_messages?format=ndjson&gzip=1&list=3
+    Kinds: contacts, list_members, sent_campaigns, sent_messages
     """
-    products = Product.objects.filter(is_active=True)
-    data = [ProductSerializer(product).to_dict() for product in products]
-    return JsonResponse(data, safe=False)
+    file_format = request.GET.get('format', 'csv')
+    if kind not in EXPORTS or file_format not in FORMATS:
+        raise Http404("Unknown export")
+
+    list_id = request.GET.get('list')
+    if list_id is not None and not list_id.isdigit():
+        raise Http404("Unknown contact list")
+    compress = request.GET.get('gzip') in ('1', 'true', 'yes')
+
+    response = StreamingHttpResponse(
+        export_stream(kind, file_format, compress, int(list_id) if list_id else None),
+        content_type='application/gzip' if compress else FORMATS[file_format][0]
+    )
+    response['Content-Disposition'] = f'attachment; filename="{export_filename(kind, file_format, compress)}"'
+    return response
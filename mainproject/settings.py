@@ -118,3 +118,103 @@ AFRICASTALKING_API_KEY = 'atsk_02011e70f31a1670d57f4ae1d8d22cc31efc7191dfea31cb6
 AFRICASTALKING_SENDER_ID = 'MSEM'
 
 # ============================================================
+
+
+# ============================================================
+# USSD SESSION STORAGE
+# ============================================================
+# Where USSD menu state is kept between hops:
+# - 'app.ussd_sessions.DatabaseSessionStore' works with several worker processes
+# - 'app.ussd_sessions.InMemorySessionStore' is faster but only for a single process
+USSD_SESSION_BACKEND = 'app.ussd_sessions.DatabaseSessionStore'
+
+# Seconds of inactivity before a USSD session expires
+USSD_SESSION_TIMEOUT = 180
+
+# Maximum number of sessions kept by the in-memory store
+USSD_SESSION_MAX_ENTRIES = 10000
+
+# Number of campaigns / contact lists shown per USSD menu page
+# (4 items plus "More" and "Cancel" fit on the ~182 character screen)
+USSD_MENU_PAGE_SIZE = 4
+
+# Products per page of the /products/ API (?limit= may ask for up to the maximum)
+PRODUCTS_PAGE_SIZE = 100
+PRODUCTS_MAX_PAGE_SIZE = 1000
+
+# Encoded /products/ responses kept in memory per process (keyed by catalog
+# version and query string)
+PRODUCTS_RESPONSE_CACHE_ENTRIES = 256
+
+
+# ============================================================
+# CACHING
+# ============================================================
+# The local memory cache is per process. USSD menu invalidations still reach
+# every process (the page versions are kept in the database); pointing
+# 'ussd_menus' at a shared backend (Redis, Memcached) lets workers share the
+# rendered pages and the hit/miss counters too.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'ussd_menus': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'ussd-menus',
+    },
+}
+
+# Cache alias and lifetime (seconds) for rendered USSD menu pages
+USSD_MENU_CACHE = 'ussd_menus'
+USSD_MENU_CACHE_TIMEOUT = 300
+
+# Seconds the home page counts are cached ('default' cache); saves and
+# deletes through the ORM refresh them immediately
+DASHBOARD_STATS_TIMEOUT = 30
+
+
+# ============================================================
+# SMS SENDING
+# ============================================================
+# Recipients per Africa's Talking API call (outbox batches and inline sends)
+SMS_BATCH_SIZE = 1000
+
+# Seconds a worker may hold a job or batch before others may take it over
+SMS_OUTBOX_LEASE_SECONDS = 120
+
+# Times a job may be picked up for splitting into batches before it is failed
+# (a worker that crashes or errors on it uses up one attempt)
+SMS_OUTBOX_JOB_ATTEMPTS = 3
+
+# Concurrent API calls made by send_campaign_to_list
+SMS_SEND_THREADS = 4
+
+# Contacts fetched per database query while streaming recipients
+SMS_STREAM_CHUNK_SIZE = 2000
+
+# Africa's Talking rate limits shared by every thread and worker process
+# (None disables a limit)
+SMS_RATE_MESSAGES_PER_SECOND = 1000
+SMS_RATE_REQUESTS_PER_SECOND = 10
+
+# Provider calls per batch before it is marked failed, with jittered
+# exponential backoff (seconds) between attempts
+SMS_RETRY_ATTEMPTS = 4
+SMS_RETRY_BASE_DELAY = 1.0
+SMS_RETRY_MAX_DELAY = 60.0
+
+# Failed calls in a row that open the circuit breaker, and how long (seconds)
+# sends stay paused before a probe request is tried
+SMS_BREAKER_FAILURES = 5
+SMS_BREAKER_COOLDOWN = 30
+
+# Where SMS are sent (see app/sms_backends.py):
+# - 'app.sms_backends.AfricasTalkingBackend': real Africa's Talking API
+# - 'app.sms_backends.FakeSmsBackend': in-process fake, e.g. options
+#   {'latency': 0.2, 'failure_rate': 0.01, 'reject_rate': 0.05}
+# - 'app.sms_backends.HttpSmsBackend': local stand-in server started with
+#   `python manage.py run_fake_sms_server`, options {'url': 'http://127.0.0.1:8025/version1/messaging'}
+# - 'app.sms_backends.AsyncHttpSmsBackend': same endpoint over pooled keep-alive
+#   connections, options {'url': ..., 'max_connections': 8}
+SMS_BACKEND = 'app.sms_backends.AfricasTalkingBackend'
+SMS_BACKEND_OPTIONS = {}